@@ -4,7 +4,9 @@ import os
 import pygame
 import sys
 sys.path.append("lom")
-from lom import constants
+from lom import constants, controls, display, fonts, panorama, profiling, savegame, sprites, tilemap, worldfile
+from lom.replay import Recorder
+from lom.compositor import Compositor, Layer
 from lom.utils import draw_grids
 from pygame.locals import *
 from pgu import engine, text
@@ -12,11 +14,21 @@ __author__ = 'Ashley Felton'
 __version__ = '0.0'
 __license__ = 'Public Domain'
 
+# The command (see lom/controls.py) each key performs.
+KEYS = {
+    K_c: 'c', K_v: 'v', K_b: 'b', K_n: 'n', # Switch to Luxor, Morkin, Corleth or Rorthron.
+    K_1: '1', K_2: '2', K_3: '3', K_4: '4', # Face north, northeast, east or southeast.
+    K_5: '5', K_6: '6', K_7: '7', K_8: '8', # Face south, southwest, west or northwest.
+    K_MINUS: controls.ROTATE_CCW,
+    K_EQUALS: controls.ROTATE_CW,
+    K_q: controls.MOVE, # Move forwards (if possible).
+    K_r: controls.THINK,
+}
+# With LOM_PROFILE set, toggles the profiling overlay.
+OVERLAY_KEY = K_F3
+MAP_KEY = K_m # Shows the strategic map (and returns from it).
+recorder = None
 
-pygame.font.init()
-os.environ["SDL_VIDEO_CENTERED"] = "1" ## Centre the graphics window.
-screen = pygame.display.set_mode(constants.SCREENSIZE, 0, 32)
-#screen = pygame.display.set_mode(constants.SCREENSIZE, SWSURFACE)
 
 class StartScreen(engine.State):
     def paint(self, screen):
@@ -36,81 +48,199 @@ class StartScreen(engine.State):
             return GameScreen(self.game)
         
 class GameScreen(engine.State):
-    def paint(self, screen):
+    def init(self):
+        # The screen is composited from layers (bottom to top), each of which is
+        # only redrawn when the state it shows changes.
+        width, height = constants.SCREENSIZE
+        self.land = pygame.Rect((0, height*0.61), (width, height*0.39))
+        shield = sprites.cache.get(gamedata.actor.heraldry)
+        self.panoramas = panorama.PanoramaCache(panorama.screen_rect(), self.paint_background)
+        self.compositor = Compositor([
+            Layer('sky', ((0, 0), constants.SCREENSIZE), self.paint_sky),
+            Layer('land', self.land, self.paint_land),
+            Layer('panorama', panorama.screen_rect(), self.paint_panorama, self.view_key),
+            Layer('text', ((0, 0), (width, 20 + font.get_linesize())), self.paint_text, self.text_key),
+            Layer('heraldry', ((920, 6), shield.get_size()), self.paint_heraldry,
+                lambda: gamedata.actor.heraldry),
+            Layer('overlay', ((0, height - 24), (width, 24)), self.paint_overlay, self.overlay_text),
+        ])
+        self.tiles = None # The strategic map's TilePyramid, made when the map is first shown.
+        self.overlay = False
+        self.frame_loads = 0 # Images loaded from disk during the last frame.
+        self.seen_loads = sprites.cache.loads
+        # A world streamed from disk starts reading the chunks around the lords now.
+        gamedata.world.prefetch(gamedata)
+
+    def view_key(self):
+        actor = gamedata.actor
+        return self.panoramas.key(gamedata.world, actor.location, actor.heading)
+
+    def text_key(self):
+        actor = gamedata.actor
+        return (actor.name, actor.location, actor.heading.name, gamedata.world.revision)
+
+    def paint_sky(self, screen):
         screen.fill(constants.BLUE)
-        land = pygame.surface.Surface((constants.SCREENSIZE[0], constants.SCREENSIZE[1]*0.39))
-        land.fill(constants.WHITE)
-        screen.blit(land, (0, constants.SCREENSIZE[1]*0.61))
-        # Display the name of the current actor.
-        text.write(screen, font, (6,6), constants.YELLOW, gamedata.actor.name, 0)
+
+    def paint_land(self, screen):
+        screen.fill(constants.WHITE, self.land)
+
+    def paint_background(self, screen):
+        self.paint_sky(screen)
+        self.paint_land(screen)
+
+    def paint_panorama(self, screen):
+        # Draw the actor's perspective (composited over the background, and cached).
+        #draw_grids(cardinal=gamedata.actor.heading.cardinal, grids=True, screen=screen)
+        actor = gamedata.actor
+        screen.blit(self.panoramas.get(gamedata.world, actor.location, actor.heading), self.panoramas.rect)
+
+    def paint_text(self, screen):
+        # Display the name of the current actor (lines are cached once rendered).
+        fonts.cache.write(screen, (6,6), constants.YELLOW, gamedata.actor.name)
         # Describe what they are looking at.
-        text.write(screen, font, (6,20), constants.AQUA, gamedata.actor.location_desc(gamedata.world), 0)
+        fonts.cache.write(screen, (6,20), constants.AQUA, gamedata.actor.location_desc(gamedata.world))
+
+    def paint_heraldry(self, screen):
         # Draw their heraldry.
-        shield = pygame.image.load(gamedata.actor.heraldry).convert_alpha()
+        shield = sprites.cache.get(gamedata.actor.heraldry)
         screen.blit(shield, (920,6))
-        # Draw the actor's perspective.
-        #draw_grids(cardinal=gamedata.actor.heading.cardinal, grids=True, screen=screen)
-        gamedata.actor.render_perspective(gamedata.world, screen)
-        pygame.display.update()
+
+    def overlay_text(self):
+        # The overlay shows the previous frame, since this one isn't finished yet.
+        if not self.overlay:
+            return None
+        paint = profiling.last('paint')
+        return 'frame {0:.1f} ms (p95 {1:.1f}) | hits: views {2:.0%} sprites {3:.0%} text {4:.0%} | loads/frame {5}'.format(
+            (paint.latest or 0) * 1000,
+            (paint.percentile(95) or 0) * 1000,
+            self.panoramas.surfaces.stats()['hit_rate'],
+            sprites.cache.stats()['hit_rate'],
+            fonts.cache.lines.stats()['hit_rate'],
+            self.frame_loads)
+
+    def paint_overlay(self, screen):
+        text = self.overlay_text()
+        if text:
+            fonts.cache.write(screen, (6, constants.SCREENSIZE[1] - 22), constants.YELLOW, text)
+
+    @profiling.timed('paint')
+    def paint(self, screen):
+        dirty = self.compositor.update(screen)
+        if dirty:
+            pygame.display.update(dirty)
+        if profiling.ENABLED:
+            self.frame_loads = sprites.cache.loads - self.seen_loads
+            self.seen_loads = sprites.cache.loads
+
+    def loop(self):
+        # While there's no input waiting, render the views the player is likely to turn to next.
+        if not pygame.event.peek([KEYDOWN, QUIT]):
+            self.panoramas.render_pending()
         
     def event(self, event):
         if event.type is KEYDOWN:
             if event.key == K_ESCAPE:
                 return engine.Quit(self.game)
-            elif event.key == K_c:
-                # Switch actors to Luxor
-                gamedata.actor = gamedata.luxor
-            elif event.key == K_v:
-                # Switch actors to Morkin
-                gamedata.actor = gamedata.morkin
-            elif event.key == K_b:
-                # Switch actors to Corleth
-                gamedata.actor = gamedata.corleth
-            elif event.key == K_n:
-                # Switch actors to Morkin
-                gamedata.actor = gamedata.rorthron
-            elif event.key == K_1:
-                # Change actor heading to north
-                gamedata.actor.heading = constants.NORTH
-            elif event.key == K_2:
-                # Change actor heading to northeast
-                gamedata.actor.heading = constants.NORTHEAST
-            elif event.key == K_3:
-                # Change actor heading to east
-                gamedata.actor.heading = constants.EAST
-            elif event.key == K_4:
-                # Change actor heading to southeast
-                gamedata.actor.heading = constants.SOUTHEAST
-            elif event.key == K_5:
-                # Change actor heading to south
-                gamedata.actor.heading = constants.SOUTH
-            elif event.key == K_6:
-                # Change actor heading to southwest
-                gamedata.actor.heading = constants.SOUTHWEST
-            elif event.key == K_7:
-                # Change actor heading to west
-                gamedata.actor.heading = constants.WEST
-            elif event.key == K_8:
-                # Change actor heading to northwest
-                gamedata.actor.heading = constants.NORTHWEST
-            elif event.key == K_MINUS:
-                # Rotate actor heading CCW
-                gamedata.actor.rotate_ccw()
-            elif event.key == K_EQUALS:
-                # Rotate actor heading CW
-                gamedata.actor.rotate_cw()
-            elif event.key == K_q:
-                # Move character forwards (if possible)
-                gamedata.actor.move(gamedata)
-            elif event.key == K_r:
-                # Enter think screen
-                pass
+            if event.key == MAP_KEY:
+                return MapScreen(self.game, self)
+            if event.key == OVERLAY_KEY and profiling.ENABLED:
+                self.overlay = not self.overlay
+                self.compositor.invalidate('overlay')
+                self.repaint()
+                return
+            command = KEYS.get(event.key)
+            if command is None:
+                # Nothing to redraw for keys we don't handle.
+                return
+            controls.perform(gamedata, command)
+            gamedata.world.prefetch(gamedata)
+            if recorder:
+                recorder.record(command)
             self.repaint()
-    
+
+
+class MapScreen(engine.State):
+    '''
+    The strategic map: the whole world from above, with the lords marked.
+    The arrow keys pan it, and + and - zoom in and out.
+    '''
+    def __init__(self, game, previous):
+        engine.State.__init__(self, game)
+        self.previous = previous
+
+    def init(self):
+        if self.previous.tiles is None:
+            self.previous.tiles = tilemap.TilePyramid(gamedata.world, worldfile.content_hash(gamedata.world))
+        self.tiles = self.previous.tiles
+        # Start zoomed in as far as the whole map fits, centred on the selected lord.
+        self.level = 0
+        width, height = constants.SCREENSIZE
+        while self.level < self.tiles.levels - 1 and (self.tiles.size(self.level)[0] > width or
+                self.tiles.size(self.level)[1] > height):
+            self.level += 1
+        self.centre = self.map_point(gamedata.actor.location)
+
+    def map_point(self, location):
+        # The map pixel (at level 0) at the middle of a square.
+        return ((location[1] + 0.5) * tilemap.CELL_PIXELS, (location[0] + 0.5) * tilemap.CELL_PIXELS)
+
+    def paint(self, screen):
+        width, height = constants.SCREENSIZE
+        scale = 1 << self.level
+        origin = (int(self.centre[0] / scale) - width // 2, int(self.centre[1] / scale) - height // 2)
+        screen.fill(tilemap.BACKGROUND)
+        self.tiles.draw(screen, self.level, origin)
+        # The selected lord is drawn last, on top of any others in the same square.
+        for actor in [a for a in gamedata.actors if a is not gamedata.actor] + [gamedata.actor]:
+            x, y = self.map_point(actor.location)
+            colour = constants.YELLOW if actor is gamedata.actor else constants.RED
+            pygame.draw.circle(screen, colour, (int(x / scale) - origin[0], int(y / scale) - origin[1]), 4)
+        fonts.cache.write(screen, (6,6), constants.YELLOW, 'The Land of Midnight')
+        pygame.display.update()
+
+    def event(self, event):
+        if event.type is KEYDOWN:
+            if event.key in (K_ESCAPE, MAP_KEY):
+                self.previous.compositor.invalidate()
+                return self.previous
+            step = (constants.SCREENSIZE[1] // 4) << self.level # A quarter screen, in level 0 pixels.
+            moves = {K_LEFT: (-step, 0), K_RIGHT: (step, 0), K_UP: (0, -step), K_DOWN: (0, step)}
+            if event.key in moves:
+                self.centre = (self.centre[0] + moves[event.key][0], self.centre[1] + moves[event.key][1])
+            elif event.key in (K_EQUALS, K_PLUS, K_KP_PLUS):
+                self.level = max(0, self.level - 1)
+            elif event.key in (K_MINUS, K_KP_MINUS):
+                self.level = min(self.tiles.levels - 1, self.level + 1)
+            else:
+                return
+            self.repaint()
+
 # Run the main game loop.
-gamedata = constants.DefaultGameData(cheatmode=True)
-font = pygame.font.Font(constants.FONT_BENG, 16)
+if __name__ == '__main__':
+    # Set LOM_HEADLESS=1 to run without opening a window.
+    screen = display.init()
+    gamedata = constants.DefaultGameData(cheatmode=True)
+    # Store the world as loaded, as the base that saves of this game are diffed against.
+    savegame.track(gamedata)
+    # Set LOM_RECORD to a file name to record the session, for scripts/replay.py.
+    if os.environ.get('LOM_RECORD'):
+        recorder = Recorder(os.environ['LOM_RECORD'], gamedata)
+    font = pygame.font.Font(constants.FONT_BENG, 16)
+    # Decode and pre-scale every sprite up front, so painting never touches the disk.
+    sprites.preload_game(gamedata)
+    panorama.compile_all()
 
-pygame.init()
-game = engine.Game()
-game.run(GameScreen(game), screen)
\ No newline at end of file
+    pygame.init()
+    game = engine.Game()
+    try:
+        game.run(GameScreen(game), screen)
+    finally:
+        if recorder:
+            recorder.close()
+        # Set LOM_PROFILE to time the game's hot paths, exported to LOM_PROFILE_FILE on exit.
+        if profiling.ENABLED:
+            profiling.export(version=__version__, caches={
+                'sprites': sprites.cache.stats(),
+                'text': fonts.cache.stats(),
+            })
\ No newline at end of file
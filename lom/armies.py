@@ -0,0 +1,181 @@
+#!/usr/bin/python
+from __future__ import division, print_function, unicode_literals
+from array import array
+import time
+import constants
+import icefear
+import pathfinding
+from stats import summarize
+
+NO_TARGET = -1
+FRAME_BUDGET = 1 / 30 # Seconds the night phase can take without a noticeable stall.
+
+
+class Army:
+    '''
+    A handle on one army of an Armies table, for placing it in the entity
+    index (see entities.py).
+    '''
+    kind = 'army'
+
+    def __init__(self, armies, number):
+        self.armies = armies
+        self.number = number
+
+    @property
+    def location(self):
+        return self.armies.location(self.number)
+
+
+class Armies:
+    '''
+    Every army in the game, held as parallel arrays (one entry per army)
+    rather than one object each, so the night phase can sweep all of them
+    in tight loops. Races are stored as indexes into `races`. An army whose
+    strength has fallen to 0 is destroyed, and no longer moves.
+    '''
+    def __init__(self, races=None):
+        self.races = list(races or constants.RACES)
+        self.race_codes = dict((r, i) for i, r in enumerate(self.races))
+        self.rows = array(str('i'))
+        self.cols = array(str('i'))
+        self.strength = array(str('i'))
+        self.race = array(str('B'))
+        self.mounted = array(str('B')) # 1 for riders, 0 for warriors.
+        self.target_rows = array(str('i')) # NO_TARGET if the army is holding its ground.
+        self.target_cols = array(str('i'))
+        self.hours = array(str('d')) # Hours of marching left tonight.
+        self.units = {} # Army number -> its Army handle, made on demand.
+        self.index = None # The entity index the armies are placed in, if any.
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, location, strength, race, mounted=False, target=None):
+        '''
+        Adds an army and returns its index.
+        '''
+        self.rows.append(location[0])
+        self.cols.append(location[1])
+        self.strength.append(strength)
+        self.race.append(self.race_codes[race])
+        self.mounted.append(1 if mounted else 0)
+        self.target_rows.append(NO_TARGET)
+        self.target_cols.append(NO_TARGET)
+        self.hours.append(0)
+        self.set_target(len(self.rows) - 1, target)
+        if self.index is not None:
+            self.index.place(self.unit(len(self.rows) - 1), location)
+        return len(self.rows) - 1
+
+    def unit(self, i):
+        '''
+        Returns the Army handle for army `i`.
+        '''
+        try:
+            return self.units[i]
+        except KeyError:
+            return self.units.setdefault(i, Army(self, i))
+
+    def location(self, i):
+        return (self.rows[i], self.cols[i])
+
+    def target(self, i):
+        if self.target_rows[i] == NO_TARGET:
+            return None
+        return (self.target_rows[i], self.target_cols[i])
+
+    def set_target(self, i, target):
+        self.target_rows[i], self.target_cols[i] = target or (NO_TARGET, NO_TARGET)
+
+
+def march(armies, world, hours):
+    '''
+    Marches every army that has a target towards it for up to `hours` hours.
+    Each step heads straight for the target (or 45 degrees to either side,
+    if that way is blocked) and takes the Terrain travel time of the square
+    entered, as for an Actor. An army stops when it arrives, is blocked by
+    the Frozen Wastes or can't finish its next step in the hours it has
+    left. The armies advance a step at a time together, so they can later
+    react to each other between steps. Returns the number of steps taken.
+    '''
+    fields = [pathfinding.cost_field(world, False).hours, pathfinding.cost_field(world, True).hours]
+    width = world.cols + 2 # The cost fields have a one-square border.
+    steps = [(h.offset[0], h.offset[1], h.offset[0] * width + h.offset[1], 1 if h.cardinal else 1.4)
+        for h in constants.HEADINGS]
+    # The steps to try for each direction towards a target: straight, then either side.
+    choices = {}
+    for i, heading in enumerate(constants.HEADINGS):
+        choices[heading.offset] = [steps[i], steps[(i + 1) % len(steps)], steps[i - 1]]
+    rows, cols, left = armies.rows, armies.cols, armies.hours
+    target_rows, target_cols = armies.target_rows, armies.target_cols
+    strength, mounted = armies.strength, armies.mounted
+    index = armies.index
+    active = []
+    for i in range(len(armies)):
+        if strength[i] > 0 and target_rows[i] != NO_TARGET:
+            left[i] = hours
+            active.append(i)
+        else:
+            left[i] = 0
+    moved = 0
+    while active:
+        marching = []
+        for i in active:
+            r, c, tr, tc = rows[i], cols[i], target_rows[i], target_cols[i]
+            if r == tr and c == tc:
+                continue
+            costs, here = fields[mounted[i]], (r + 1) * width + c + 1
+            for dr, dc, offset, factor in choices[((tr > r) - (tr < r), (tc > c) - (tc < c))]:
+                cost = costs[here + offset] * factor
+                if cost != pathfinding.IMPASSABLE:
+                    break
+            if cost > left[i]:
+                # Blocked, or too late to go any further tonight.
+                left[i] = 0
+                continue
+            rows[i], cols[i] = r + dr, c + dc
+            left[i] -= cost
+            if index is not None:
+                index.place(armies.unit(i), (r + dr, c + dc))
+            moved += 1
+            marching.append(i)
+        active = marching
+    return moved
+
+
+class NightPhase:
+    '''
+    Resolves the night at the end of each day: marches the armies through
+    the night, then starts the new day. Each night is timed, so the phase
+    can be checked against a frame budget.
+    '''
+    def __init__(self, armies, budget=FRAME_BUDGET):
+        self.armies = armies
+        self.budget = budget
+        self.timings = [] # Seconds taken by each night.
+        self.moves = [] # Steps marched on each night.
+
+    def run(self, gamedata):
+        start = time.time()
+        moves = march(self.armies, gamedata.world, gamedata.nightfall - gamedata.dawn)
+        gamedata.world.prefetch(gamedata)
+        # The Ice Fear follows the armies (if anything is reading it).
+        if 'icefear' in gamedata.world.derived:
+            icefear.field_for(gamedata).sync(gamedata)
+        for actor in gamedata.actors:
+            actor.time = gamedata.dawn
+        gamedata.game_days += 1
+        self.timings.append(time.time() - start)
+        self.moves.append(moves)
+        return moves
+
+    def stats(self):
+        return {
+            'armies': len(self.armies),
+            'nights': len(self.timings),
+            'night_ms': summarize([t * 1000 for t in self.timings]),
+            'moves': summarize(self.moves),
+            'budget_ms': self.budget * 1000,
+            'over_budget': len([t for t in self.timings if t > self.budget]),
+        }
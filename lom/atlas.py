@@ -0,0 +1,96 @@
+#!/usr/bin/python
+'''
+Sprite atlases: every sprite the game draws (each at every scale it's
+drawn at) packed into one image, plus a JSON index of where each one is.
+scripts/build_atlas.py builds the atlas; at startup the game loads the
+single image and cuts the sprites out of it as subsurfaces, rather than
+decoding and scaling ~24 separate PNGs.
+
+The index looks like:
+
+    {"version": 1, "image": "sprites.png",
+     "sprites": [{"path": "assets/img/wolf.png", "scale": 1, "rect": [x, y, w, h]}, ...]}
+
+Paths are relative to the project directory. An atlas older than any of
+its source images is ignored.
+'''
+from __future__ import division, print_function, unicode_literals
+import json
+import os
+import pygame
+import constants
+
+VERSION = 1
+ATLAS_PATH = os.path.join(constants.ASSET_PATH, 'atlas')
+INDEX_FILE = os.path.join(ATLAS_PATH, 'sprites.json')
+
+
+def pack(sizes, width):
+    '''
+    Packs rectangles into a strip `width` pixels wide, in shelves: the
+    tallest go first, each placed to the right of the last until the shelf
+    is full. `sizes` is a list of (key, (w, h)) pairs. Returns a dictionary
+    of key -> Rect, and the height used.
+    '''
+    placed = {}
+    x = y = shelf = 0
+    for key, (w, h) in sorted(sizes, key=lambda item: (-item[1][1], -item[1][0])):
+        if w > width:
+            raise ValueError('A {0}x{1} sprite is wider than the atlas.'.format(w, h))
+        if x + w > width:
+            x, y, shelf = 0, y + shelf, 0
+        placed[key] = pygame.Rect(x, y, w, h)
+        x += w
+        shelf = max(shelf, h)
+    return placed, y + shelf
+
+def relative(path):
+    return os.path.relpath(path, constants.PROJECT_PATH).replace(os.sep, '/')
+
+def build(sprites, index_file=None, width=512):
+    '''
+    Packs `sprites`, a dictionary of (path, scale) -> surface, into an
+    atlas image and writes it with its index next to `index_file`.
+    Returns the atlas surface.
+    '''
+    index_file = index_file or INDEX_FILE
+    placed, height = pack([(key, surface.get_size()) for key, surface in sprites.items()], width)
+    image = pygame.Surface((width, height), pygame.SRCALPHA, 32)
+    entries = []
+    for (path, scale), rect in sorted(placed.items(), key=lambda item: (item[0][0], item[0][1])):
+        # Copied with BLEND_RGBA_MAX onto the transparent atlas, so alpha is kept exactly.
+        image.blit(sprites[(path, scale)], rect, special_flags=pygame.BLEND_RGBA_MAX)
+        entries.append({'path': relative(path), 'scale': scale, 'rect': list(rect)})
+    directory = os.path.dirname(index_file)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    image_file = os.path.splitext(os.path.basename(index_file))[0] + '.png'
+    pygame.image.save(image, os.path.join(directory, image_file))
+    with open(index_file, 'w') as f:
+        json.dump({'version': VERSION, 'image': image_file, 'sprites': entries}, f, indent=1, sort_keys=True)
+    return image
+
+def load(index_file=None):
+    '''
+    Loads the atlas and returns a dictionary of (path, scale) -> subsurface,
+    or None if there's no atlas or it's out of date with its source images.
+    Must be called after the display mode has been set.
+    '''
+    index_file = index_file or INDEX_FILE
+    if not os.path.exists(index_file):
+        return None
+    with open(index_file, 'r') as f:
+        index = json.load(f)
+    image_file = os.path.join(os.path.dirname(index_file), index['image'])
+    if index.get('version') != VERSION or not os.path.exists(image_file):
+        return None
+    built = os.path.getmtime(image_file)
+    sprites = {}
+    paths = {}
+    for entry in index['sprites']:
+        path = paths.setdefault(entry['path'], os.path.join(constants.PROJECT_PATH, *entry['path'].split('/')))
+        if not os.path.exists(path) or os.path.getmtime(path) > built:
+            return None
+        sprites[(path, entry['scale'])] = pygame.Rect(entry['rect'])
+    image = pygame.image.load(image_file).convert_alpha()
+    return dict((key, image.subsurface(rect)) for key, rect in sprites.items())
@@ -0,0 +1,76 @@
+#!/usr/bin/python
+from __future__ import division, print_function, unicode_literals
+from collections import OrderedDict
+
+
+class LRUCache:
+    '''
+    A small dictionary-like cache that evicts the least recently used entry
+    once it holds more than `capacity` entries. If a `sizeof` function is
+    given, capacity is instead a budget for the total size of the entries
+    (e.g. in bytes). Keeps hit/miss counters so callers can report how well
+    the cache is doing.
+    '''
+    def __init__(self, capacity=256, sizeof=None):
+        self.capacity = capacity
+        self.sizeof = sizeof or (lambda value: 1)
+        self.size = 0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        try:
+            value = self.entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        # Re-insert to mark the entry as most recently used.
+        self.entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if key in self.entries:
+            self.pop(key)
+        self.entries[key] = value
+        self.size += self.sizeof(value)
+        # Always keep the newest entry, even if it is over budget on its own.
+        while self.size > self.capacity and len(self.entries) > 1:
+            evicted = self.entries.popitem(last=False)[1]
+            self.size -= self.sizeof(evicted)
+            self.evictions += 1
+        return value
+
+    def pop(self, key, default=None):
+        if key not in self.entries:
+            return default
+        value = self.entries.pop(key)
+        self.size -= self.sizeof(value)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self):
+        '''
+        Returns a dictionary of the cache counters.
+        '''
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'size': self.size,
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
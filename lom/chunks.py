@@ -0,0 +1,346 @@
+#!/usr/bin/python
+'''
+Streaming very large worlds from disk a chunk at a time.
+
+A chunked world is a directory (by convention named *.lomc) holding:
+
+    manifest.json  the map size, chunk size, terrain type names, the name
+                   table and every feature (monsters etc.; there are few,
+                   and the entity index needs all of them anyway)
+    R-C.chunk      the CHUNK x CHUNK squares from row R * CHUNK, column
+                   C * CHUNK: a terrain plane of one byte per square, then
+                   a name plane of little-endian uint16s. Chunks on the
+                   right and bottom edges are padded to the full size.
+
+Opening one only reads the manifest. The terrain and name planes of the
+StreamedWorld it returns load chunks as squares are read, keep them under
+a memory budget (least recently used first out), and a background thread
+reads ahead of the lords and armies, so `world[r][c]`, terrain_at and
+name_at all work as for a world held in memory.
+'''
+from __future__ import division, print_function, unicode_literals
+import json
+import os
+import sys
+import threading
+import Queue
+from array import array
+import constants
+from cache import LRUCache
+from world import WorldGrid
+
+VERSION = 1
+EXTENSION = '.lomc'
+MANIFEST = 'manifest.json'
+CHUNK = 64 # Squares along each side of a chunk (a power of two).
+BUDGET = 8 * 1024 * 1024 # Bytes of chunks to keep loaded.
+AHEAD = 2 # How many chunks ahead of a lord (along their heading) to read in advance.
+
+
+class Chunk:
+    '''
+    The terrain and name planes of one chunk. A chunk that has been changed
+    is `dirty`: it only exists in memory from then on, so is never evicted.
+    '''
+    def __init__(self, terrain, names):
+        self.terrain = terrain
+        self.names = names
+        self.dirty = False
+
+
+class ChunkStore:
+    '''
+    The chunks of a chunked world on disk, loaded on demand and cached
+    within `budget` bytes. Chunks asked for with prefetch() are read by a
+    background thread, so they're usually loaded before anything needs them.
+    '''
+    def __init__(self, path, budget=BUDGET):
+        self.path = path
+        with open(os.path.join(path, MANIFEST), 'r') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('version') != VERSION:
+            raise ValueError('{0} is not a version {1} chunked world.'.format(path, VERSION))
+        self.rows, self.cols = self.manifest['rows'], self.manifest['cols']
+        self.size = self.manifest['chunk']
+        self.shift = self.size.bit_length() - 1
+        self.cached = LRUCache(budget, sizeof=chunk_bytes)
+        self.changed = {} # Chunk key -> dirty Chunk, kept outside the budget.
+        self.lock = threading.Lock() # Guards the cache, which the prefetcher also fills.
+        self.queue = Queue.Queue()
+        self.queued = set()
+        self.thread = None
+        self.planes = []
+        self.loads = 0 # Chunks read because something needed them right away.
+        self.prefetched = 0 # Chunks read ahead by the background thread.
+
+    def key(self, row, col):
+        return (row >> self.shift, col >> self.shift)
+
+    def read(self, key):
+        '''
+        Reads a chunk from disk.
+        '''
+        cells = self.size * self.size
+        with open(os.path.join(self.path, '{0}-{1}.chunk'.format(*key)), 'rb') as f:
+            data = f.read()
+        if len(data) != cells * 3:
+            raise ValueError('Chunk {0} of {1} is damaged.'.format(key, self.path))
+        terrain = array(str('B'))
+        terrain.fromstring(data[:cells])
+        names = array(str('H'))
+        names.fromstring(data[cells:])
+        if sys.byteorder != 'little':
+            names.byteswap()
+        return Chunk(terrain, names)
+
+    def chunk(self, key):
+        '''
+        Returns the chunk with `key`, reading it now if it isn't loaded.
+        '''
+        with self.lock:
+            chunk = self.changed.get(key) or self.cached.get(key)
+        if chunk is None:
+            chunk = self.read(key)
+            with self.lock:
+                # The prefetcher may have got there first.
+                if key in self.cached:
+                    chunk = self.cached.get(key)
+                else:
+                    self.cached.put(key, chunk)
+                    self.loads += 1
+        return chunk
+
+    def change(self, key):
+        '''
+        Returns the chunk with `key` ready to be changed: it's kept in
+        memory from now on, outside the budget.
+        '''
+        chunk = self.chunk(key)
+        if not chunk.dirty:
+            with self.lock:
+                self.cached.pop(key)
+                chunk.dirty = True
+                self.changed[key] = chunk
+            # Reads may have kept hold of a copy of the chunk that has been evicted since.
+            for plane in self.planes:
+                plane.forget()
+        return chunk
+
+    def prefetch(self, keys):
+        '''
+        Queues the chunks with `keys` (nearest first) to be read in the
+        background. Those already loaded are marked as recently used instead.
+        '''
+        last = self.key(self.rows - 1, self.cols - 1)
+        with self.lock:
+            for key in keys:
+                if not (0 <= key[0] <= last[0] and 0 <= key[1] <= last[1]) or key in self.changed:
+                    continue
+                if key in self.cached:
+                    self.cached.get(key)
+                elif key not in self.queued:
+                    self.queued.add(key)
+                    self.queue.put(key)
+        if self.thread is None and self.queued:
+            self.thread = threading.Thread(target=self.run, name='chunk prefetcher')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def run(self):
+        while True:
+            key = self.queue.get()
+            if key is None:
+                break
+            with self.lock:
+                loaded = key in self.cached or key in self.changed
+            try:
+                chunk = None if loaded else self.read(key)
+            except (IOError, ValueError):
+                chunk = None # Left to fail when something actually needs it.
+            with self.lock:
+                self.queued.discard(key)
+                if chunk is not None and key not in self.cached and key not in self.changed:
+                    self.cached.put(key, chunk)
+                    self.prefetched += 1
+
+    def close(self):
+        '''
+        Stops the prefetcher (after anything it's reading now).
+        '''
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def stats(self):
+        with self.lock:
+            stats = self.cached.stats()
+            stats.update({'changed': len(self.changed), 'loads': self.loads,
+                'prefetched': self.prefetched, 'queued': len(self.queued)})
+        return stats
+
+
+class ChunkedPlane:
+    '''
+    The terrain or name plane of a chunked world, indexed like the flat
+    planes of a WorldGrid (row * cols + col). The last chunk read is kept
+    at hand, as reads tend to come in runs of nearby squares.
+    '''
+    def __init__(self, store, attr, typecode):
+        self.store = store
+        self.attr = attr
+        self.typecode = typecode
+        self.count = store.rows * store.cols
+        self.mask = store.size - 1
+        self.forget()
+        store.planes.append(self)
+
+    def forget(self):
+        self.key = None
+        self.values = None
+
+    def __len__(self):
+        return self.count
+
+    def locate(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError('Plane index out of range.')
+        row, col = divmod(i, self.store.cols)
+        return self.store.key(row, col), ((row & self.mask) << self.store.shift) | (col & self.mask)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.span(*i.indices(self.count))
+        key, offset = self.locate(i)
+        if key != self.key:
+            self.values = getattr(self.store.chunk(key), self.attr)
+            self.key = key
+        return self.values[offset]
+
+    def __setitem__(self, i, value):
+        key, offset = self.locate(i)
+        getattr(self.store.change(key), self.attr)[offset] = value
+
+    def span(self, start, stop, step):
+        if step != 1:
+            return array(str(self.typecode), [self[i] for i in range(start, stop, step)])
+        # Copied a run of squares at a time, from each chunk the span crosses.
+        values = array(str(self.typecode))
+        store = self.store
+        while start < stop:
+            row, col = divmod(start, store.cols)
+            end = min(stop - row * store.cols, (col | self.mask) + 1, store.cols)
+            chunk = getattr(store.chunk(store.key(row, col)), self.attr)
+            offset = (row & self.mask) << store.shift
+            values.extend(chunk[offset + (col & self.mask):offset + ((end - 1) & self.mask) + 1])
+            start += end - col
+        return values
+
+
+class StreamedWorld(WorldGrid):
+    '''
+    A WorldGrid whose terrain and name planes are streamed from a chunked
+    world on disk (see ChunkStore).
+    '''
+    streamed = True
+
+    def __init__(self, store, terrains=None):
+        by_type = dict((t.terrain_type, t) for t in (terrains or constants.TERRAINS))
+        manifest = store.manifest
+        WorldGrid.__init__(self, store.rows, store.cols, [by_type[s] for s in manifest['terrains']],
+            terrain=ChunkedPlane(store, 'terrain', 'B'),
+            name_index=ChunkedPlane(store, 'names', 'H'))
+        self.store = store
+        self.movers = None # The chunk and direction of each lord and army at the last prefetch.
+        for name in manifest['names']:
+            self.intern(name)
+        for row, col, features in manifest['features']:
+            self.features[(row, col)] = features
+
+    def prefetch(self, gamedata):
+        '''
+        Reads in the background the chunks within view of the game's lords
+        and armies, then those along the way each lord is facing (or each
+        army is marching).
+        '''
+        # Imported here, as visibility needs the constants this module is loaded by.
+        from visibility import VIEW_RANGE
+        near, ahead = [], []
+        movers = [(actor.location, actor.heading.offset) for actor in gamedata.actors]
+        armies = gamedata.armies
+        for i in range(len(armies) if armies is not None else 0):
+            target = armies.target(i)
+            if armies.strength[i] > 0 and target is not None:
+                location = armies.location(i)
+                movers.append((location, ((target[0] > location[0]) - (target[0] < location[0]),
+                    (target[1] > location[1]) - (target[1] < location[1]))))
+        # Nothing to do until one of them has moved into another chunk or turned.
+        seen = [(self.store.key(*location), offset) for location, offset in movers]
+        if seen == self.movers:
+            return
+        self.movers = seen
+        size = self.store.size
+        for (row, col), (dr, dc) in movers:
+            near.extend(self.chunks_near(row, col, VIEW_RANGE))
+            for step in range(1, AHEAD + 1):
+                ahead.extend(self.chunks_near(row + dr * size * step, col + dc * size * step, VIEW_RANGE))
+        self.store.prefetch(near + ahead)
+
+    def chunks_near(self, row, col, radius):
+        '''
+        Returns the keys of the chunks within `radius` squares of (row, col).
+        '''
+        top, left = self.store.key(row - radius, col - radius)
+        bottom, right = self.store.key(row + radius, col + radius)
+        return [(r, c) for r in range(top, bottom + 1) for c in range(left, right + 1)]
+
+
+def chunk_bytes(chunk):
+    return len(chunk.terrain) + len(chunk.names) * 2
+
+def save(grid, path, size=CHUNK):
+    '''
+    Writes `grid` to the directory `path` as a chunked world, with chunks of
+    `size` x `size` squares.
+    '''
+    if size & (size - 1):
+        raise ValueError('The chunk size must be a power of two.')
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    wastes = grid.terrain_codes.get(constants.FROZEN_WASTES, 0)
+    lefts = range(0, grid.cols, size)
+    for top in range(0, grid.rows, size):
+        # Each band of chunks is filled a whole row of the map at a time.
+        band = [(array(str('B'), [wastes]) * (size * size), array(str('H'), [0]) * (size * size)) for left in lefts]
+        for row in range(top, min(top + size, grid.rows)):
+            start, offset = row * grid.cols, (row - top) * size
+            terrain = array(str('B'), grid.terrain[start:start + grid.cols])
+            names = array(str('H'), grid.name_index[start:start + grid.cols])
+            for (chunk_terrain, chunk_names), left in zip(band, lefts):
+                width = min(size, grid.cols - left)
+                chunk_terrain[offset:offset + width] = terrain[left:left + width]
+                chunk_names[offset:offset + width] = names[left:left + width]
+        for (terrain, names), left in zip(band, lefts):
+            if sys.byteorder != 'little':
+                names.byteswap()
+            with open(os.path.join(path, '{0}-{1}.chunk'.format(top // size, left // size)), 'wb') as f:
+                f.write(terrain.tostring() + names.tostring())
+    manifest = {
+        'version': VERSION,
+        'rows': grid.rows,
+        'cols': grid.cols,
+        'chunk': size,
+        'terrains': [t.terrain_type for t in grid.terrains],
+        'names': grid.names[1:],
+        'features': [[row, col, features] for (row, col), features in sorted(grid.features.items())],
+    }
+    # Written last, so a half-written world can't be opened.
+    with open(os.path.join(path, MANIFEST), 'w') as f:
+        f.write(json.dumps(manifest, separators=(',', ':')))
+
+def open_world(path, terrains=None, budget=BUDGET):
+    '''
+    Opens the chunked world at `path` as a StreamedWorld. Only the manifest
+    is read now; chunks are read as they're needed.
+    '''
+    return StreamedWorld(ChunkStore(path, budget), terrains)
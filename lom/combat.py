@@ -0,0 +1,140 @@
+#!/usr/bin/python
+'''
+Battle resolution.
+
+Every battle of a night is resolved together, as one batch. A Battles table
+holds the sides of each battle as parallel arrays (strengths, race codes
+and the terrain code of the square being fought over), and resolve() sweeps
+the whole table in one loop, with all of the batch's random draws taken up
+front from a seeded generator, so a night's battles always resolve alike.
+
+Each side's losses follow its enemy's fighting power (Lanchester's linear
+law): strength times race prowess, and for the defender also times the
+terrain's defence bonus, which in turn shields the defender from losses.
+A side reduced to ROUT of its strength or less is routed.
+'''
+from __future__ import division, print_function, unicode_literals
+from array import array
+import random
+import constants
+import icefear
+
+LETHALITY = 0.25 # Share of the enemy's fighting power killed on an average night.
+ROUT = 0.2 # A side left with this share of its strength (or less) is routed.
+# Outcomes.
+UNDECIDED = 0 # Neither side broke; the battle goes on.
+ATTACKER = 1 # The attacker won.
+DEFENDER = 2 # The defender held.
+
+
+class Battles:
+    '''
+    A night's battles, as parallel arrays with one entry per battle. Races
+    are stored as indexes into `races`, and terrain as indexes into
+    `terrains` (a world's terrain codes, by default).
+    '''
+    def __init__(self, races=None, terrains=None):
+        self.races = list(races or constants.RACES)
+        self.race_codes = dict((r, i) for i, r in enumerate(self.races))
+        self.terrains = list(terrains or constants.TERRAINS)
+        self.terrain_codes = dict((t, i) for i, t in enumerate(self.terrains))
+        self.attackers = array(str('i')) # Attacking strength.
+        self.defenders = array(str('i')) # Defending strength.
+        self.attacker_race = array(str('B'))
+        self.defender_race = array(str('B'))
+        self.terrain = array(str('B')) # The square the defender holds.
+
+    def __len__(self):
+        return len(self.attackers)
+
+    def add(self, attackers, defenders, attacker_race, defender_race, terrain):
+        '''
+        Adds a battle and returns its index.
+        '''
+        self.attackers.append(attackers)
+        self.defenders.append(defenders)
+        self.attacker_race.append(self.race_codes[attacker_race])
+        self.defender_race.append(self.race_codes[defender_race])
+        self.terrain.append(self.terrain_codes[terrain])
+        return len(self.attackers) - 1
+
+
+class Results:
+    '''
+    The casualties on each side and the outcome of every battle in a batch.
+    '''
+    def __init__(self, count):
+        self.attacker_losses = array(str('i'), [0]) * count
+        self.defender_losses = array(str('i'), [0]) * count
+        self.outcome = array(str('B'), [UNDECIDED]) * count
+
+    def __len__(self):
+        return len(self.outcome)
+
+    def wins(self, outcome=ATTACKER):
+        return self.outcome.count(outcome)
+
+
+def resolve(battles, seed=None, rng=None):
+    '''
+    Fights one night of every battle in `battles`, and returns the Results.
+    The random draws come from `rng`, or a generator seeded with `seed`.
+    '''
+    rng = rng or random.Random(seed)
+    count = len(battles)
+    results = Results(count)
+    draw = rng.random
+    # Two draws per battle, one for the luck of each side; each scales losses by 0.5-1.5.
+    luck = array(str('d'), [draw() + 0.5 for i in range(2 * count)])
+    prowess = [race.prowess for race in battles.races]
+    defence = [terrain.defence for terrain in battles.terrains]
+    attackers, defenders = battles.attackers, battles.defenders
+    attacker_race, defender_race, terrain = battles.attacker_race, battles.defender_race, battles.terrain
+    attacker_losses, defender_losses, outcome = results.attacker_losses, results.defender_losses, results.outcome
+    for i in range(count):
+        a, d = attackers[i], defenders[i]
+        if a <= 0 or d <= 0:
+            outcome[i] = ATTACKER if d <= 0 < a else DEFENDER if a <= 0 < d else UNDECIDED
+            continue
+        a_prowess = prowess[attacker_race[i]]
+        d_prowess = prowess[defender_race[i]] * defence[terrain[i]]
+        lost_a = min(a, int(LETHALITY * d * d_prowess * luck[2 * i] / a_prowess + 0.5))
+        lost_d = min(d, int(LETHALITY * a * a_prowess * luck[2 * i + 1] / d_prowess + 0.5))
+        attacker_losses[i] = lost_a
+        defender_losses[i] = lost_d
+        a_routed = a - lost_a <= a * ROUT
+        d_routed = d - lost_d <= d * ROUT
+        if d_routed and not a_routed:
+            outcome[i] = ATTACKER
+        elif a_routed and not d_routed:
+            outcome[i] = DEFENDER
+    return results
+
+def fight(armies, world, pairs, seed=None, rng=None):
+    '''
+    Resolves a night of battles between armies: each (attacker, defender)
+    pair of army numbers in `pairs` fights over the defender's square.
+    The losses are taken off the armies' strengths (an army reduced to 0
+    is destroyed and leaves the entity index), and the Ice Fear the armies
+    spread is brought up to date, if anything is reading it. Returns the Results.
+    '''
+    battles = Battles(armies.races, world.terrains)
+    strength, race = armies.strength, armies.race
+    for attacker, defender in pairs:
+        battles.attackers.append(strength[attacker])
+        battles.defenders.append(strength[defender])
+        battles.attacker_race.append(race[attacker])
+        battles.defender_race.append(race[defender])
+        battles.terrain.append(world.terrain[armies.rows[defender] * world.cols + armies.cols[defender]])
+    results = resolve(battles, seed, rng)
+    for i, (attacker, defender) in enumerate(pairs):
+        strength[attacker] = max(0, strength[attacker] - results.attacker_losses[i])
+        strength[defender] = max(0, strength[defender] - results.defender_losses[i])
+        for army in (attacker, defender):
+            if strength[army] == 0 and armies.index is not None:
+                armies.index.remove(armies.unit(army))
+    field = world.derived.get('icefear')
+    if field is not None and field.gamedata is not None and field.gamedata.armies is armies:
+        # Through field_for, so the field catches up with any terrain changes first.
+        icefear.field_for(field.gamedata).sync(field.gamedata)
+    return results
@@ -0,0 +1,69 @@
+#!/usr/bin/python
+from __future__ import division, print_function, unicode_literals
+import pygame
+
+
+class Layer:
+    '''
+    One layer of the screen. `draw(surface)` paints the layer within `rect`,
+    and `key()` returns the inputs the layer depends on: the layer is only
+    redrawn when its key changes (or it is invalidated). A layer without a
+    key function is static.
+    '''
+    def __init__(self, name, rect, draw, key=None):
+        self.name = name
+        self.rect = pygame.Rect(rect)
+        self.draw = draw
+        self.key = key or (lambda: None)
+        self.drawn_key = None
+        self.valid = False
+
+
+class Compositor:
+    '''
+    Composites a stack of layers (listed bottom to top) onto the screen,
+    repainting only the regions of layers whose inputs have changed. Each
+    dirty region is redrawn from the bottom layer up, clipped to the region.
+    '''
+    def __init__(self, layers):
+        self.layers = layers
+
+    def invalidate(self, name=None):
+        '''
+        Forces the named layer (or every layer) to be redrawn on the next update.
+        '''
+        for layer in self.layers:
+            if name is None or layer.name == name:
+                layer.valid = False
+
+    def dirty_rects(self):
+        '''
+        Returns the rects of the layers that need redrawing, and marks them clean.
+        '''
+        dirty = []
+        for layer in self.layers:
+            key = layer.key()
+            if not layer.valid or key != layer.drawn_key:
+                dirty.append(layer.rect)
+                layer.drawn_key = key
+                layer.valid = True
+        return dirty
+
+    def update(self, screen):
+        '''
+        Redraws the dirty regions of the screen and returns their rects,
+        ready to be passed to pygame.display.update().
+        '''
+        drawn = []
+        clip = screen.get_clip()
+        for rect in self.dirty_rects():
+            # Skip regions already covered by a bigger dirty region.
+            if any(done.contains(rect) for done in drawn):
+                continue
+            screen.set_clip(rect)
+            for layer in self.layers:
+                if layer.rect.colliderect(rect):
+                    layer.draw(screen)
+            drawn.append(rect)
+        screen.set_clip(clip)
+        return drawn
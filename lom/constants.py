@@ -1,20 +1,21 @@
 #!/usr/bin/python
 from __future__ import division, print_function, unicode_literals
 import os
-import json
-from sys import path
 #from models import *
 from models import Heading, Terrain, Object, Monster, Race, Actor, GameData
-from utils import getIntersectPoint
+from armies import Armies
+import worldfile
 
 
 # Game constants
-PROJECT_PATH = path[0]
+PROJECT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ASSET_PATH = PROJECT_PATH + os.sep + 'assets'
 FONT_PATH = ASSET_PATH + os.sep + 'font'
 FONT_BENG = FONT_PATH + os.sep + 'benguiat_book_bt.ttf'
 IMG_PATH = ASSET_PATH + os.sep + 'img'
+DATA_PATH = PROJECT_PATH + os.sep + 'data'
 SCREENSIZE = (1024, 768)
+LOOK_AHEAD = 3 # How many squares ahead an actor looks past plains (None for no limit).
 # Colour tuples
 WHITE = (255, 255, 255)
 SILVER = (191, 191, 191)
@@ -34,29 +35,32 @@ FUCHSIA = (255, 0, 255)
 PURPLE = (128, 0, 128)
 # Define races
 FREE = Race('free')
-FOUL = Race('foul')
-FEY = Race('fey')
+FOUL = Race('foul', prowess=0.9)
+FEY = Race('fey', prowess=1.2)
 HALF_FEY = Race('half_fey') # He's special: half-human, half-fey.
-TARG = Race('targ')
+TARG = Race('targ', prowess=1.1)
 WISE = Race('wise')
-SKULKRIN = Race('skulkrin')
-DRAGON = Race('dragon')
+SKULKRIN = Race('skulkrin', prowess=0.7)
+DRAGON = Race('dragon', prowess=3)
+RACES = [FREE, FOUL, FEY, HALF_FEY, TARG, WISE, SKULKRIN, DRAGON]
 # Define terrain types
 PLAINS = Terrain('plains')
-MOUNTAINS = Terrain('mountains', os.path.join(IMG_PATH, 'terrain_mountains.png'), 3, 64)
-CITADEL = Terrain('citadel', os.path.join(IMG_PATH, 'terrain_citadel.png'))
-FOREST = Terrain('forest', os.path.join(IMG_PATH, 'terrain_forest.png'), 2.5, 12)
-TOWER = Terrain('tower', os.path.join(IMG_PATH, 'terrain_tower.png'))
+MOUNTAINS = Terrain('mountains', os.path.join(IMG_PATH, 'terrain_mountains.png'), 3, 64, defence=1.5)
+CITADEL = Terrain('citadel', os.path.join(IMG_PATH, 'terrain_citadel.png'), defence=2)
+FOREST = Terrain('forest', os.path.join(IMG_PATH, 'terrain_forest.png'), 2.5, 12, defence=1.25)
+TOWER = Terrain('tower', os.path.join(IMG_PATH, 'terrain_tower.png'), defence=1.5)
 HENGE = Terrain('henge', os.path.join(IMG_PATH, 'terrain_henge.png'))
 VILLAGE = Terrain('village', os.path.join(IMG_PATH, 'terrain_village.png'))
-DOWNS = Terrain('downs', os.path.join(IMG_PATH, 'terrain_downs.png'), 1.5, 16)
-KEEP = Terrain('keep', os.path.join(IMG_PATH, 'terrain_keep.png'))
+DOWNS = Terrain('downs', os.path.join(IMG_PATH, 'terrain_downs.png'), 1.5, 16, defence=1.1)
+KEEP = Terrain('keep', os.path.join(IMG_PATH, 'terrain_keep.png'), defence=1.75)
 SNOWHALL = Terrain('snowhall', os.path.join(IMG_PATH, 'terrain_snowhall.png'))
 LAKE = Terrain('lake', os.path.join(IMG_PATH, 'terrain_lake.png'))
 FROZEN_WASTES = Terrain('frozen_wastes', os.path.join(IMG_PATH, 'terrain_wastes.png'), 999)
 RUIN = Terrain('ruin', os.path.join(IMG_PATH, 'terrain_ruin.png'))
 LITH = Terrain('lith', os.path.join(IMG_PATH, 'terrain_lith.png'))
 CAVERN = Terrain('cavern', os.path.join(IMG_PATH, 'terrain_cavern.png'))
+TERRAINS = [PLAINS, MOUNTAINS, CITADEL, FOREST, TOWER, HENGE, VILLAGE, DOWNS, KEEP,
+    SNOWHALL, LAKE, FROZEN_WASTES, RUIN, LITH, CAVERN]
 
 # Define headings.
 # A note about offsets: due to how the world data is stored (rows of columns),
@@ -533,11 +537,13 @@ NORTHWEST = Heading(name='northwest', cardinal=False, bearing=315, offset=(-1,-1
         [(128, 568), (0, -1), 0.9], # L1
         [(896, 568), (-1, 0), 0.9], # R1
     ])
+HEADINGS = [NORTH, NORTHEAST, EAST, SOUTHEAST, SOUTH, SOUTHWEST, WEST, NORTHWEST]
 
 # Define objects
 MOONRING = Object(name='moonring')
 DRAGONSLAYER = Object(name='dragonslayer')
 WOLFSLAYER = Object(name='wolfslayer')
+OBJECTS = [MOONRING, DRAGONSLAYER, WOLFSLAYER]
 
 # Define monsters
 WOLVES = Monster(name='wolves', hostile=True, image=os.path.join(IMG_PATH, 'wolf.png'))
@@ -545,6 +551,14 @@ DRAGONS = Monster(name='dragons', hostile=True, image=os.path.join(IMG_PATH, 'dr
 ICE_TROLLS = Monster(name='ice_trolls', hostile=True, image=os.path.join(IMG_PATH, 'ice_troll.png'))
 SKULKRIN = Monster(name='skulkrin', hostile=True, image=os.path.join(IMG_PATH, 'skulkrin.png'))
 WILD_HORSES = Monster(name='wild horses', hostile=False, image=os.path.join(IMG_PATH, 'horse.png'))
+MONSTERS = [WOLVES, DRAGONS, ICE_TROLLS, SKULKRIN, WILD_HORSES]
+
+# Doomdark's strongholds, and the Ice Fear each radiates (see icefear.py).
+ICE_FEAR_SOURCES = {'the Citadel of Ushgarak': 127, 'the Tower of Doom': 96}
+
+# The Monster or Object each 'monster' or 'object' feature in the world refers to (see entities.py).
+MONSTER_TYPES = dict((m.name.replace(' ', '_'), m) for m in MONSTERS)
+OBJECT_TYPES = dict((o.name.replace(' ', '_'), o) for o in OBJECTS)
 
 class DefaultGameData(GameData):
     '''A class to define all the additional data for a "default" game.
@@ -553,51 +567,54 @@ class DefaultGameData(GameData):
 	Character stats reference: http://www.icemark.com/tower/charstats.htm
 	Doomdark's regiments: http://www.icemark.com/tower/regiments.htm
     '''
-    # Load the world from the external file into a dictionary.
-    world = json.loads(open('data/world.json','r').readline())
-    #world = json.loads(open('data/test_world.json','r').readline())
-    # For each grid cell, replace the terrain_type with the correct terrain class.
-    for row in world:
-        for grid in row:
-            grid['terrain_type'] = eval(grid['terrain_type'].upper())
-    # Define initial player-controlled actors.
-    luxor = Actor(location = (41,13),
-    #luxor = Actor(location = (10,10),
-        name = 'Luxor',
-        title = 'the Moonprince',
-        heading = NORTHEAST,
-        #image
-        #image_mounted
-        mounted = True,
-        heraldry = os.path.join(IMG_PATH, 'shield_luxor.png'),
-        race = FREE)
-    morkin = Actor(location = (41,13),
-        name = 'Morkin',
-        title = None,
-        #image
-        #image_mounted
-        mounted = True,
-        icefear = False,
-        heraldry = os.path.join(IMG_PATH, 'shield_morkin.png'),
-        race = HALF_FEY)
-    corleth = Actor(location = (41,13),
-        name = 'Corleth',
-        title = 'the Fey',
-        #image
-        #image_mounted
-        mounted = True,
-        heraldry = os.path.join(IMG_PATH, 'shield_corleth.png'),
-        race = FEY)
-    rorthron = Actor(location = (41,13),
-        name = 'Rorthron',
-        title = 'the Wise',
-        #image
-        #image_mounted
-        mounted = True,
-        heraldry = os.path.join(IMG_PATH, 'shield_rorthron.png'),
-        race = WISE)
+    # The world is only loaded (and the actors created) when a game is instantiated,
+    # so importing this module stays cheap.
+    world_file = os.path.join(DATA_PATH, 'world.json')
+    #world_file = os.path.join(DATA_PATH, 'test_world.json')
+
     def __init__(self, *args, **kwargs):
-        self.cheatmode = kwargs.get('cheatmode') or False
+        GameData.__init__(self, *args, **kwargs)
+        # Load the world from the external file into a WorldGrid (unless one is passed in).
+        if self.world is None:
+            self.world = worldfile.load_world(self.world_file)
+        # Doomdark's regiments (TODO: load them from the world file).
+        self.armies = Armies()
+        # Define initial player-controlled actors.
+        self.luxor = Actor(location = (41,13),
+        #self.luxor = Actor(location = (10,10),
+            name = 'Luxor',
+            title = 'the Moonprince',
+            heading = NORTHEAST,
+            #image
+            #image_mounted
+            mounted = True,
+            heraldry = os.path.join(IMG_PATH, 'shield_luxor.png'),
+            race = FREE)
+        self.morkin = Actor(location = (41,13),
+            name = 'Morkin',
+            title = None,
+            #image
+            #image_mounted
+            mounted = True,
+            icefear = False,
+            heraldry = os.path.join(IMG_PATH, 'shield_morkin.png'),
+            race = HALF_FEY)
+        self.corleth = Actor(location = (41,13),
+            name = 'Corleth',
+            title = 'the Fey',
+            #image
+            #image_mounted
+            mounted = True,
+            heraldry = os.path.join(IMG_PATH, 'shield_corleth.png'),
+            race = FEY)
+        self.rorthron = Actor(location = (41,13),
+            name = 'Rorthron',
+            title = 'the Wise',
+            #image
+            #image_mounted
+            mounted = True,
+            heraldry = os.path.join(IMG_PATH, 'shield_rorthron.png'),
+            race = WISE)
         self.actors.append(self.luxor)
         self.actors.append(self.morkin)
         self.actors.append(self.corleth)
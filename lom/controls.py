@@ -0,0 +1,37 @@
+#!/usr/bin/python
+'''
+The player's commands, kept apart from the keys that trigger them so that
+recorded sessions can be replayed without pygame. Each command is named by
+a single character: the one on its key.
+'''
+from __future__ import division, print_function, unicode_literals
+import constants
+
+LORDS = {'c': 'luxor', 'v': 'morkin', 'b': 'corleth', 'n': 'rorthron'} # Switch to a lord.
+HEADINGS = dict(zip('12345678', constants.HEADINGS)) # Face north, northeast, etc.
+ROTATE_CCW = '-'
+ROTATE_CW = '='
+MOVE = 'q'
+THINK = 'r'
+COMMANDS = ''.join(sorted(LORDS)) + ''.join(sorted(HEADINGS)) + ROTATE_CCW + ROTATE_CW + MOVE + THINK
+
+
+def perform(gamedata, command):
+    '''
+    Carries out `command` for the selected lord.
+    '''
+    actor = gamedata.actor
+    if command in LORDS:
+        gamedata.actor = getattr(gamedata, LORDS[command])
+    elif command in HEADINGS:
+        actor.heading = HEADINGS[command]
+    elif command == ROTATE_CCW:
+        actor.rotate_ccw()
+    elif command == ROTATE_CW:
+        actor.rotate_cw()
+    elif command == MOVE:
+        actor.move(gamedata)
+    elif command == THINK:
+        pass # TODO: enter the think screen.
+    else:
+        raise ValueError('Unknown command {0!r}.'.format(command))
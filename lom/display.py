@@ -0,0 +1,29 @@
+#!/usr/bin/python
+from __future__ import division, print_function, unicode_literals
+import os
+import pygame
+import constants
+
+
+def init(headless=None):
+    '''
+    Initialises pygame's display and returns the screen surface.
+    When `headless` is True (or the LOM_HEADLESS environment variable is set)
+    SDL's dummy video driver is used, so no window is opened but surfaces can
+    still be converted and drawn as normal.
+    '''
+    if headless is None:
+        headless = bool(os.environ.get('LOM_HEADLESS'))
+    if headless:
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    else:
+        os.environ['SDL_VIDEO_CENTERED'] = '1' # Centre the graphics window.
+    pygame.display.init()
+    pygame.font.init()
+    return pygame.display.set_mode(constants.SCREENSIZE, 0, 32)
+
+def offscreen(size=None):
+    '''
+    Returns a new surface the size of the screen (by default) to render into.
+    '''
+    return pygame.Surface(size or constants.SCREENSIZE, 0, 32)
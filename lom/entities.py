@@ -0,0 +1,166 @@
+#!/usr/bin/python
+from __future__ import division, print_function, unicode_literals
+import constants
+
+# World features that are entities standing on the map.
+FEATURE_KINDS = ('monster', 'object')
+
+
+class Band:
+    '''
+    A band of monsters of one type (a pack of wolves, say) on the map.
+    '''
+    kind = 'monster'
+
+    def __init__(self, monster):
+        self.monster = monster
+
+
+class Item:
+    '''
+    An Object lying on the map.
+    '''
+    kind = 'object'
+
+    def __init__(self, thing):
+        self.thing = thing
+
+
+class SpatialIndex:
+    '''
+    Entities bucketed by the cell they stand in. An entity is any object
+    with a `kind` ('lord', 'army', 'monster' or 'object'). Placing, moving
+    and removing one is O(1) (buckets only ever hold a handful), and so is
+    finding the entities on a square, by looking in its bucket.
+    Buckets are lists, so entities come out in the order they were placed.
+    '''
+    def __init__(self):
+        self.cells = {} # (row, col) -> list of the entities there.
+        self.locations = {} # Entity -> (row, col).
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __contains__(self, entity):
+        return entity in self.locations
+
+    def place(self, entity, location):
+        '''
+        Puts `entity` at `location`, moving it if it's already on the map.
+        '''
+        location = tuple(location)
+        old = self.locations.get(entity)
+        if old == location:
+            return
+        if old is not None:
+            self.cells[old].remove(entity)
+            if not self.cells[old]:
+                del self.cells[old]
+        self.locations[entity] = location
+        self.cells.setdefault(location, []).append(entity)
+
+    def remove(self, entity):
+        location = self.locations.pop(entity, None)
+        if location is not None:
+            self.cells[location].remove(entity)
+            if not self.cells[location]:
+                del self.cells[location]
+
+    def location(self, entity):
+        return self.locations.get(entity)
+
+    def at(self, location, kind=None):
+        '''
+        Returns the entities (of `kind`, if given) at `location`.
+        '''
+        found = self.cells.get(tuple(location), ())
+        return [e for e in found if kind is None or e.kind == kind]
+
+    def first(self, location, kind=None):
+        '''
+        Returns the first entity placed at `location` (of `kind`), or None.
+        '''
+        for entity in self.cells.get(tuple(location), ()):
+            if kind is None or entity.kind == kind:
+                return entity
+        return None
+
+    def entities(self, kind=None):
+        return [e for e in self.locations if kind is None or e.kind == kind]
+
+
+class EntityIndex(SpatialIndex):
+    '''
+    The SpatialIndex of everything in a world: the monsters and objects in
+    its features (which follow the world's changes), plus the lords and
+    armies of the game attached to it.
+    '''
+    def __init__(self, world):
+        SpatialIndex.__init__(self)
+        self.world = world
+        self.gamedata = None
+        for row, col in list(world.features):
+            self.load_features(row, col)
+        self.revision = world.revision
+
+    def load_features(self, row, col):
+        for key in FEATURE_KINDS:
+            name = self.world.feature(row, col, key)
+            if name:
+                entity = Band(monster_type(name)) if key == 'monster' else Item(object_type(name))
+                self.place(entity, (row, col))
+
+    def update(self):
+        world = self.world
+        if self.revision != world.revision:
+            for row, col in set(world.changes_since(self.revision, world.FEATURE)):
+                for entity in self.at((row, col)):
+                    if entity.kind in FEATURE_KINDS:
+                        self.remove(entity)
+                self.load_features(row, col)
+            self.revision = world.revision
+
+    def attach(self, gamedata):
+        '''
+        Places the lords and armies of `gamedata` (replacing any others), and
+        has the armies keep their places up to date as they march.
+        '''
+        for entity in self.entities('lord') + self.entities('army'):
+            self.remove(entity)
+        self.gamedata = gamedata
+        for actor in gamedata.actors + gamedata.npcs:
+            if actor.location is not None:
+                self.place(actor, actor.location)
+        armies = gamedata.armies
+        if armies is not None:
+            armies.index = self
+            for i in range(len(armies)):
+                if armies.strength[i] > 0:
+                    self.place(armies.unit(i), armies.location(i))
+
+
+def type_key(name):
+    return name.lower().replace(' ', '_')
+
+def monster_type(name):
+    '''
+    Returns the Monster that a world's 'monster' feature `name` refers to.
+    '''
+    return constants.MONSTER_TYPES[type_key(name)]
+
+def object_type(name):
+    '''
+    Returns the Object that a world's 'object' feature `name` refers to.
+    '''
+    return constants.OBJECT_TYPES[type_key(name)]
+
+def index_for(world):
+    '''
+    Returns the EntityIndex for `world` (building it on first use), up to
+    date with the world's changes.
+    '''
+    if 'entities' not in world.derived:
+        world.derived['entities'] = EntityIndex(world)
+    index = world.derived['entities']
+    index.update()
+    return index
@@ -0,0 +1,85 @@
+#!/usr/bin/python
+from __future__ import division, print_function, unicode_literals
+import pygame
+import constants
+from cache import LRUCache
+
+
+class TextCache:
+    '''
+    Rendered lines of text in one typeface (FONT_BENG by default), in an
+    LRU cache keyed by (text, colour, size), so a line that's already been
+    drawn costs one blit. Word-wrapping is cached the same way.
+    (SDL_ttf already caches the glyphs themselves, so lines missing from the
+    cache are rendered by the font: laying them out glyph by glyph from an
+    atlas in Python was measured to be many times slower.)
+    '''
+    def __init__(self, path=None, capacity=512):
+        self.path = path or constants.FONT_BENG
+        self.fonts = {} # Size -> pygame Font.
+        self.lines = LRUCache(capacity)
+        self.wraps = LRUCache(capacity)
+
+    def font(self, size):
+        if size not in self.fonts:
+            self.fonts[size] = pygame.font.Font(self.path, size)
+        return self.fonts[size]
+
+    def line(self, text, colour, size=16):
+        '''
+        Returns a surface with `text` drawn on it in `colour`.
+        '''
+        key = (text, tuple(colour), size)
+        surface = self.lines.get(key)
+        if surface is None:
+            surface = self.lines.put(key, self.font(size).render(text, True, colour))
+        return surface
+
+    def write(self, screen, pos, colour, text, size=16):
+        '''
+        Draws a line of text at `pos` and returns the area drawn.
+        '''
+        return screen.blit(self.line(text, colour, size), pos)
+
+    def wrap(self, text, width, size=16):
+        '''
+        Returns `text` split into lines that fit in `width` pixels, breaking
+        between words (and at newlines).
+        '''
+        key = (text, width, size)
+        lines = self.wraps.get(key)
+        if lines is None:
+            font = self.font(size)
+            lines = []
+            for paragraph in text.split('\n'):
+                line = ''
+                for word in paragraph.split(' '):
+                    candidate = line + ' ' + word if line else word
+                    if line and font.size(candidate)[0] > width:
+                        lines.append(line)
+                        line = word
+                    else:
+                        line = candidate
+                lines.append(line)
+            self.wraps.put(key, lines)
+        return lines
+
+    def write_wrapped(self, screen, rect, colour, text, size=16):
+        '''
+        Draws `text` word-wrapped to fit the width of `rect`, starting at
+        its top left, and returns the y coordinate below the last line.
+        '''
+        rect = pygame.Rect(rect)
+        y = rect.top
+        for line in self.wrap(text, rect.width, size):
+            if line:
+                self.write(screen, (rect.left, y), colour, line, size)
+            y += self.font(size).get_linesize()
+        return y
+
+    def stats(self):
+        return {'lines': self.lines.stats(), 'wraps': self.wraps.stats()}
+
+
+# The game's shared text cache. Must be used after pygame.font.init().
+cache = TextCache()
@@ -0,0 +1,212 @@
+#!/usr/bin/python
+'''
+The Ice Fear: how strongly Doomdark's cold will is felt on every square.
+
+Fear radiates from Doomdark's strongholds (constants.ICE_FEAR_SOURCES, from
+every square bearing the stronghold's name) and from his armies, fading with distance and more quickly through terrain
+that shields against it (BARRIERS). The FearField holds the total fear on
+every square, so reading it is O(1). Each source's contribution is kept,
+so moving or destroying a source only subtracts its old contribution and
+adds the new one, rather than summing over every source again.
+'''
+from __future__ import division, print_function, unicode_literals
+from array import array
+import heapq
+import constants
+from cache import LRUCache
+
+MAX_FEAR = 127
+STRONGHOLD_RANGE = 48 # Squares a stronghold's fear reaches (over open ground).
+ARMY_RANGE = 8
+ARMY_FEAR = 48 # The most fear any one army spreads.
+STRENGTH_PER_FEAR = 25 # Army strength per point of fear at the army's square.
+BORDER = float('inf')
+# How many times over each square of these terrains counts towards the distance fear travels.
+BARRIERS = {'mountains': 3, 'forest': 1.5, 'downs': 1.25}
+
+
+class Source:
+    '''
+    One source's contribution to the field: the flat indexes of the cells
+    it reaches, and the fear it adds to each. A source may stand on several
+    squares (`locations`), e.g. a stronghold covering more than one.
+    '''
+    def __init__(self, locations, power, radius, cells, values):
+        self.locations = locations
+        self.power = power
+        self.radius = radius
+        self.cells = cells
+        self.values = values
+
+
+class FearField:
+    '''
+    The Ice Fear on every square of a world, as one int per cell: the sum
+    of every source's contribution. Sources are keyed (e.g. ('army', 12)),
+    and added, moved and removed one at a time. Terrain changes re-spread
+    the sources that reach the changed squares.
+    '''
+    def __init__(self, world):
+        self.world = world
+        self.fear = array(str('i'), [0]) * (world.rows * world.cols)
+        self.sources = {} # Key -> Source.
+        self.barriers = [BARRIERS.get(t.terrain_type, 1) for t in world.terrains]
+        # The barrier of every square, with a border that fear can't cross, so
+        # spreading it needs no bounds checks (or reads of a memory-mapped world).
+        self.width = world.cols + 2
+        self.plane = array(str('d'), [BORDER]) * (self.width * (world.rows + 2))
+        for row in range(world.rows):
+            for col in range(world.cols):
+                self.set_barrier(row, col)
+        self.reaches = LRUCache(4096) # See reach().
+        self.revision = world.revision
+        self.gamedata = None
+        strongholds = dict((name, []) for name in constants.ICE_FEAR_SOURCES)
+        for row in range(world.rows):
+            for col in range(world.cols):
+                name = world.name_at(row, col)
+                if name in strongholds:
+                    strongholds[name].append((row, col))
+        for name, power in sorted(constants.ICE_FEAR_SOURCES.items()):
+            if strongholds[name]:
+                self.set_source(('stronghold', name), strongholds[name], power, STRONGHOLD_RANGE)
+
+    def at(self, location):
+        '''
+        Returns the fear (0 to MAX_FEAR) at `location`.
+        '''
+        if not self.world.in_bounds(*location):
+            return 0
+        return min(MAX_FEAR, self.fear[location[0] * self.world.cols + location[1]])
+
+    def set_barrier(self, row, col):
+        world = self.world
+        self.plane[(row + 1) * self.width + col + 1] = self.barriers[world.terrain[row * world.cols + col]]
+
+    def reach(self, locations, radius):
+        '''
+        Returns the cells within `radius` of any of `locations` as fear
+        travels (counting diagonal steps as 1.4 squares, and barrier terrain
+        as more), and their distances from the nearest. Cached until the
+        terrain around changes, since armies keep passing over the same squares.
+        '''
+        world = self.world
+        # The barriers must be up to date, or a stale spread would be cached as current.
+        if self.revision != world.revision:
+            self.update()
+        key = (locations, radius, max(world.region_revision(row, col, int(radius), world.TERRAIN)
+            for row, col in locations))
+        found = self.reaches.get(key)
+        if found:
+            return found
+        plane, width, cols = self.plane, self.width, world.cols
+        steps = [(h.offset[0] * width + h.offset[1], 1 if h.cardinal else 1.4) for h in constants.HEADINGS]
+        distances = dict(((row + 1) * width + col + 1, 0) for row, col in locations)
+        queue = [(0, start) for start in sorted(distances)]
+        cells, reached = array(str('i')), array(str('d'))
+        while queue:
+            distance, i = heapq.heappop(queue)
+            if distance > distances[i]:
+                continue
+            row, col = divmod(i, width)
+            cells.append((row - 1) * cols + col - 1)
+            reached.append(distance)
+            for offset, length in steps:
+                n = i + offset
+                d = distance + length * plane[n]
+                if d < radius and d < distances.get(n, radius):
+                    distances[n] = d
+                    heapq.heappush(queue, (d, n))
+        return self.reaches.put(key, (cells, reached))
+
+    def spread(self, locations, power, radius):
+        '''
+        Returns the (cells, values) that a source of `power` on `locations`
+        adds to the field: power fading to nothing at `radius` squares.
+        '''
+        cells, distances = self.reach(locations, radius)
+        kept, values = array(str('i')), array(str('i'))
+        for i, distance in zip(cells, distances):
+            value = int(power * (1 - distance / radius) + 0.5)
+            if value > 0:
+                kept.append(i)
+                values.append(value)
+        return kept, values
+
+    def set_source(self, key, locations, power, radius):
+        '''
+        Adds the source `key` standing on the squares `locations`, or moves
+        it (or changes its power).
+        '''
+        locations = tuple(sorted(tuple(location) for location in locations))
+        old = self.sources.get(key)
+        if old and old.locations == locations and old.power == power and old.radius == radius:
+            return
+        self.remove_source(key)
+        cells, values = self.spread(locations, power, radius)
+        fear = self.fear
+        for i, value in zip(cells, values):
+            fear[i] += value
+        self.sources[key] = Source(locations, power, radius, cells, values)
+
+    def remove_source(self, key):
+        source = self.sources.pop(key, None)
+        if source:
+            fear = self.fear
+            for i, value in zip(source.cells, source.values):
+                fear[i] -= value
+
+    def update(self):
+        '''
+        Re-spreads the sources whose fear reaches any square changed since
+        the field was last updated.
+        '''
+        world = self.world
+        if self.revision == world.revision:
+            return
+        changes = set(world.changes_since(self.revision, world.TERRAIN))
+        for row, col in changes:
+            self.set_barrier(row, col)
+        # Up to date from here on, as far as re-spreading (through reach()) is concerned.
+        self.revision = world.revision
+        changed = set(r * world.cols + c for r, c in changes)
+        for key, source in list(self.sources.items()):
+            # A changed square just beyond a source's reach may now let it through.
+            if any(abs(i // world.cols - row) <= source.radius and abs(i % world.cols - col) <= source.radius
+                    for i in changed for row, col in source.locations):
+                self.remove_source(key)
+                self.set_source(key, source.locations, source.power, source.radius)
+
+    def sync(self, gamedata):
+        '''
+        Brings the armies' sources up to date with `gamedata`: every army of
+        the Foul spreads fear from where it stands, in proportion to its
+        strength, until it's destroyed.
+        '''
+        self.gamedata = gamedata
+        armies = gamedata.armies
+        foul = armies.race_codes.get(constants.FOUL) if armies is not None else None
+        seen = set()
+        for i in range(len(armies) if armies is not None else 0):
+            power = min(ARMY_FEAR, armies.strength[i] // STRENGTH_PER_FEAR)
+            if armies.race[i] == foul and power > 0:
+                self.set_source(('army', i), [armies.location(i)], power, ARMY_RANGE)
+                seen.add(('army', i))
+        for key in [k for k in self.sources if k[0] == 'army' and k not in seen]:
+            self.remove_source(key)
+
+
+def field_for(gamedata):
+    '''
+    Returns the FearField for `gamedata`'s world (building it on first use),
+    up to date with the world's changes. Its armies are synced when the
+    field is first used by a game; NightPhase re-syncs them every night.
+    '''
+    world = gamedata.world
+    if 'icefear' not in world.derived:
+        world.derived['icefear'] = FearField(world)
+    field = world.derived['icefear']
+    field.update()
+    if field.gamedata is not gamedata:
+        field.sync(gamedata)
+    return field
@@ -0,0 +1,108 @@
+#!/usr/bin/python
+from __future__ import division, print_function, unicode_literals
+import constants
+
+OFF_MAP = -1
+_DEFAULT = object() # index_for's limit when none is given: use constants.LOOK_AHEAD.
+
+
+class LookaheadIndex:
+    '''
+    For every (cell, heading) pair, the cell an Actor standing there is
+    "looking towards": the first cell ahead that isn't plains, looking at
+    most `limit` squares ahead (the last cell looked at if they're all
+    plains). A limit of None looks as far as the edge of the map.
+    Cells are stored as flat indexes (row * cols + col), or OFF_MAP.
+    Each entry is worked out the first time it's asked for (so big maps
+    cost nothing up front), and the index follows changes to the world's
+    terrain incrementally.
+    '''
+    def __init__(self, world, limit=None, headings=None):
+        self.world = world
+        self.limit = limit
+        self.headings = headings or constants.HEADINGS
+        self.targets = dict((h.name, {}) for h in self.headings) # Heading name -> {cell: target cell}.
+        self.revision = world.revision
+
+    def walk(self, row, col, heading):
+        '''
+        Returns the target cell for (row, col) looking along `heading`.
+        '''
+        rows, cols, terrain = self.world.rows, self.world.cols, self.world.terrain
+        plains = self.world.terrain_codes.get(constants.PLAINS)
+        limit = self.limit or rows + cols
+        dr, dc = heading.offset
+        row, col = row + dr, col + dc
+        if not (0 <= row < rows and 0 <= col < cols):
+            return OFF_MAP
+        steps = 1
+        # Still facing plains? Look further ahead (but not off the map).
+        while terrain[row * cols + col] == plains and steps < limit:
+            if not (0 <= row + dr < rows and 0 <= col + dc < cols):
+                break
+            row, col = row + dr, col + dc
+            steps += 1
+        return row * cols + col
+
+    def update(self):
+        '''
+        Forgets the entries affected by cells changed since the index was
+        last updated: the cells behind each change that could see through
+        plains as far as it.
+        '''
+        world = self.world
+        if self.revision == world.revision:
+            return
+        for row, col in set(world.changes_since(self.revision, world.TERRAIN)):
+            for heading in self.headings:
+                targets = self.targets[heading.name]
+                dr, dc = heading.offset
+                steps = 1
+                while True:
+                    r, c = row - dr * steps, col - dc * steps
+                    if not world.in_bounds(r, c):
+                        break
+                    targets.pop(r * world.cols + c, None)
+                    # Cells further back only see this far past plains.
+                    if (self.limit is not None and steps >= self.limit) or \
+                            world.terrain_at(r, c) != constants.PLAINS:
+                        break
+                    steps += 1
+        self.revision = world.revision
+
+    def target(self, location, heading):
+        '''
+        Returns the (row, col) being looked towards, or None if it's off the map.
+        '''
+        self.update()
+        targets = self.targets[heading.name]
+        i = location[0] * self.world.cols + location[1]
+        cell = targets.get(i)
+        if cell is None:
+            cell = targets[i] = self.walk(location[0], location[1], heading)
+        if cell == OFF_MAP:
+            return None
+        return divmod(cell, self.world.cols)
+
+    def target_name(self, location, heading):
+        '''
+        Returns the name of the place being looked towards.
+        '''
+        target = self.target(location, heading)
+        if target is None:
+            return constants.FROZEN_WASTES.name.title()
+        return self.world.name_at(*target)
+
+
+def index_for(world, limit=_DEFAULT):
+    '''
+    Returns the LookaheadIndex for `world` (building it on first use),
+    looking at most `limit` squares ahead (by default constants.LOOK_AHEAD).
+    A limit of None looks as far as the edge of the map.
+    '''
+    if limit is _DEFAULT:
+        limit = constants.LOOK_AHEAD
+    key = ('lookahead', limit)
+    if key not in world.derived:
+        world.derived[key] = LookaheadIndex(world, limit)
+    return world.derived[key]
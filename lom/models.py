@@ -1,8 +1,10 @@
 #!/usr/bin/python
 from __future__ import division, print_function, unicode_literals
-import pygame
 import constants
-import utils
+import entities
+import icefear
+import lookahead
+import profiling
 
 
 class Heading:
@@ -15,15 +17,30 @@ class Heading:
         self.view_offsets = view_offsets
 
 class Terrain:
-    def __init__(self, terrain_type, image=None, move_cost=None, energy_cost=None):
+    def __init__(self, terrain_type, image=None, move_cost=None, energy_cost=None, defence=None):
         self.terrain_type = terrain_type
         self.image = image
         self.move_cost = move_cost or 1 # Base move cost is one hour (when mounted).
         self.energy_cost = energy_cost or 8
+        self.defence = defence or 1 # Multiplies the strength of an army defending this square.
         
     @property
     def name(self):
-        return self.name.replace('_', ' ')
+        return self.terrain_type.replace('_', ' ')
+
+    def travel_time(self, cardinal=True, mounted=True):
+        '''
+        Returns the hours it takes to move into a square of this terrain.
+        '''
+        # Travelling on foot doubles the terrain move cost.
+        if not mounted:
+            move_cost = self.move_cost * 2
+        else:
+            move_cost = self.move_cost
+        # Moving in one of the intercardinal directions adds 40% to move cost.
+        if not cardinal:
+            move_cost = move_cost * 1.4
+        return move_cost
 
 class Object:
     def __init__(self, *args, **kwargs):
@@ -32,17 +49,21 @@ class Object:
 class Monster:
     def __init__(self, *args, **kwargs):
         self.name = kwargs.get('name')
-        self.hostile = kwargs.get('hostile') or True
+        self.hostile = kwargs.get('hostile', True)
         self.image = kwargs.get('image')
         self.strength = kwargs.get('strength')
         self.bane = kwargs.get('bane') # Is there an "auto-kill" object for this monster?
         
 class Race:
     def __init__(self, *args, **kwargs):
-        self.name = kwargs.get('name')
+        # Races are defined as Race('free'), so take the name positionally too.
+        self.name = kwargs.get('name') or (args[0] if args else None)
+        self.prowess = kwargs.get('prowess', 1) # Multiplies the strength of its armies in battle.
         # TODO: Add more racial attributes.
 
 class Actor:
+    kind = 'lord' # See entities.py.
+
     def __init__(self, *args, **kwargs):
         self.location = kwargs.get('location') # A two-tuple coordinate (NOT x,y coords) of current grid location.
         self.heading = kwargs.get('heading') or constants.NORTH
@@ -55,10 +76,10 @@ class Actor:
         self.energy = kwargs.get('energy') or 127 # Energy ranges between 0 and 127.
         self.health = kwargs.get('health') or 127 # Health level for a Lord ranges between 0 (dead) and 127 (full health).
         self.weapon = kwargs.get('weapon') or None
-        self.mounted = kwargs.get('mounted') or True
+        self.mounted = kwargs.get('mounted', True)
         self.heraldry = kwargs.get('heraldry') or None
         self.race = kwargs.get('race') or None
-        self.icefear = kwargs.get('icefear') or 1 # Set to False if Actor is immune to the Ice Fear.
+        self.icefear = kwargs.get('icefear', True) # Set to False if Actor is immune to the Ice Fear.
 
     def rotate_cw(self):
         # Alters the Actor's bearing and heading by 45 degrees clockwise.
@@ -84,22 +105,33 @@ class Actor:
             bearing -= 45
         self.heading = headings[str(bearing)]
         
+    @profiling.timed('location_desc')
     def location_desc(self, world):
         '''
         Returns a string description of where the Actor is standing, plus what they are looking at.
         '''
         location_desc = 'He stands at {0}, looking {1} to {2}.'
-        current_location = world[self.location[0]][self.location[1]]
-        offset = self.heading.offset
-        facing_grid = (self.location[0] + offset[0], self.location[1] + offset[1])
-        facing_location = world[facing_grid[0]][facing_grid[1]]
-        # Still facing plains? Look further ahead.
-        # TODO: only look three squares ahead.
-        while facing_location.get('terrain_type') == constants.PLAINS:
-            facing_grid = (facing_grid[0] + offset[0], facing_grid[1] + offset[1])
-            facing_location = world[facing_grid[0]][facing_grid[1]]
-        return location_desc.format(current_location.get('name'), self.heading.name,
-            facing_location.get('name'))
+        # Facing plains? The index has already looked further ahead (up to LOOK_AHEAD squares).
+        facing_name = lookahead.index_for(world).target_name(self.location, self.heading)
+        return location_desc.format(world.name_at(*self.location), self.heading.name, facing_name)
+
+    def fear(self, gamedata):
+        '''
+        Returns the Ice Fear the Actor feels where they stand (0 if immune).
+        '''
+        if not self.icefear:
+            return 0
+        return icefear.field_for(gamedata).at(self.location)
+
+    def fear_desc(self, gamedata):
+        '''
+        Returns a description of the Ice Fear the Actor feels, for the think screen.
+        '''
+        if not self.icefear:
+            return 'He is untouched by the Ice Fear.'
+        levels = ['faint', 'chilling', 'strong', 'great', 'deadly']
+        fear = self.fear(gamedata)
+        return 'The Ice Fear is {0}.'.format(levels[min(len(levels) - 1, fear * len(levels) // (icefear.MAX_FEAR + 1))])
 
     def clock_energy_desc(self, gamedata):
         '''
@@ -119,86 +151,75 @@ class Actor:
         # Invigorated
         return 'message'
         
+    @profiling.timed('move')
     def move(self, gamedata):
+        '''
+        Moves the Actor one square along their heading, if they can.
+        Returns True if they moved.
+        '''
         #print('Started at {0}'.format(self.location))
         offset = self.heading.offset
-        dest_terrain = gamedata.world[self.location[0] + offset[0]][self.location[1] + offset[1]].get('terrain_type')
+        dest_terrain = gamedata.world.terrain_at(self.location[0] + offset[0], self.location[1] + offset[1])
         #print(dest_terrain.terrain_type)
         if dest_terrain == constants.FROZEN_WASTES:
             # Actor can't move into Frozen Wastes, even if cheating.
-            return
+            return False
         # Can't move at night, even if cheating.
         if self.time >= gamedata.nightfall:
-            return
+            return False
         # Enough time left in the day to move?
-        # Travelling on foot doubles the terrain move cost.
-        if not self.mounted:
-            move_cost = dest_terrain.move_cost * 2
-        else:
-            move_cost = dest_terrain.move_cost
-        # Moving in one of the intercardinal directions adds 40% to move cost.
-        if not self.heading.cardinal:
-            move_cost = move_cost * 1.4
+        move_cost = dest_terrain.travel_time(self.heading.cardinal, self.mounted)
         if gamedata.cheatmode:
             # If we're cheating, we can move as far as we want with no energy cost.
             self.location = (self.location[0] + offset[0], self.location[1] + offset[1])
-        else:
-            if self.time + move_cost <= gamedata.nightfall:
-                # Enough energy left to move?
-                if self.energy >= dest_terrain.energy_cost:
-                    # Set new location
-                    self.location = (self.location[0] + offset[0], self.location[1] + offset[1])
-                    self.time += move_cost
-                    # Subtract energy cost
-                    self.energy -= dest_terrain.energy_cost
-                else:
-                    print('Not enough energy left.')
-            else:
-                print('Not enough hours left.')
+            gamedata.entities.place(self, self.location)
+            return True
+        # Enough hours left in the day, and enough energy left to move?
+        if self.time + move_cost > gamedata.nightfall or self.energy < dest_terrain.energy_cost:
+            return False
+        # Set new location
+        self.location = (self.location[0] + offset[0], self.location[1] + offset[1])
+        gamedata.entities.place(self, self.location)
+        self.time += move_cost
+        # Subtract energy cost
+        self.energy -= dest_terrain.energy_cost
         #print('Moved to {0}'.format(self.location))
         #print('Time: {0}'.format(self.time))
+        return True
 
+    @profiling.timed('render_perspective')
     def render_perspective(self, world, screen):
-        world_rows = len(world)
-        world_cols = len(world[0])
-        offset = self.heading.offset
-        for node in self.heading.view_offsets:
-            # If we're off the edge of the map, terrain == FROZEN_WASTES
-            if self.location[0] + node[1][0] < 0 or self.location[0] + node[1][0] >= world_rows:
-                terrain = constants.FROZEN_WASTES
-            elif self.location[1] + node[1][1] < 0 or self.location[1] + node[1][1] >= world_cols:
-                terrain = constants.FROZEN_WASTES
-            else:
-                location = world[self.location[0] + node[1][0]][self.location[1] + node[1][1]]
-                terrain = location.get('terrain_type')
-            # TODO: if terrain == PLAINS and there's an army present, draw it.
-            if terrain.image:
-                terrain_img = pygame.image.load(terrain.image).convert_alpha()
-                # Scale the image
-                img_x = terrain_img.get_width() * node[2]
-                img_y = terrain_img.get_height() * node[2]
-                terrain_img = utils.aspect_scale(terrain_img, (img_x,img_y))
-                x = node[0][0] - (terrain_img.get_width()/2)
-                y = node[0][1] - terrain_img.get_height()
-                screen.blit(terrain_img, (x,y))
-        # Check the facing direction for monsters, wild horses, armies, or other lords.
-        facing_coord = (self.location[0] + offset[0], self.location[1] + offset[1])
-        facing_location = world[facing_coord[0]][facing_coord[1]]
-        if facing_location.get('monster'):
-            monster = eval('constants.' + facing_location.get('monster').upper())
-            monster_img = pygame.image.load(monster.image).convert_alpha()
-            blit_y = (constants.SCREENSIZE[1] - monster_img.get_height())
-            screen.blit(monster_img, (500,blit_y))
+        # Imported here so that the game rules can be used without loading pygame.
+        import panorama
+        # TODO: if terrain == PLAINS and there's an army present, draw it.
+        panorama.render_view(screen, world, self.location, self.heading)
 
 class GameData:
     '''
     This class stores everything about a game in progress. 
     '''
-    world = None # A list of lists, each containing a number of dictionaries (one for each node).
-    actor = None # Currently-selected actors
-    actors = [] # A list of all player-controllable actors.
-    npcs = [] # A list of NPC actors.
-    game_days = 0 # Days passed since the start of the game.
-    cheatmode = False
     dawn = 8 # 8AM is dawn.
     nightfall = 16 # 4PM is nightfall. The sun sure sets early here!
+
+    def __init__(self, *args, **kwargs):
+        # Game state is set per instance, so that games never share their lists.
+        self.world = kwargs.get('world') # A WorldGrid of the map (see world.py).
+        self.world_hash = None # Content hash of the saved world the current one is based on (see savegame.py).
+        self.world_base = 0 # World revision at which it matched that saved world.
+        self.world_changes = None # The cells changed since then (see savegame.Changes).
+        self.actor = None # Currently-selected actors
+        self.actors = [] # A list of all player-controllable actors.
+        self.npcs = [] # A list of NPC actors.
+        self.armies = None # An Armies table of every army (see armies.py).
+        self.game_days = 0 # Days passed since the start of the game.
+        self.cheatmode = kwargs.get('cheatmode') or False
+
+    @property
+    def entities(self):
+        '''
+        The EntityIndex of the world, with this game's lords and armies in it.
+        '''
+        index = entities.index_for(self.world)
+        if index.gamedata is not self:
+            index.attach(self)
+        return index
@@ -0,0 +1,166 @@
+#!/usr/bin/python
+from __future__ import division, print_function, unicode_literals
+import pygame
+import constants
+import entities
+import profiling
+import sprites
+import visibility
+from cache import LRUCache
+from visibility import VIEW_RANGE
+
+
+class DrawList:
+    '''
+    A heading's view_offsets table compiled against the terrain sprites.
+    For every node this holds the ready-scaled surface and screen position of
+    each terrain type, so drawing a view is just a terrain lookup per node
+    followed by one batched blit.
+    '''
+    def __init__(self, heading, terrains=None, cache=None):
+        self.heading = heading
+        terrains = terrains or constants.TERRAINS
+        cache = cache or sprites.cache
+        self.nodes = [] # {terrain: (surface, dest)} for each node, in draw order.
+        self.bounds = None # The screen area covered by every possible sprite.
+        for coords, _, scale in heading.view_offsets:
+            blits = {}
+            for terrain in terrains:
+                if terrain.image:
+                    surface = cache.get(terrain.image, scale)
+                    dest = (coords[0] - (surface.get_width()/2), coords[1] - surface.get_height())
+                    blits[terrain] = (surface, dest)
+                    rect = pygame.Rect(dest, surface.get_size())
+                    self.bounds = self.bounds.union(rect) if self.bounds else rect
+            self.nodes.append(blits)
+
+    def entries(self, world, location):
+        '''
+        Returns the list of (surface, dest) pairs to draw for a view from
+        `location`, in draw order (furthest first).
+        '''
+        entries = []
+        terrains = world.terrains
+        for blits, code in zip(self.nodes, visibility.view_codes(world, location, self.heading)):
+            blit = blits.get(terrains[code])
+            if blit:
+                entries.append(blit)
+        return entries
+
+    def render(self, screen, world, location):
+        blit_all(screen, self.entries(world, location))
+
+
+class PanoramaCache:
+    '''
+    Fully composited panoramas (background included) keyed by location,
+    heading and the revision of the world within view range, so changing any
+    cell the view can see (a monster or army moving, say) invalidates it.
+    When a view from a new location is rendered, the views along the other
+    headings are queued to be rendered speculatively while the game is idle.
+    '''
+    def __init__(self, rect, background, budget=64 * 1024 * 1024):
+        self.rect = pygame.Rect(rect) # The area of the screen a panorama covers.
+        self.background = background # Draws whatever lies behind the view.
+        self.surfaces = LRUCache(budget, sizeof=surface_bytes)
+        self.pending = [] # (world, location, heading) views to render when idle.
+        self.scratch = None
+
+    def key(self, world, location, heading):
+        return (tuple(location), heading.name,
+            world.region_revision(location[0], location[1], VIEW_RANGE))
+
+    def get(self, world, location, heading):
+        '''
+        Returns the composited panorama for a view, rendering it on a miss.
+        '''
+        key = self.key(world, location, heading)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.surfaces.put(key, self.render(world, location, heading))
+            self.pending = [(world, location, h) for h in constants.HEADINGS if h is not heading]
+        return surface
+
+    def render(self, world, location, heading):
+        if self.scratch is None:
+            self.scratch = pygame.Surface(constants.SCREENSIZE).convert()
+        self.background(self.scratch)
+        render_view(self.scratch, world, location, heading)
+        return self.scratch.subsurface(self.rect).copy()
+
+    def render_pending(self):
+        '''
+        Renders one queued view that isn't cached yet. Returns True if a view
+        was rendered, False if there was nothing left to do.
+        '''
+        while self.pending:
+            world, location, heading = self.pending.pop(0)
+            key = self.key(world, location, heading)
+            if key not in self.surfaces:
+                self.surfaces.put(key, self.render(world, location, heading))
+                return True
+        return False
+
+
+@profiling.timed('render_view')
+def render_view(screen, world, location, heading):
+    '''
+    Draws the view from `location` looking along `heading`: the terrain,
+    then anything standing in the square in front.
+    '''
+    draw_list(heading).render(screen, world, location)
+    # Check the facing direction for monsters, wild horses, armies, or other lords.
+    offset = heading.offset
+    band = entities.index_for(world).first((location[0] + offset[0], location[1] + offset[1]), 'monster')
+    if band:
+        monster_img = sprites.cache.get(band.monster.image)
+        blit_y = (constants.SCREENSIZE[1] - monster_img.get_height())
+        screen.blit(monster_img, (500,blit_y))
+
+def surface_bytes(surface):
+    return surface.get_pitch() * surface.get_height()
+
+def blit_all(screen, entries):
+    '''
+    Draws a list of (surface, dest) pairs onto `screen` in a single batch
+    (falling back to individual blits on Pygame versions without blits()).
+    '''
+    if hasattr(screen, 'blits'):
+        screen.blits(entries, 0)
+    else:
+        for surface, dest in entries:
+            screen.blit(surface, dest)
+
+
+_draw_lists = {}
+
+def draw_list(heading):
+    '''
+    Returns the compiled DrawList for `heading`, compiling it on first use.
+    Must be called after the display mode has been set.
+    '''
+    try:
+        return _draw_lists[heading.name]
+    except KeyError:
+        return _draw_lists.setdefault(heading.name, DrawList(heading))
+
+def screen_rect(headings=None):
+    '''
+    Returns the area of the screen that rendering a panorama can draw to:
+    every heading's terrain sprites plus the monster drawn in the foreground.
+    '''
+    rect = None
+    for heading in headings or constants.HEADINGS:
+        bounds = draw_list(heading).bounds
+        rect = rect.union(bounds) if rect else bounds
+    for monster in constants.MONSTERS:
+        image = sprites.cache.get(monster.image)
+        rect = rect.union(pygame.Rect((500, constants.SCREENSIZE[1] - image.get_height()), image.get_size()))
+    return rect.clip(pygame.Rect((0, 0), constants.SCREENSIZE))
+
+def compile_all(headings=None):
+    '''
+    Compiles the draw lists for every heading up front.
+    '''
+    for heading in headings or constants.HEADINGS:
+        draw_list(heading)
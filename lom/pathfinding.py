@@ -0,0 +1,187 @@
+#!/usr/bin/python
+from __future__ import division, print_function, unicode_literals
+from array import array
+import heapq
+import math
+import constants
+
+IMPASSABLE = float('inf')
+HOURS_PER_DAY = 24
+
+
+class CostField:
+    '''
+    The cost of moving into every cell of the world, for one mode of travel
+    (mounted or on foot): the cardinal travel time in hours and the energy
+    spent. Stored in flat arrays with a one-cell impassable border, so
+    neighbours never need bounds checks. Follows the world's terrain changes.
+    '''
+    def __init__(self, world, mounted):
+        self.world = world
+        self.mounted = mounted
+        self.width = world.cols + 2
+        size = self.width * (world.rows + 2)
+        self.hours = array(str('d'), [IMPASSABLE]) * size
+        self.energy = array(str('d'), [IMPASSABLE]) * size
+        # Cost of each terrain code.
+        self.code_hours = [self.terrain_hours(t) for t in world.terrains]
+        self.code_energy = [IMPASSABLE if t == constants.FROZEN_WASTES else t.energy_cost
+            for t in world.terrains]
+        for row in range(world.rows):
+            for col in range(world.cols):
+                self.set_cell(row, col)
+        self.revision = world.revision
+
+    def terrain_hours(self, terrain):
+        # Actors can't move into Frozen Wastes.
+        if terrain == constants.FROZEN_WASTES:
+            return IMPASSABLE
+        return terrain.travel_time(True, self.mounted)
+
+    def set_cell(self, row, col):
+        code = self.world.terrain[row * self.world.cols + col]
+        i = self.index((row, col))
+        self.hours[i] = self.code_hours[code]
+        self.energy[i] = self.code_energy[code]
+
+    def update(self):
+        if self.revision != self.world.revision:
+            for row, col in set(self.world.changes_since(self.revision, self.world.TERRAIN)):
+                self.set_cell(row, col)
+            self.revision = self.world.revision
+
+    def index(self, location):
+        return (location[0] + 1) * self.width + location[1] + 1
+
+    def location(self, index):
+        row, col = divmod(index, self.width)
+        return (row - 1, col - 1)
+
+
+class Route:
+    '''
+    A route found by find_route: the cells visited after the start, the same
+    cells split into day-long legs, the (day, hour) of arrival (day 0 being
+    the day the journey starts), and the total travel hours and energy.
+    '''
+    def __init__(self, cells, legs, arrival, hours, energy):
+        self.cells = cells
+        self.legs = legs
+        self.arrival = arrival
+        self.hours = hours
+        self.energy = energy
+
+    @property
+    def days(self):
+        return len(self.legs)
+
+
+def cost_field(world, mounted=True):
+    '''
+    Returns the (cached) CostField for `world`, up to date with its changes.
+    '''
+    key = ('costs', bool(mounted))
+    if key not in world.derived:
+        world.derived[key] = CostField(world, mounted)
+    field = world.derived[key]
+    field.update()
+    return field
+
+def advance(day, hour, cost, dawn, nightfall):
+    '''
+    Returns the (day, hour) after a move taking `cost` hours, starting at
+    (day, hour): the move happens today if it can be finished by nightfall,
+    otherwise at dawn the next day. Returns None if it can't be made in a day.
+    '''
+    if hour + cost <= nightfall:
+        return (day, hour + cost)
+    if dawn + cost <= nightfall:
+        return (day + 1, dawn + cost)
+    return None
+
+def find_route(world, start, goal, mounted=True, least_energy=False, start_time=8, dawn=8, nightfall=16):
+    '''
+    Finds the fastest route (or, with least_energy, the route spending the
+    least energy) from `start` to `goal` with A*, using the same rules as
+    Actor.move: terrain move costs, doubled on foot, +40% for intercardinal
+    moves, no moving into the Frozen Wastes and no moving after nightfall.
+    Returns a Route, or None if the goal can't be reached.
+    '''
+    field = cost_field(world, mounted)
+    hours, energy, width = field.hours, field.energy, field.width
+    moves = [(h.offset[0] * width + h.offset[1], 1 if h.cardinal else 1.4) for h in constants.HEADINGS]
+    start_i, goal_i = field.index(start), field.index(goal)
+    min_hours = min(field.code_hours)
+    min_energy = min(field.code_energy)
+
+    day_length = nightfall - dawn
+
+    def estimate(i, day, hour, spent):
+        # A lower bound on the cost of reaching the goal from cell i: every
+        # step over the cheapest terrain, travelling from dawn to nightfall.
+        dr, dc = divmod(i, width)
+        dr, dc = abs(dr - goal_i // width), abs(dc - goal_i % width)
+        if least_energy:
+            return spent + max(dr, dc) * min_energy
+        remaining = (max(dr, dc) - min(dr, dc)) * min_hours + min(dr, dc) * min_hours * 1.4
+        excess = remaining - max(nightfall - hour, 0)
+        if excess <= 0:
+            return day * HOURS_PER_DAY + hour + remaining
+        nights = int(math.ceil(excess / day_length))
+        return (day + nights) * HOURS_PER_DAY + dawn + excess - (nights - 1) * day_length
+
+    # Each label is (day, hour, energy) on arrival at the cell.
+    labels = {start_i: (0, start_time, 0)}
+    parents = {start_i: None}
+    # Ties are broken in favour of the cell with the furthest progress made.
+    queue = [(estimate(start_i, 0, start_time, 0), 0, start_i)]
+    closed = set()
+    while queue:
+        _, _, i = heapq.heappop(queue)
+        if i in closed:
+            continue
+        if i == goal_i:
+            break
+        closed.add(i)
+        day, hour, spent = labels[i]
+        for offset, factor in moves:
+            n = i + offset
+            cost = hours[n]
+            if cost == IMPASSABLE or n in closed:
+                continue
+            arrival = advance(day, hour, cost * factor, dawn, nightfall)
+            if arrival is None:
+                continue
+            label = (arrival[0], arrival[1], spent + energy[n])
+            old = labels.get(n)
+            if least_energy:
+                better = old is None or (label[2], label[0], label[1]) < (old[2], old[0], old[1])
+            else:
+                better = old is None or label < old
+            if better:
+                labels[n] = label
+                parents[n] = i
+                heapq.heappush(queue, (estimate(n, *label), -(label[2] if least_energy else label[0] * HOURS_PER_DAY + label[1]), n))
+    if goal_i not in labels:
+        return None
+    cells = []
+    i = goal_i
+    while i != start_i:
+        cells.append(field.location(i))
+        i = parents[i]
+    cells.reverse()
+    legs = {}
+    for cell in cells:
+        legs.setdefault(labels[field.index(cell)][0], []).append(cell)
+    day, hour, spent = labels[goal_i]
+    travelled = sum(hours[field.index(c)] * (1 if p[0] == c[0] or p[1] == c[1] else 1.4)
+        for p, c in zip([start] + cells, cells))
+    return Route(cells, [legs[d] for d in sorted(legs)], (day, hour), travelled, spent)
+
+def route_for(actor, gamedata, goal, least_energy=False):
+    '''
+    Finds a route for `actor` from where they stand (at their current time
+    of day) to `goal`.
+    '''
+    return find_route(gamedata.world, actor.location, goal, actor.mounted, least_energy,
+        actor.time, gamedata.dawn, gamedata.nightfall)
@@ -0,0 +1,123 @@
+#!/usr/bin/python
+from __future__ import division, print_function, unicode_literals
+import multiprocessing
+import random
+from multiprocessing.sharedctypes import RawArray
+import constants
+import pathfinding
+from world import WorldGrid
+
+CANDIDATES = 4 # How many of the nearest goals a unit considers.
+SPREAD = 2 # A unit picks at random between this many of the quickest goals to reach.
+
+# The worker processes' copy of the world, set up by _init_worker.
+_world = None
+
+
+def choose_route(world, location, mounted, goals, rng):
+    '''
+    Picks a goal for a unit at `location`: routes to the CANDIDATES goals
+    nearest as the crow flies, then picks at random between the SPREAD
+    quickest to reach. Returns the Route, or None if no goal can be reached.
+    '''
+    nearest = sorted(goals, key=lambda g: max(abs(g[0] - location[0]), abs(g[1] - location[1])))
+    routes = []
+    for goal in nearest[:CANDIDATES]:
+        route = pathfinding.find_route(world, location, goal, mounted)
+        if route is not None:
+            routes.append(route)
+    if not routes:
+        return None
+    routes.sort(key=lambda r: r.arrival) # A stable sort, so ties keep the goals' order.
+    return rng.choice(routes[:SPREAD])
+
+def plan_units(world, units, goals, seed):
+    '''
+    Plans a batch of units, given as (number, location, mounted) tuples.
+    Each unit gets its own random generator, seeded from the game's seed
+    and the unit's number, so its plan doesn't depend on how the units were
+    split into batches.
+    '''
+    return [choose_route(world, location, mounted, goals, random.Random(seed * 1000003 + number))
+        for number, location, mounted in units]
+
+def _init_worker(rows, cols, terrain_types, terrain):
+    global _world
+    by_type = dict((t.terrain_type, t) for t in constants.TERRAINS)
+    _world = WorldGrid(rows, cols, [by_type[t] for t in terrain_types], terrain=terrain)
+
+def _plan_batch(args):
+    revision, units, goals, seed = args
+    if _world.terrain_revision != revision:
+        # The terrain has changed since the cost fields were built.
+        _world.derived.clear()
+        _world.terrain_revision = revision
+    return plan_units(_world, units, goals, seed)
+
+
+class Planner:
+    '''
+    Plans routes for many units across a pool of worker processes. The
+    terrain plane is copied once into shared memory, which the workers read
+    directly, so only the unit lists and the routes are sent between
+    processes; terrain changes are copied across before each plan.
+    Batches are merged back in unit order, so a seeded plan comes out the
+    same whatever the number of workers. With one worker, planning runs in
+    this process.
+    '''
+    def __init__(self, world, workers=None):
+        self.world = world
+        self.workers = workers or multiprocessing.cpu_count()
+        self.pool = None
+        if self.workers > 1:
+            self.terrain = RawArray(str('B'), world.terrain)
+            self.revision = world.revision
+            world.follow(self)
+            self.pool = multiprocessing.Pool(self.workers, _init_worker,
+                (world.rows, world.cols, [t.terrain_type for t in world.terrains], self.terrain))
+
+    def sync(self):
+        # Copy any terrain changes into the shared plane.
+        if self.revision != self.world.revision:
+            for row, col in set(self.world.changes_since(self.revision, self.world.TERRAIN)):
+                i = row * self.world.cols + col
+                self.terrain[i] = self.world.terrain[i]
+            self.revision = self.world.revision
+
+    def plan(self, units, goals, seed=0):
+        '''
+        Returns a Route (or None) for each (location, mounted) pair in
+        `units`, heading for one of `goals`.
+        '''
+        units = [(number, tuple(location), mounted) for number, (location, mounted) in enumerate(units)]
+        goals = [tuple(goal) for goal in goals]
+        if self.pool is None:
+            return plan_units(self.world, units, goals, seed)
+        self.sync()
+        size = -(-len(units) // (self.workers * 4)) or 1 # A few batches per worker, to balance the load.
+        batches = [(self.world.terrain_revision, units[i:i + size], goals, seed) for i in range(0, len(units), size)]
+        routes = []
+        for batch in self.pool.map(_plan_batch, batches):
+            routes.extend(batch)
+        return routes
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+def plan_armies(planner, armies, goals, seed=0):
+    '''
+    Sets the target of every army that's still standing to the goal the
+    planner picks for it (or clears it, if none can be reached).
+    '''
+    standing = [i for i in range(len(armies)) if armies.strength[i] > 0]
+    routes = planner.plan([(armies.location(i), armies.mounted[i]) for i in standing], goals, seed)
+    for i, route in zip(standing, routes):
+        if route is None:
+            armies.set_target(i, None)
+        else:
+            armies.set_target(i, route.cells[-1] if route.cells else armies.location(i))
+    return routes
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+'''
+Lightweight timers for the game's hot paths.
+
+Profiling is switched on by setting the LOM_PROFILE environment variable
+before the game starts. When it's off, the @timed decorator returns the
+function unchanged, so the hooks cost nothing. When it's on, every call
+of a decorated function is timed into a Histogram (log2-spaced buckets
+of microseconds), and export() appends everything to a JSON lines file
+(LOM_PROFILE_FILE, profile.jsonl by default) so runs of different builds
+can be compared.
+'''
+from __future__ import division, print_function, unicode_literals
+import functools
+import json
+import os
+import platform
+import time
+from timeit import default_timer as clock
+
+ENABLED = bool(os.environ.get('LOM_PROFILE'))
+OUTPUT_FILE = os.environ.get('LOM_PROFILE_FILE') or 'profile.jsonl'
+BUCKETS = 32 # Bucket n counts samples of under 2**n microseconds (and at least half that).
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.latest = None
+
+    def add(self, seconds):
+        us = seconds * 1000000
+        self.buckets[min(int(us).bit_length(), BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.latest = seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, pct):
+        '''
+        Returns an upper bound (in seconds) on the `pct` percentile: the top
+        of the bucket it falls in.
+        '''
+        if not self.count:
+            return None
+        rank = self.count * pct / 100
+        seen = 0
+        for n, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                return min(2 ** n / 1000000, self.max)
+        return self.max
+
+    def summary(self):
+        '''
+        Returns the histogram as a dictionary, with times in milliseconds.
+        '''
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'total_ms': self.total * 1000,
+            'mean_ms': self.total / self.count * 1000,
+            'min_ms': self.min * 1000,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'max_ms': self.max * 1000,
+            'buckets_us': dict((str(2 ** n), c) for n, c in enumerate(self.buckets) if c),
+        }
+
+
+timers = {} # Name -> Histogram.
+
+
+def record(name, seconds):
+    try:
+        histogram = timers[name]
+    except KeyError:
+        histogram = timers.setdefault(name, Histogram())
+    histogram.add(seconds)
+
+def timed(name):
+    '''
+    Decorator that times every call of a function as `name`, when profiling
+    is enabled (and otherwise leaves the function alone).
+    '''
+    def decorate(function):
+        if not ENABLED:
+            return function
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, clock() - start)
+        return wrapper
+    return decorate
+
+def last(name):
+    '''
+    Returns the histogram for `name` (empty if it has never been timed).
+    '''
+    return timers.get(name) or Histogram()
+
+def snapshot():
+    return dict((name, histogram.summary()) for name, histogram in timers.items())
+
+def reset():
+    timers.clear()
+
+def export(path=None, **extra):
+    '''
+    Appends the timers (plus any `extra` values, e.g. cache statistics) as
+    one JSON line to `path`.
+    '''
+    line = {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'timers': snapshot(),
+    }
+    line.update(extra)
+    with open(path or OUTPUT_FILE, 'a') as f:
+        f.write(json.dumps(line, sort_keys=True) + '\n')
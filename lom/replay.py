@@ -0,0 +1,140 @@
+#!/usr/bin/python
+'''
+Recording and replaying play sessions.
+
+A recording is a text file. The first line is a header:
+
+    LOMREC 1 {"seed": ..., "cheatmode": ..., "world": <content hash>}
+
+Every line after that is a run of commands (one character each, see
+controls.py), then a space and the hash of the game state after them.
+The last line may be a run of commands without a hash. Lines are written
+every CHECKPOINT commands, so a session that crashes still leaves a
+usable recording.
+'''
+from __future__ import division, print_function, unicode_literals
+import hashlib
+import json
+import random
+import time
+import constants
+import controls
+import worldfile
+from savegame import ACTOR_FIELDS
+
+MAGIC = 'LOMREC'
+VERSION = 1
+CHECKPOINT = 50 # Commands between state hashes.
+
+
+def state_hash(gamedata):
+    '''
+    Returns a hash of the game state that commands can change: the lords,
+    who is selected, the day, the world's revision and the armies.
+    '''
+    state = [gamedata.actor.name if gamedata.actor else None, gamedata.game_days, gamedata.world.revision]
+    for actor in gamedata.actors:
+        state.append([actor.name, actor.heading.name] + [getattr(actor, field) for field in ACTOR_FIELDS])
+    if gamedata.armies is not None:
+        state.append([gamedata.armies.rows.tolist(), gamedata.armies.cols.tolist(),
+            gamedata.armies.strength.tolist()])
+    return hashlib.sha1(json.dumps(state, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class Recorder:
+    '''
+    Writes the commands performed in a game to a recording at `path`.
+    Seeds the random module with `seed`, as a replay will.
+    '''
+    def __init__(self, path, gamedata, seed=None):
+        self.gamedata = gamedata
+        self.seed = int(time.time()) if seed is None else seed
+        random.seed(self.seed)
+        self.commands = []
+        self.file = open(path, 'w')
+        header = {'seed': self.seed, 'cheatmode': gamedata.cheatmode,
+            'world': worldfile.content_hash(gamedata.world)}
+        self.file.write('{0} {1} {2}\n'.format(MAGIC, VERSION, json.dumps(header, sort_keys=True)))
+
+    def record(self, command):
+        '''
+        Records a command, after it has been performed.
+        '''
+        self.commands.append(command)
+        if len(self.commands) >= CHECKPOINT:
+            self.checkpoint()
+
+    def checkpoint(self):
+        self.file.write('{0} {1}\n'.format(''.join(self.commands), state_hash(self.gamedata)))
+        self.file.flush()
+        self.commands = []
+
+    def close(self):
+        if self.commands:
+            self.checkpoint()
+        self.file.close()
+
+
+class Recording:
+    '''
+    A recording read back from a file: its header, and a list of
+    (commands, state hash or None) pairs.
+    '''
+    def __init__(self, path):
+        with open(path, 'r') as f:
+            lines = f.read().splitlines()
+        magic, version, header = lines[0].split(' ', 2)
+        if magic != MAGIC or int(version) != VERSION:
+            raise ValueError('{0} is not a version {1} recording.'.format(path, VERSION))
+        header = json.loads(header)
+        self.seed = header['seed']
+        self.cheatmode = header['cheatmode']
+        self.world = header['world']
+        self.runs = []
+        for line in lines[1:]:
+            commands, _, expected = line.partition(' ')
+            self.runs.append((commands, expected or None))
+
+    def __len__(self):
+        return sum(len(commands) for commands, expected in self.runs)
+
+
+class ReplayResult:
+    def __init__(self, commands, checkpoints, mismatch, seconds):
+        self.commands = commands # Commands performed.
+        self.checkpoints = checkpoints # State hashes checked.
+        self.mismatch = mismatch # Commands performed when a hash first didn't match, or None.
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        return self.mismatch is None
+
+
+def replay(recording, gamedata=None, each=None):
+    '''
+    Replays `recording` (a Recording or a path) on `gamedata` (by default a
+    new DefaultGameData), checking the state hash at every checkpoint, and
+    stops at the first mismatch. `each(gamedata)`, if given, is called
+    after every command (e.g. to render the view). Returns a ReplayResult.
+    '''
+    if not isinstance(recording, Recording):
+        recording = Recording(recording)
+    if gamedata is None:
+        gamedata = constants.DefaultGameData(cheatmode=recording.cheatmode)
+    if worldfile.content_hash(gamedata.world) != recording.world:
+        raise ValueError('The recording was made in a different world.')
+    random.seed(recording.seed)
+    start = time.time()
+    performed = checkpoints = 0
+    for commands, expected in recording.runs:
+        for command in commands:
+            controls.perform(gamedata, command)
+            if each:
+                each(gamedata)
+        performed += len(commands)
+        if expected is not None:
+            checkpoints += 1
+            if state_hash(gamedata) != expected:
+                return ReplayResult(performed, checkpoints, performed, time.time() - start)
+    return ReplayResult(performed, checkpoints, None, time.time() - start)
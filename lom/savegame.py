@@ -0,0 +1,168 @@
+#!/usr/bin/python
+'''
+Saving and loading games in progress.
+
+A save is split in two. The world a game started from is written once to
+a world store as a .lomw file named by its content hash (by track(), as
+soon as the world is loaded and before anything changes it), and shared
+by every save made from it. Each save file then holds only what has changed:
+JSON with the cells changed since that world, plus the state of the lords
+and the armies. An autosave every dawn costs a few kilobytes, not a copy
+of the world. Loading memory-maps the stored world (copy-on-write) and
+replays the changed cells on top.
+'''
+from __future__ import division, print_function, unicode_literals
+import json
+import os
+from array import array
+import constants
+import entities
+import worldfile
+
+VERSION = 1
+SAVE_PATH = os.path.join(constants.PROJECT_PATH, 'saves')
+ACTOR_FIELDS = ['location', 'time', 'energy', 'health', 'mounted', 'strength', 'icefear']
+ARMY_FIELDS = ['rows', 'cols', 'strength', 'race', 'mounted', 'target_rows', 'target_cols', 'hours']
+
+
+class Changes:
+    '''
+    The cells of a game's world changed since its base, gathered from the
+    world's change log into a set, so the log itself can be compacted
+    however long the campaign goes on.
+    '''
+    def __init__(self, world):
+        self.world = world
+        self.revision = world.revision
+        self.cells = set()
+        world.follow(self)
+
+    def update(self):
+        if self.revision != self.world.revision:
+            self.cells.update(self.world.changes_since(self.revision))
+            self.revision = self.world.revision
+
+
+def world_path(world_hash, directory=None):
+    return os.path.join(directory or SAVE_PATH, 'worlds', world_hash + '.lomw')
+
+def track(gamedata, directory=None):
+    '''
+    Records the game's world, as it is now, as the base its saves are
+    diffed against, and stores it in the world store if it isn't there
+    already. Call it when the world has just been loaded, before anything
+    changes it. Returns the world's hash.
+    '''
+    world = gamedata.world
+    gamedata.world_hash = worldfile.content_hash(world)
+    gamedata.world_base = world.revision
+    gamedata.world_changes = Changes(world)
+    path = world_path(gamedata.world_hash, directory)
+    if not os.path.exists(path):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        worldfile.save(world, path)
+    return gamedata.world_hash
+
+def store_world(gamedata, directory=None):
+    '''
+    Makes sure the world the game's diffs are taken against is in the
+    world store, and returns its hash. Only an unchanged world is ever
+    stored: the live world is never stored once the game has changed it.
+    '''
+    world = gamedata.world
+    if gamedata.world_hash is None or not os.path.exists(world_path(gamedata.world_hash, directory)):
+        if world.revision != gamedata.world_base:
+            raise ValueError('The world this game started from is not in the world store, and has '
+                'changed since; call savegame.track() when the world is loaded.')
+        track(gamedata, directory)
+    return gamedata.world_hash
+
+def snapshot(gamedata, directory=None):
+    '''
+    Returns the game's state as a dictionary ready to be written as JSON.
+    '''
+    world = gamedata.world
+    world_hash = store_world(gamedata, directory)
+    changes = gamedata.world_changes
+    changes.update()
+    cells = [[row, col, world.cell(row, col, terrain_names=True)] for row, col in sorted(changes.cells)]
+    actors = []
+    for actor in gamedata.actors:
+        state = dict((field, getattr(actor, field)) for field in ACTOR_FIELDS)
+        state['name'] = actor.name
+        state['heading'] = actor.heading.name
+        actors.append(state)
+    state = {
+        'version': VERSION,
+        'world': world_hash,
+        'cells': cells,
+        'game_days': gamedata.game_days,
+        'cheatmode': gamedata.cheatmode,
+        'actor': gamedata.actor.name if gamedata.actor else None,
+        'actors': actors,
+    }
+    if gamedata.armies is not None:
+        state['armies'] = dict((field, getattr(gamedata.armies, field).tolist()) for field in ARMY_FIELDS)
+    return state
+
+def save(gamedata, path, directory=None):
+    '''
+    Saves the game to `path`, storing its world in `directory` if required.
+    '''
+    state = snapshot(gamedata, directory)
+    with open(path, 'w') as f:
+        f.write(json.dumps(state, separators=(',', ':')))
+
+def autosave(gamedata, directory=None):
+    '''
+    Saves the game as the autosave for the current day, and returns the path.
+    '''
+    directory = directory or SAVE_PATH
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    path = os.path.join(directory, 'autosave_day{0:03d}.lomsave'.format(gamedata.game_days))
+    save(gamedata, path, directory)
+    return path
+
+def load(path, directory=None, gamedata_class=None):
+    '''
+    Loads the game saved at `path` into a new instance of `gamedata_class`
+    (DefaultGameData by default) and returns it.
+    '''
+    with open(path, 'r') as f:
+        state = json.load(f)
+    if state.get('version') != VERSION:
+        raise ValueError('{0} is not a version {1} save.'.format(path, VERSION))
+    world = worldfile.load(world_path(state['world'], directory))
+    gamedata = (gamedata_class or constants.DefaultGameData)(world=world, cheatmode=state['cheatmode'])
+    gamedata.world_hash = state['world']
+    gamedata.world_base = 0
+    gamedata.world_changes = Changes(world)
+    by_type = dict((t.terrain_type, t) for t in world.terrains)
+    for row, col, cell in state['cells']:
+        cell = dict(cell)
+        world.set_terrain(row, col, by_type[cell.pop('terrain_type')])
+        world.set_name(row, col, cell.pop('name'))
+        for key in list(world.features.get((row, col), {})):
+            if key not in cell:
+                world.set_feature(row, col, key, None)
+        for key, value in cell.items():
+            world.set_feature(row, col, key, value)
+    gamedata.game_days = state['game_days']
+    headings = dict((h.name, h) for h in constants.HEADINGS)
+    actors = dict((actor.name, actor) for actor in gamedata.actors)
+    for saved in state['actors']:
+        actor = actors[saved['name']]
+        for field in ACTOR_FIELDS:
+            setattr(actor, field, saved[field])
+        actor.location = tuple(actor.location)
+        actor.heading = headings[saved['heading']]
+    gamedata.actor = actors.get(state['actor'])
+    if 'armies' in state:
+        armies = gamedata.armies
+        for field in ARMY_FIELDS:
+            setattr(armies, field, array(getattr(armies, field).typecode, state['armies'][field]))
+    # Place the restored lords and armies in the world's entity index.
+    entities.index_for(world).attach(gamedata)
+    return gamedata
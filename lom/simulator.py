@@ -0,0 +1,238 @@
+#!/usr/bin/python
+from __future__ import division, print_function, unicode_literals
+import multiprocessing
+import random
+import constants
+import entities
+import pathfinding
+import worldfile
+from armies import NightPhase
+
+DEFAULT_MONSTER_STRENGTH = 32 # For monsters without a strength of their own.
+MAX_ENERGY = 127
+FIELDS = ['seed', 'policy', 'days', 'lords_alive', 'distance', 'hours', 'energy_spent', 'encounters']
+
+# The worker processes' copy of the world, set up by _init_worker.
+_world = None
+
+
+class RandomPolicy:
+    '''
+    Wanders: each move is along a random heading, and the day is ended
+    early with a chance of `rest_chance` before each move.
+    '''
+    name = 'random'
+
+    def __init__(self, rest_chance=0.1):
+        self.rest_chance = rest_chance
+
+    def start(self, gamedata, rng):
+        # Called once the game is set up, to place the lords. They start where the game says.
+        pass
+
+    def next_move(self, actor, gamedata, rng):
+        '''
+        Returns the heading to move along next, or None to end the day.
+        '''
+        if rng.random() < self.rest_chance:
+            return None
+        return rng.choice(constants.HEADINGS)
+
+    def moved(self, actor):
+        # Called after each move the Actor makes.
+        pass
+
+
+class RoutePolicy:
+    '''
+    Marches every lord along the fastest route to the place named `goal`.
+    Each lord starts from a random square, so each seed plays a different
+    march rather than the same one over again.
+    '''
+    name = 'route'
+
+    def __init__(self, goal='the Citadel of Ushgarak'):
+        self.goal = goal
+        self.location = None
+        self.routes = {} # Actor name -> cells left to walk.
+
+    def start(self, gamedata, rng):
+        passable = passable_cells(gamedata.world)
+        for actor in gamedata.actors:
+            actor.location = rng.choice(passable)
+            gamedata.entities.place(actor, actor.location)
+
+    def next_move(self, actor, gamedata, rng):
+        world = gamedata.world
+        if self.location is None:
+            self.location = next(((r, c) for r in range(world.rows) for c in range(world.cols)
+                if world.name_at(r, c) == self.goal), None)
+            if self.location is None:
+                raise ValueError('Unknown goal {0!r}.'.format(self.goal))
+        cells = self.routes.get(actor.name)
+        if not cells or max(abs(cells[0][0] - actor.location[0]), abs(cells[0][1] - actor.location[1])) != 1:
+            # No route yet, or knocked off it: find a new one.
+            route = pathfinding.route_for(actor, gamedata, self.location)
+            cells = self.routes[actor.name] = route.cells if route else []
+        if not cells:
+            return None
+        for heading in constants.HEADINGS:
+            if heading.offset == (cells[0][0] - actor.location[0], cells[0][1] - actor.location[1]):
+                return heading
+
+    def moved(self, actor):
+        self.routes[actor.name].pop(0)
+
+
+POLICIES = {'random': RandomPolicy, 'route': RoutePolicy}
+
+
+class Simulation:
+    '''
+    One seeded game played headlessly with the real Actor and GameData
+    rules, with the lords moved by `policy` instead of the keyboard.
+    Hostile monsters are scattered over a `monsters` share of the passable
+    squares (on top of any in the world file); a lord entering a monster's
+    square fights it, losing up to its strength in health, and kills it if
+    they survive. Lords regain `rest` energy overnight.
+    '''
+    def __init__(self, world, seed, policy, monsters=0.02, rest=32):
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.policy = policy
+        self.rest = rest
+        self.gamedata = constants.DefaultGameData(world=world)
+        self.night = NightPhase(self.gamedata.armies)
+        # This game's own monsters, so killing them leaves the (shared) world alone.
+        self.monsters = entities.SpatialIndex()
+        placed = entities.index_for(world)
+        for cell in sorted(placed.cells):
+            for band in placed.at(cell, 'monster'):
+                self.monsters.place(entities.Band(band.monster), cell)
+        hostile = [m for m in constants.MONSTERS if m.hostile]
+        passable = passable_cells(world)
+        for cell in self.rng.sample(passable, int(len(passable) * monsters)):
+            monster = self.rng.choice(hostile)
+            if not self.monsters.first(cell):
+                self.monsters.place(entities.Band(monster), cell)
+        policy.start(self.gamedata, self.rng)
+        self.days = 0
+        self.distance = 0
+        self.hours = 0
+        self.energy_spent = 0
+        self.encounters = 0
+
+    def alive(self):
+        return [actor for actor in self.gamedata.actors if actor.health > 0]
+
+    def play_day(self):
+        gamedata, rng = self.gamedata, self.rng
+        for actor in self.alive():
+            while actor.health > 0:
+                heading = self.policy.next_move(actor, gamedata, rng)
+                if heading is None:
+                    break
+                actor.heading = heading
+                hour, energy = actor.time, actor.energy
+                if not actor.move(gamedata):
+                    break
+                self.policy.moved(actor)
+                self.distance += 1
+                self.hours += actor.time - hour
+                self.energy_spent += energy - actor.energy
+                band = self.monsters.first(actor.location, 'monster')
+                if band:
+                    self.encounter(actor, band)
+        self.night.run(gamedata)
+        for actor in self.alive():
+            actor.energy = min(MAX_ENERGY, actor.energy + self.rest)
+        self.days += 1
+
+    def encounter(self, actor, band):
+        self.encounters += 1
+        monster = band.monster
+        if monster.hostile:
+            actor.health -= self.rng.randint(0, monster.strength or DEFAULT_MONSTER_STRENGTH)
+            if actor.health > 0:
+                self.monsters.remove(band)
+
+    def play(self, days):
+        '''
+        Plays until `days` days have passed or every lord is dead, and
+        returns the game's statistics.
+        '''
+        while self.days < days and self.alive():
+            self.play_day()
+        return {
+            'seed': self.seed,
+            'policy': self.policy.name,
+            'days': self.days,
+            'lords_alive': len(self.alive()),
+            'distance': self.distance,
+            'hours': round(self.hours, 1),
+            'energy_spent': self.energy_spent,
+            'encounters': self.encounters,
+        }
+
+
+def passable_cells(world):
+    '''
+    Returns (and caches) the list of squares that aren't Frozen Wastes.
+    '''
+    cached = world.derived.get('passable')
+    if cached is None or cached[0] != world.terrain_revision:
+        cached = world.derived['passable'] = (world.terrain_revision, [(r, c) for r in range(world.rows)
+            for c in range(world.cols) if world.terrain_at(r, c) != constants.FROZEN_WASTES])
+    return cached[1]
+
+def tweak(settings):
+    '''
+    Applies balance settings, e.g. {'MOUNTAINS.move_cost': 4}, to the
+    Terrains and Monsters in constants. Returns the settings they replaced,
+    so they can be put back with tweak() again.
+    '''
+    replaced = {}
+    for name, value in sorted(settings.items()):
+        target, attribute = name.split('.')
+        target = getattr(constants, target.upper())
+        replaced[name] = getattr(target, attribute)
+        setattr(target, attribute, value)
+    return replaced
+
+def _init_worker(world_file, settings):
+    global _world
+    tweak(settings)
+    # Read the JSON rather than a memory-mapped world: every move reads the terrain.
+    _world = worldfile.load_json(world_file)
+
+def _play(args):
+    seed, policy, days, monsters, rest = args
+    return Simulation(_world, seed, POLICIES[policy](), monsters, rest).play(days)
+
+def simulate(games, policy='random', days=30, seed=0, monsters=0.02, rest=32,
+        workers=None, settings=None, world_file=None):
+    '''
+    Plays `games` seeded games across `workers` processes (by default, one
+    per core), yielding each game's statistics in seed order as they finish.
+    '''
+    world_file = world_file or constants.DefaultGameData.world_file
+    settings = settings or {}
+    jobs = [(seed + i, policy, days, monsters, rest) for i in range(games)]
+    workers = workers or multiprocessing.cpu_count()
+    if workers == 1:
+        # Played in this process, so the settings are put back afterwards.
+        replaced = tweak(settings)
+        try:
+            world = worldfile.load_json(world_file)
+            for seed, policy, days, monsters, rest in jobs:
+                yield Simulation(world, seed, POLICIES[policy](), monsters, rest).play(days)
+        finally:
+            tweak(replaced)
+        return
+    pool = multiprocessing.Pool(workers, _init_worker, (world_file, settings))
+    try:
+        for result in pool.imap(_play, jobs, chunksize=max(1, games // (workers * 8))):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
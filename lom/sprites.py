@@ -0,0 +1,101 @@
+#!/usr/bin/python
+from __future__ import division, print_function, unicode_literals
+import pygame
+import atlas
+import constants
+import utils
+from cache import LRUCache
+
+
+class SpriteCache:
+    '''
+    A process-wide cache of decoded (and optionally scaled) image surfaces,
+    keyed by (image path, scale factor). Each image is only read from disk
+    once while it stays in the cache. Sprites found in a loaded atlas are
+    served from it instead, and never evicted.
+    '''
+    def __init__(self, capacity=512):
+        self.surfaces = LRUCache(capacity)
+        self.atlas = {} # (path, scale) -> subsurface of the sprite atlas.
+        self.loads = 0 # Number of images decoded from disk.
+
+    def get(self, path, scale=1):
+        '''
+        Returns the surface for `path` scaled by `scale`, loading and scaling
+        it on a cache miss.
+        '''
+        key = (path, scale)
+        if key in self.atlas:
+            return self.atlas[key]
+        surface = self.surfaces.get(key)
+        if surface is None:
+            if scale == 1:
+                surface = pygame.image.load(path).convert_alpha()
+                self.loads += 1
+            else:
+                image = self.get(path)
+                surface = utils.aspect_scale(image,
+                    (image.get_width() * scale, image.get_height() * scale))
+            self.surfaces.put(key, surface)
+        return surface
+
+    def preload(self, paths, scales=(1,)):
+        '''
+        Loads each of `paths` and pre-scales it to each of `scales`.
+        Must be called after the display mode has been set.
+        '''
+        for path in paths:
+            for scale in scales:
+                self.get(path, scale)
+
+    def load_atlas(self, index_file=None):
+        '''
+        Serves sprites from the atlas built by scripts/build_atlas.py, if
+        there is an up-to-date one. Returns True if it was loaded.
+        '''
+        sprites = atlas.load(index_file)
+        if sprites is None:
+            return False
+        self.atlas = sprites
+        self.loads += 1
+        return True
+
+    def clear(self):
+        self.surfaces.clear()
+        self.atlas = {}
+
+    def stats(self):
+        stats = self.surfaces.stats()
+        stats['loads'] = self.loads
+        stats['atlas'] = len(self.atlas)
+        return stats
+
+
+def preload_game(gamedata):
+    '''
+    Loads every sprite the game draws into the shared cache: each terrain at
+    every view scale, plus the monsters and the actors' heraldry. These all
+    come from the sprite atlas, if it has been built.
+    '''
+    cache.load_atlas()
+    for path, scale in game_sprites(gamedata):
+        cache.get(path, scale)
+
+def game_sprites(gamedata):
+    '''
+    Returns a list of the (path, scale) of every sprite preload_game loads.
+    '''
+    terrains = [t.image for t in constants.TERRAINS if t.image]
+    others = [m.image for m in constants.MONSTERS] + [a.heraldry for a in gamedata.actors if a.heraldry]
+    return [(path, scale) for path in terrains for scale in view_scales(constants.HEADINGS)] + \
+        [(path, 1) for path in others]
+
+def view_scales(headings):
+    '''
+    Returns the sorted distinct image scales used by the headings' view_offsets.
+    '''
+    return sorted(set(node[2] for heading in headings for node in heading.view_offsets))
+
+
+# The shared cache used by the game.
+cache = SpriteCache()
@@ -0,0 +1,29 @@
+#!/usr/bin/python
+from __future__ import division, print_function, unicode_literals
+
+
+def percentile(samples, pct):
+    '''
+    Returns the `pct` percentile of `samples` (nearest rank).
+    '''
+    samples = sorted(samples)
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+def summarize(samples):
+    '''
+    Returns a dictionary of summary statistics for a list of samples.
+    '''
+    samples = sorted(samples)
+    if not samples:
+        return {'count': 0}
+    return {
+        'count': len(samples),
+        'mean': sum(samples) / len(samples),
+        'min': samples[0],
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'p99': percentile(samples, 99),
+        'max': samples[-1],
+    }
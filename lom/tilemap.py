@@ -0,0 +1,170 @@
+#!/usr/bin/python
+'''
+The strategic map: the world drawn from above as a pyramid of tiles.
+
+Level 0 draws every square as a CELL_PIXELS square of its terrain's map
+colour; each level above is half the size of the one below, each of its
+tiles made by shrinking four tiles of the level below. Tiles are TILE
+pixels square. Panning and zooming the map is then just blitting the tiles
+of one level.
+
+Rendered tiles are kept in an LRU cache keyed by the revision of the world
+that last touched them, so changing a square only re-renders the tiles
+over it (one per level). Tiles that haven't changed since the pyramid was
+made are also saved as PNGs under TILE_PATH, keyed by `world_id` (e.g. a
+content hash of the world), so later runs on the same world load them
+instead of rendering them.
+'''
+from __future__ import division, print_function, unicode_literals
+import os
+import pygame
+import constants
+from cache import LRUCache
+
+VERSION = 1 # Bump when the look of the tiles changes, to ignore old saved ones.
+TILE = 256
+CELL_PIXELS = 8 # The size of a square at level 0.
+TILE_PATH = os.path.join(constants.PROJECT_PATH, 'cache', 'tiles')
+BACKGROUND = (0, 0, 0)
+MAP_COLOURS = {
+    'plains': (190, 210, 130),
+    'mountains': (130, 110, 90),
+    'citadel': (255, 255, 0),
+    'forest': (20, 110, 30),
+    'tower': (210, 210, 210),
+    'henge': (170, 80, 170),
+    'village': (210, 150, 90),
+    'downs': (140, 180, 80),
+    'keep': (230, 230, 120),
+    'snowhall': (200, 230, 255),
+    'lake': (40, 90, 200),
+    'frozen_wastes': (240, 245, 255),
+    'ruin': (120, 120, 120),
+    'lith': (100, 100, 140),
+    'cavern': (70, 50, 40),
+}
+
+
+class TilePyramid:
+    '''
+    The map tiles of `world` at every level, rendered as they're needed.
+    '''
+    def __init__(self, world, world_id=None, directory=TILE_PATH, budget=32 * 1024 * 1024):
+        self.world = world
+        self.world_id = world_id
+        self.directory = directory if world_id else None
+        self.tiles = LRUCache(budget, sizeof=lambda s: s.get_pitch() * s.get_height())
+        self.palette = [bytes(bytearray(MAP_COLOURS.get(t.terrain_type, BACKGROUND))) for t in world.terrains]
+        self.cells = TILE // CELL_PIXELS # Squares along the side of a level 0 tile.
+        self.levels = 1
+        while max(world.rows, world.cols) * CELL_PIXELS > TILE << (self.levels - 1):
+            self.levels += 1
+        self.revisions = {} # (level, x, y) -> latest revision to change the tile.
+        self.revision = world.revision
+        world.follow(self)
+        self.renders = 0 # Tiles rendered.
+        self.disk_loads = 0 # Tiles loaded from TILE_PATH.
+
+    def size(self, level):
+        '''
+        Returns the (width, height) of the whole map at `level`, in pixels.
+        '''
+        return (self.world.cols * CELL_PIXELS >> level, self.world.rows * CELL_PIXELS >> level)
+
+    def update(self):
+        '''
+        Marks the tiles over every square whose terrain changed since the last update.
+        '''
+        world = self.world
+        if self.revision == world.revision:
+            return
+        for row, col in world.changes_since(self.revision, world.TERRAIN):
+            for level in range(self.levels):
+                span = self.cells << level
+                self.revisions[(level, col // span, row // span)] = world.revision
+        self.revision = world.revision
+
+    def tile(self, level, x, y):
+        '''
+        Returns the surface of tile (x, y) at `level`, rendering it (or
+        loading it from disk) if it isn't cached.
+        '''
+        revision = self.revisions.get((level, x, y), 0)
+        key = (level, x, y, revision)
+        surface = self.tiles.get(key)
+        if surface is None:
+            path = self.path(level, x, y) if revision == 0 else None
+            if path and os.path.exists(path):
+                surface = pygame.image.load(path)
+                self.disk_loads += 1
+            else:
+                surface = self.render(level, x, y)
+                self.renders += 1
+                if path:
+                    try:
+                        if not os.path.isdir(self.directory):
+                            os.makedirs(self.directory)
+                        pygame.image.save(surface, path)
+                    except (IOError, OSError, pygame.error):
+                        pass # Nowhere to save tiles; just render them again next time.
+            if pygame.display.get_surface() is not None:
+                surface = surface.convert()
+            self.tiles.put(key, surface)
+        return surface
+
+    def path(self, level, x, y):
+        if not self.directory:
+            return None
+        return os.path.join(self.directory, '{0}-v{1}-{2}-{3}-{4}.png'.format(self.world_id, VERSION, level, x, y))
+
+    def render(self, level, x, y):
+        surface = pygame.Surface((TILE, TILE), 0, 32)
+        surface.fill(BACKGROUND)
+        if level == 0:
+            world, palette = self.world, self.palette
+            row, col = y * self.cells, x * self.cells
+            rows, cols = min(self.cells, world.rows - row), min(self.cells, world.cols - col)
+            if rows > 0 and cols > 0:
+                # One pixel per square, then scaled up.
+                terrain = world.terrain
+                pixels = b''.join(palette[terrain[r * world.cols + c]]
+                    for r in range(row, row + rows) for c in range(col, col + cols))
+                image = pygame.image.fromstring(pixels, (cols, rows), str('RGB'))
+                surface.blit(pygame.transform.scale(image, (cols * CELL_PIXELS, rows * CELL_PIXELS)), (0, 0))
+            return surface
+        # Shrink the four tiles below.
+        below = pygame.Surface((TILE * 2, TILE * 2), 0, 32)
+        below.fill(BACKGROUND)
+        width, height = self.size(level - 1)
+        for dy in (0, 1):
+            for dx in (0, 1):
+                if (x * 2 + dx) * TILE < width and (y * 2 + dy) * TILE < height:
+                    below.blit(self.tile(level - 1, x * 2 + dx, y * 2 + dy), (dx * TILE, dy * TILE))
+        pygame.transform.smoothscale(below, (TILE, TILE), surface)
+        return surface
+
+    def draw(self, screen, level, origin, rect=None):
+        '''
+        Draws the map at `level` into `rect` of the screen (by default all
+        of it), with the map pixel `origin` at the rect's top left corner.
+        Returns the number of tiles drawn.
+        '''
+        rect = pygame.Rect(rect or screen.get_rect())
+        self.update()
+        width, height = self.size(level)
+        drawn = 0
+        clip = screen.get_clip()
+        screen.set_clip(rect)
+        for y in range(max(0, origin[1] // TILE), min(height, origin[1] + rect.height) // TILE + 1):
+            for x in range(max(0, origin[0] // TILE), min(width, origin[0] + rect.width) // TILE + 1):
+                if x * TILE < width and y * TILE < height:
+                    screen.blit(self.tile(level, x, y), (rect.left + x * TILE - origin[0], rect.top + y * TILE - origin[1]))
+                    drawn += 1
+        screen.set_clip(clip)
+        return drawn
+
+    def stats(self):
+        stats = self.tiles.stats()
+        stats['renders'] = self.renders
+        stats['disk_loads'] = self.disk_loads
+        return stats
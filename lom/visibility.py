@@ -0,0 +1,88 @@
+#!/usr/bin/python
+from __future__ import division, print_function, unicode_literals
+from array import array
+import constants
+
+# How far from the viewer (in rows or columns) any heading can see.
+VIEW_RANGE = max(abs(d) for h in constants.HEADINGS for node in h.view_offsets for d in node[1])
+
+
+class PaddedPlane:
+    '''
+    A copy of the world's terrain plane surrounded by a border of `pad`
+    FROZEN_WASTES cells on every side. Every view_offsets node from an
+    on-map location then falls inside the plane, so a whole view is read
+    with precomputed flat offsets and no per-cell bounds checks.
+    The copy follows the world's changes incrementally.
+    '''
+    def __init__(self, world, pad):
+        self.world = world
+        self.pad = pad
+        self.width = world.cols + 2 * pad
+        wastes = world.terrain_codes[constants.FROZEN_WASTES]
+        self.plane = array(str('B'), [wastes]) * (self.width * (world.rows + 2 * pad))
+        terrain, cols = world.terrain, world.cols
+        for row in range(world.rows):
+            start = (row + pad) * self.width + pad
+            self.plane[start:start + cols] = array(str('B'), terrain[row * cols:(row + 1) * cols])
+        self.revision = world.revision
+        self.view_offsets = {} # Heading name -> flat offsets of its view nodes, in draw order.
+
+    def update(self):
+        world = self.world
+        if self.revision != world.revision:
+            for row, col in set(world.changes_since(self.revision, world.TERRAIN)):
+                self.plane[(row + self.pad) * self.width + col + self.pad] = world.terrain[row * world.cols + col]
+            self.revision = world.revision
+
+    def index(self, location):
+        return (location[0] + self.pad) * self.width + location[1] + self.pad
+
+    def offsets(self, heading):
+        '''
+        Returns the flat offsets (in the padded plane) of heading's view nodes.
+        '''
+        try:
+            return self.view_offsets[heading.name]
+        except KeyError:
+            offsets = [node[1][0] * self.width + node[1][1] for node in heading.view_offsets]
+            return self.view_offsets.setdefault(heading.name, offsets)
+
+
+def padded_plane(world):
+    '''
+    Returns the PaddedPlane for `world` (wide enough for any heading's view),
+    brought up to date with the world's changes.
+    '''
+    key = ('padded', VIEW_RANGE)
+    if key not in world.derived:
+        world.derived[key] = PaddedPlane(world, VIEW_RANGE)
+    plane = world.derived[key]
+    plane.update()
+    return plane
+
+def view_codes(world, location, heading):
+    '''
+    Returns the terrain codes (indexes into world.terrains) of every node of
+    the view from `location` along `heading`, in draw order. Off-map nodes
+    are FROZEN_WASTES. `location` must be on the map.
+    '''
+    if world.streamed:
+        return streamed_view_codes(world, location, heading)
+    padded = padded_plane(world)
+    plane = padded.plane
+    base = padded.index(location)
+    return [plane[base + offset] for offset in padded.offsets(heading)]
+
+def streamed_view_codes(world, location, heading):
+    '''
+    As view_codes, for a world streamed from disk: the cells are read where
+    they are, rather than from a padded copy of the whole map.
+    '''
+    wastes = world.terrain_codes[constants.FROZEN_WASTES]
+    rows, cols, terrain = world.rows, world.cols, world.terrain
+    codes = []
+    for node in heading.view_offsets:
+        row, col = location[0] + node[1][0], location[1] + node[1][1]
+        codes.append(terrain[row * cols + col] if 0 <= row < rows and 0 <= col < cols else wastes)
+    return codes
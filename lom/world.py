@@ -0,0 +1,257 @@
+#!/usr/bin/python
+from __future__ import division, print_function, unicode_literals
+import weakref
+from array import array
+import constants
+
+
+class WorldGrid:
+    '''
+    A compact store for the world map. Terrain is held as one byte per cell
+    (an index into `terrains`), location names as indices into an interned
+    name table, and the few cells with anything else on them (monsters etc.)
+    in a dictionary keyed by (row, col). The terrain and name planes may be
+    passed in, e.g. as views of a memory-mapped world file.
+    Every change bumps `revision` and is logged in `changes` along with what
+    changed (TERRAIN, NAME or FEATURE), so anything derived from the grid can
+    catch up incrementally on just the changes it depends on. The latest
+    revision to touch each BLOCK x BLOCK region is also kept, so caches of
+    local views can tell whether anything near them has changed. Changes
+    every reader of the log has caught up past are dropped (see compact()).
+    '''
+    BLOCK = 8
+    COMPACT_EVERY = 4096 # Changes logged between attempts to compact the log.
+    # Kinds of change, combined as bit flags.
+    TERRAIN = 1
+    NAME = 2
+    FEATURE = 4
+    ALL = TERRAIN | NAME | FEATURE
+    streamed = False # True for worlds read from disk a chunk at a time (see chunks.py).
+
+    def __init__(self, rows, cols, terrains=None, terrain=None, name_index=None):
+        self.rows = rows
+        self.cols = cols
+        self.terrains = list(terrains or constants.TERRAINS) # Terrain code -> Terrain.
+        self.terrain_codes = dict((t, i) for i, t in enumerate(self.terrains))
+        self.terrain = terrain if terrain is not None else array(str('B'), [0]) * (rows * cols)
+        self.names = [None] # Interned name table; index 0 is "no name".
+        self.name_codes = {None: 0}
+        self.name_index = name_index if name_index is not None else array(str('H'), [0]) * (rows * cols)
+        self.features = {} # (row, col) -> {key: value}, e.g. {'monster': 'dragons'}
+        self.revision = 0
+        self.terrain_revision = 0 # The last revision to change any terrain.
+        self.changes = [] # changes[n - compacted] is the (row, col) changed by revision n + 1.
+        self.change_kinds = array(str('B')) # The kind of each change in `changes`.
+        self.compacted = 0 # Revisions dropped from the front of the log.
+        self.compact_at = self.COMPACT_EVERY
+        self.followers = [] # (weak reference, attribute) of each reader of the log outside `derived`.
+        self.block_revisions = {} # (row // BLOCK, col // BLOCK) -> last revision to change it.
+        self.kind_blocks = {self.TERRAIN: {}, self.NAME: {}, self.FEATURE: {}} # The same, for each kind.
+        self.derived = {} # Indexes built from the grid, which keep themselves up to date.
+
+    @classmethod
+    def from_cells(cls, cells, terrains=None):
+        '''
+        Builds a grid from a list of lists of cell dictionaries, as stored in
+        the JSON world files. terrain_type may be a Terrain or its name.
+        '''
+        grid = cls(len(cells), len(cells[0]), terrains)
+        by_type = dict((t.terrain_type, i) for i, t in enumerate(grid.terrains))
+        for r, row in enumerate(cells):
+            for c, cell in enumerate(row):
+                i = r * grid.cols + c
+                terrain = cell.get('terrain_type')
+                if terrain in grid.terrain_codes:
+                    grid.terrain[i] = grid.terrain_codes[terrain]
+                else:
+                    grid.terrain[i] = by_type[terrain.lower()]
+                grid.name_index[i] = grid.intern(cell.get('name'))
+                extra = dict((k, v) for k, v in cell.items() if k not in ('terrain_type', 'name'))
+                if extra:
+                    grid.features[(r, c)] = extra
+        return grid
+
+    def to_cells(self):
+        '''
+        Returns the grid as a list of lists of cell dictionaries, in the JSON
+        world file schema.
+        '''
+        return [[self.cell(r, c, terrain_names=True) for c in range(self.cols)]
+            for r in range(self.rows)]
+
+    def intern(self, name):
+        '''
+        Returns the index of `name` in the name table, adding it if required.
+        '''
+        try:
+            return self.name_codes[name]
+        except KeyError:
+            self.names.append(name)
+            self.name_codes[name] = len(self.names) - 1
+            return len(self.names) - 1
+
+    def in_bounds(self, row, col):
+        return 0 <= row < self.rows and 0 <= col < self.cols
+
+    def terrain_at(self, row, col):
+        '''
+        Returns the Terrain at (row, col). Cells off the edge of the map are
+        FROZEN_WASTES.
+        '''
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return self.terrains[self.terrain[row * self.cols + col]]
+        return constants.FROZEN_WASTES
+
+    def name_at(self, row, col):
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return self.names[self.name_index[row * self.cols + col]]
+        return None
+
+    def feature(self, row, col, key):
+        '''
+        Returns the value of feature `key` at (row, col), or None.
+        '''
+        features = self.features.get((row, col))
+        if features:
+            return features.get(key)
+        return None
+
+    def cell(self, row, col, terrain_names=False):
+        '''
+        Returns a dictionary describing the cell, in the same shape as the
+        JSON world data.
+        '''
+        terrain = self.terrain_at(row, col)
+        cell = {'terrain_type': terrain.terrain_type if terrain_names else terrain,
+            'name': self.name_at(row, col)}
+        cell.update(self.features.get((row, col), {}))
+        return cell
+
+    def set_terrain(self, row, col, terrain):
+        self.terrain[row * self.cols + col] = self.terrain_codes[terrain]
+        self.touch(row, col, self.TERRAIN)
+
+    def set_name(self, row, col, name):
+        self.name_index[row * self.cols + col] = self.intern(name)
+        self.touch(row, col, self.NAME)
+
+    def set_feature(self, row, col, key, value):
+        '''
+        Sets feature `key` at (row, col). A value of None removes it.
+        '''
+        features = self.features.setdefault((row, col), {})
+        if value is None:
+            features.pop(key, None)
+            if not features:
+                del self.features[(row, col)]
+        else:
+            features[key] = value
+        self.touch(row, col, self.FEATURE)
+
+    def touch(self, row, col, kind=ALL):
+        '''
+        Records that the `kind` of contents of (row, col) have changed.
+        '''
+        self.revision += 1
+        self.changes.append((row, col))
+        self.change_kinds.append(kind)
+        block = (row // self.BLOCK, col // self.BLOCK)
+        self.block_revisions[block] = self.revision
+        for flag, blocks in self.kind_blocks.items():
+            if kind & flag:
+                blocks[block] = self.revision
+        if kind & self.TERRAIN:
+            self.terrain_revision = self.revision
+        if len(self.changes) >= self.compact_at:
+            self.compact()
+            self.compact_at = len(self.changes) + self.COMPACT_EVERY
+
+    def region_revision(self, row, col, radius, kinds=ALL):
+        '''
+        Returns the latest revision to change any cell within `radius` cells
+        of (row, col) (possibly a later one that changed a cell nearby),
+        counting only changes of `kinds`.
+        '''
+        revision = 0
+        if kinds == self.ALL:
+            gets = [self.block_revisions.get]
+        else:
+            gets = [blocks.get for flag, blocks in self.kind_blocks.items() if kinds & flag]
+        for block_row in range((row - radius) // self.BLOCK, (row + radius) // self.BLOCK + 1):
+            for block_col in range((col - radius) // self.BLOCK, (col + radius) // self.BLOCK + 1):
+                for get in gets:
+                    revision = max(revision, get((block_row, block_col), 0))
+        return revision
+
+    def changes_since(self, revision, kinds=ALL):
+        '''
+        Returns the cells changed after `revision` (possibly with repeats),
+        by changes of `kinds`.
+        '''
+        if revision < self.compacted:
+            raise ValueError('Changes before revision {0} have been compacted away.'.format(self.compacted))
+        start = revision - self.compacted
+        if kinds == self.ALL:
+            return self.changes[start:]
+        kind_of = self.change_kinds
+        return [cell for i, cell in enumerate(self.changes[start:], start) if kind_of[i] & kinds]
+
+    def follow(self, follower, attribute='revision'):
+        '''
+        Registers `follower` as a reader of the change log, which has caught
+        up to the revision in its `attribute`, so compact() keeps the changes
+        it hasn't read yet. Indexes in `derived` needn't be registered. The
+        follower is only weakly referenced.
+        '''
+        self.followers.append((weakref.ref(follower), attribute))
+
+    def compact(self):
+        '''
+        Drops the changes that every reader of the log has caught up past
+        (every follower, and every index in `derived` with a `revision`).
+        Followers with an update() method are brought up to date first.
+        Returns the number of changes dropped.
+        '''
+        self.followers = [(ref, attribute) for ref, attribute in self.followers if ref() is not None]
+        oldest = self.revision
+        for ref, attribute in self.followers:
+            follower = ref()
+            if hasattr(follower, 'update'):
+                follower.update()
+            oldest = min(oldest, getattr(follower, attribute))
+        for index in self.derived.values():
+            oldest = min(oldest, getattr(index, 'revision', oldest))
+        dropped = oldest - self.compacted
+        if dropped > 0:
+            del self.changes[:dropped]
+            del self.change_kinds[:dropped]
+            self.compacted = oldest
+        return max(dropped, 0)
+
+    def prefetch(self, gamedata):
+        '''
+        Hints that the parts of the map around the game's lords and armies
+        will be needed soon. Nothing to do for a grid held in memory.
+        '''
+        pass
+
+    # The grid can still be indexed as world[row][col], returning a cell dict.
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row):
+        return _RowView(self, row)
+
+
+class _RowView:
+    def __init__(self, grid, row):
+        self.grid = grid
+        self.row = row
+
+    def __len__(self):
+        return self.grid.cols
+
+    def __getitem__(self, col):
+        if not self.grid.in_bounds(self.row, col):
+            raise IndexError('Cell ({0}, {1}) is off the map.'.format(self.row, col))
+        return self.grid.cell(self.row, col)
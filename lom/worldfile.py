@@ -0,0 +1,198 @@
+#!/usr/bin/python
+'''
+Reading and writing world maps.
+
+The JSON format (a list of rows of {"terrain_type": ..., "name": ...} cells)
+is the editable import/export format. The binary .lomw format is laid out as:
+
+    header        HEADER, see below
+    terrain plane rows * cols bytes, each an index into the terrain types
+    name plane    rows * cols little-endian uint16s, each a name index
+                  (0 means no name, n means the nth name in the string table)
+    features      FEATURE records of (row, col, key, value) string indices
+    string table  terrain type names, then location names, then feature
+                  keys and values; each a uint16 length plus UTF-8 bytes
+
+Binary files are memory-mapped on load, so the planes are only paged in
+as cells are read. Worlds too big for that can be split into chunk files
+and streamed instead (see chunks.py).
+'''
+from __future__ import division, print_function, unicode_literals
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+import chunks
+import constants
+import profiling
+from world import WorldGrid
+
+MAGIC = b'LOMW'
+VERSION = 1
+# magic, version, rows, cols, terrain type count, name count, feature count, string table offset
+HEADER = struct.Struct(str('<4sHIIHIII'))
+FEATURE = struct.Struct(str('<IIII'))
+STRING_LENGTH = struct.Struct(str('<H'))
+
+
+class MappedPlane:
+    '''
+    An array-like view of fixed-size little-endian integers inside a buffer
+    (e.g. a memory-mapped file). Values are decoded as they are read.
+    '''
+    def __init__(self, buf, offset, count, typecode):
+        self.buf = buf
+        self.offset = offset
+        self.count = count
+        self.format = struct.Struct(str('<' + typecode))
+        self.itemsize = self.format.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            # Runs of values are decoded in one go, e.g. for copying whole rows.
+            start, stop, step = i.indices(self.count)
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+            count = max(0, stop - start)
+            fmt = str('<{0}{1}'.format(count, self.format.format[-1]))
+            return array(str(self.format.format[-1]), struct.unpack_from(fmt, self.buf, self.offset + start * self.itemsize))
+        if not 0 <= i < self.count:
+            raise IndexError('Plane index out of range.')
+        return self.format.unpack_from(self.buf, self.offset + i * self.itemsize)[0]
+
+    def __setitem__(self, i, value):
+        if not 0 <= i < self.count:
+            raise IndexError('Plane index out of range.')
+        self.format.pack_into(self.buf, self.offset + i * self.itemsize, value)
+
+
+def load_json(path, terrains=None):
+    with open(path, 'r') as f:
+        return WorldGrid.from_cells(json.load(f), terrains)
+
+def save_json(grid, path):
+    # Written a row at a time, so big maps never need every cell dict at once.
+    with open(path, 'w') as f:
+        f.write('[')
+        for row in range(grid.rows):
+            if row:
+                f.write(', ')
+            f.write(json.dumps([grid.cell(row, col, terrain_names=True) for col in range(grid.cols)]))
+        f.write(']')
+
+def dumps(grid):
+    '''
+    Returns `grid` in the binary world format, as a byte string. The same
+    world always gives the same bytes.
+    '''
+    cells = grid.rows * grid.cols
+    strings = [t.terrain_type for t in grid.terrains] + grid.names[1:]
+    string_codes = {}
+    features = []
+    for (row, col), values in sorted(grid.features.items()):
+        for key, value in sorted(values.items()):
+            codes = []
+            for s in (key, value):
+                if s not in string_codes:
+                    string_codes[s] = len(strings)
+                    strings.append(s)
+                codes.append(string_codes[s])
+            features.append(FEATURE.pack(row, col, codes[0], codes[1]))
+    name_plane = plane_bytes(grid.name_index, 'H')
+    string_offset = HEADER.size + cells + len(name_plane) + FEATURE.size * len(features)
+    parts = [HEADER.pack(MAGIC, VERSION, grid.rows, grid.cols, len(grid.terrains),
+        len(grid.names) - 1, len(features), string_offset)]
+    parts.append(plane_bytes(grid.terrain, 'B'))
+    parts.append(name_plane)
+    parts.extend(features)
+    for s in strings:
+        encoded = s.encode('utf-8')
+        parts.append(STRING_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+    return b''.join(parts)
+
+def save(grid, path):
+    '''
+    Writes `grid` to `path` in the binary world format.
+    '''
+    with open(path, 'wb') as f:
+        f.write(dumps(grid))
+
+def plane_bytes(plane, typecode):
+    '''
+    Returns a plane of the grid as little-endian bytes.
+    '''
+    if not (isinstance(plane, array) and plane.typecode == typecode):
+        # Memory-mapped and chunked planes are read in bulk with a slice.
+        plane = array(str(typecode), plane[:])
+    if sys.byteorder != 'little':
+        plane = array(str(typecode), plane)
+        plane.byteswap()
+    return plane.tostring()
+
+def content_hash(grid):
+    '''
+    Returns a hash of everything in `grid`: terrain, names and features.
+    '''
+    return hashlib.sha1(dumps(grid)).hexdigest()
+
+def load(path, terrains=None):
+    '''
+    Memory-maps the binary world file at `path` and returns a WorldGrid
+    backed by it. The mapping is copy-on-write: changes to the grid are
+    never written back to the file.
+    '''
+    with open(path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    magic, version, rows, cols, terrain_count, name_count, feature_count, string_offset = \
+        HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('{0} is not a version {1} world file.'.format(path, VERSION))
+    strings = []
+    pos = string_offset
+    while pos < len(buf):
+        length = STRING_LENGTH.unpack_from(buf, pos)[0]
+        pos += STRING_LENGTH.size
+        strings.append(buf[pos:pos + length].decode('utf-8'))
+        pos += length
+    by_type = dict((t.terrain_type, t) for t in (terrains or constants.TERRAINS))
+    cells = rows * cols
+    grid = WorldGrid(rows, cols, [by_type[s] for s in strings[:terrain_count]],
+        terrain=MappedPlane(buf, HEADER.size, cells, 'B'),
+        name_index=MappedPlane(buf, HEADER.size + cells, cells, 'H'))
+    for name in strings[terrain_count:terrain_count + name_count]:
+        grid.intern(name)
+    pos = HEADER.size + cells * 3
+    for i in range(feature_count):
+        row, col, key, value = FEATURE.unpack_from(buf, pos + i * FEATURE.size)
+        grid.features.setdefault((row, col), {})[strings[key]] = strings[value]
+    return grid
+
+@profiling.timed('load_world')
+def load_world(path, terrains=None):
+    '''
+    Loads a world from `path`, a .json or .lomw file or a chunked .lomc
+    directory (streamed from disk, see chunks.py). A JSON world is
+    compiled to a .lomw file alongside it the first time it is loaded, and
+    the compiled copy is used for as long as it is newer than the JSON.
+    '''
+    root, ext = os.path.splitext(path.rstrip(os.sep))
+    if ext == chunks.EXTENSION:
+        return chunks.open_world(path, terrains)
+    if ext != '.json':
+        return load(path, terrains)
+    compiled = root + '.lomw'
+    if os.path.exists(compiled) and os.path.getmtime(compiled) >= os.path.getmtime(path):
+        return load(compiled, terrains)
+    grid = load_json(path, terrains)
+    try:
+        save(grid, compiled)
+    except (IOError, OSError):
+        pass # Read-only data directory; just use the JSON next time too.
+    return grid
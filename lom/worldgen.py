@@ -0,0 +1,150 @@
+#!/usr/bin/python
+'''
+Seeded procedural worlds, for trying the game (and its benchmarks) on maps
+far bigger than the original 63x66.
+
+Terrain follows fields of fractal value noise: lakes fill the lowest
+ground and downs the highest, mountains run in ranges along the ridges of
+a third field, and forest covers the wettest of the rest, with the
+remainder plains. Terrain shares
+are set by quantiles of the noise, so every map has the same mix whatever
+its size. The map is ringed with Frozen Wastes, and dotted with named
+sites (citadels, keeps, villages, ...) and, optionally, monsters. Every
+other square is named after its terrain and the domain it lies in, as in
+the original map.
+
+The noise is computed on a grid of at most COARSE x COARSE points, and
+larger maps are scaled up from it a whole row at a time (with each row
+shifted a little, so the edges of terrain are ragged rather than blocky),
+which keeps a 4096x4096 map to seconds in pure Python.
+'''
+from __future__ import division, print_function, unicode_literals
+from array import array
+import random
+import constants
+from world import WorldGrid
+
+COARSE = 256
+PERSISTENCE = 0.6 # The weight of each octave of noise, relative to the one before.
+LAKES = 0.04 # Share of the land under each terrain.
+MOUNTAINS = 0.14
+DOWNS = 0.12
+FOREST = 0.3 # Share of the lowlands that's forest.
+DOMAIN = 16 # Squares along the side of a domain, at the most (see domain_size).
+MAX_DOMAINS = 2048 # Domains are made bigger on bigger maps, to stay under this.
+SITE_DENSITY = 1 / 300 # Sites per square.
+MAX_SITES = 40000 # Names are stored as uint16s, so the sites have to stop somewhere.
+MONSTER_DENSITY = 1 / 600
+# Sites, with how often each turns up.
+SITES = [('village', 30), ('keep', 15), ('tower', 10), ('henge', 10), ('lith', 10),
+    ('ruin', 10), ('cavern', 8), ('citadel', 5), ('snowhall', 2)]
+SYLLABLES = ['kor', 'ush', 'gar', 'ak', 'dun', 'mor', 'ith', 'val', 'ras', 'lo', 'thi', 'an',
+    'shim', 'er', 'ar', 'lo', 'xa', 'jor', 'kith', 'dawn', 'gor', 'ha', 'ka', 'ru']
+
+
+def value_noise(rows, cols, rng):
+    '''
+    Returns a rows x cols field (a list of row lists) of fractal value noise
+    between 0 and 1: random values on lattices of halving spacing (from a
+    quarter of the field down to every point), blended smoothly between
+    lattice points and summed with weights falling by PERSISTENCE.
+    '''
+    field = [[0.0] * cols for r in range(rows)]
+    spacing = max(2, max(rows, cols) // 4)
+    weight, total = 1.0, 0.0
+    while spacing > 1:
+        lattice = [[rng.random() for c in range(cols // spacing + 2)] for r in range(rows // spacing + 2)]
+        # Each column's lattice cell and (smoothstepped) position within it.
+        xs = [(c // spacing, smooth(c % spacing / spacing)) for c in range(cols)]
+        for r in range(rows):
+            i, fy = r // spacing, smooth(r % spacing / spacing)
+            top, bottom = lattice[i], lattice[i + 1]
+            line = [a + (b - a) * fy for a, b in zip(top, bottom)]
+            row = field[r]
+            field[r] = [v + weight * (line[j] + (line[j + 1] - line[j]) * fx) for v, (j, fx) in zip(row, xs)]
+        total += weight
+        weight *= PERSISTENCE
+        spacing //= 2
+    return [[v / total for v in row] for row in field]
+
+def smooth(t):
+    return t * t * (3 - 2 * t)
+
+def quantile(field, share):
+    values = sorted(v for row in field for v in row)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+def name(rng):
+    return ''.join(rng.choice(SYLLABLES) for i in range(rng.randint(2, 3))).title()
+
+def domain_size(rows, cols):
+    size = DOMAIN
+    while (rows // size + 1) * (cols // size + 1) > MAX_DOMAINS:
+        size *= 2
+    return size
+
+def generate(rows, cols=None, seed=0, monsters=True):
+    '''
+    Returns a new seeded WorldGrid of rows x cols squares.
+    '''
+    cols = cols or rows
+    rng = random.Random(seed)
+    grid = WorldGrid(rows, cols)
+    codes = dict((t.terrain_type, grid.terrain_codes[t]) for t in grid.terrains)
+    scale = max(1, -(-max(rows, cols) // COARSE)) # Squares per noise point.
+    coarse_rows, coarse_cols = rows // scale + 2, cols // scale + 2
+    elevation = value_noise(coarse_rows, coarse_cols, rng)
+    moisture = value_noise(coarse_rows, coarse_cols, rng)
+    # Mountains run in ranges along the middle values of another field.
+    ridges = [[1 - abs(2 * v - 1) for v in row] for row in value_noise(coarse_rows, coarse_cols, rng)]
+    lake = quantile(elevation, LAKES)
+    downs = quantile(elevation, 1 - DOWNS)
+    mountains = quantile(ridges, 1 - MOUNTAINS)
+    wet = quantile(moisture, 1 - FOREST)
+    coarse = []
+    for heights, peaks, wetness in zip(elevation, ridges, moisture):
+        coarse.append(array(str('B'), [codes['lake'] if e < lake else codes['mountains'] if p >= mountains else
+            codes['downs'] if e >= downs else codes['forest'] if m >= wet else codes['plains']
+            for e, p, m in zip(heights, peaks, wetness)]))
+    # Name every square after its terrain and domain.
+    size = domain_size(rows, cols)
+    domains = [[name(rng) for c in range(cols // size + 1)] for r in range(rows // size + 1)]
+    tables = {} # (domain row, domain col) -> the name code of each terrain there (interned as needed).
+    width = coarse_cols * scale
+    line = array(str('B'), [0]) * width
+    names = array(str('H'), [0]) * width
+    for r in range(rows):
+        source = coarse[r // scale]
+        # Shift each row by up to a noise point, so terrain edges are ragged.
+        shift = rng.randrange(scale)
+        for k in range(scale):
+            line[k::scale] = source
+        grid.terrain[r * cols:(r + 1) * cols] = line[shift:shift + cols]
+        for c in range(0, cols, size):
+            stop = min(cols, c + size)
+            chunk = line[shift + c:shift + stop]
+            table = tables.setdefault((r // size, c // size), [None] * len(grid.terrains))
+            for code in set(chunk):
+                if table[code] is None:
+                    domain = domains[r // size][c // size]
+                    table[code] = grid.intern('the {0} of {1}'.format(grid.terrains[code].name.title(), domain))
+            names[c:stop] = array(str('H'), [table[code] for code in chunk])
+        grid.name_index[r * cols:(r + 1) * cols] = names[:cols]
+    # Ring the map with the Frozen Wastes.
+    wastes = grid.intern('the Frozen Wastes')
+    for r in range(rows):
+        for c in ((0, cols - 1) if 0 < r < rows - 1 else range(cols)):
+            grid.terrain[r * cols + c] = codes['frozen_wastes']
+            grid.name_index[r * cols + c] = wastes
+    # Scatter the sites and monsters.
+    kinds = [kind for kind, weight in SITES for i in range(weight)]
+    for i in range(min(MAX_SITES, int(rows * cols * SITE_DENSITY))):
+        r, c, kind = rng.randrange(1, rows - 1), rng.randrange(1, cols - 1), rng.choice(kinds)
+        grid.terrain[r * cols + c] = codes[kind]
+        grid.name_index[r * cols + c] = grid.intern('the {0} of {1}'.format(kind.title(), name(rng)))
+    if monsters:
+        types = sorted(constants.MONSTER_TYPES)
+        for i in range(int(rows * cols * MONSTER_DENSITY)):
+            r, c = rng.randrange(1, rows - 1), rng.randrange(1, cols - 1)
+            grid.features[(r, c)] = {'monster': rng.choice(types)}
+    return grid
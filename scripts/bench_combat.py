@@ -0,0 +1,72 @@
+#!/usr/bin/python
+'''
+Battle resolution benchmark.
+
+Sets up `--battles` seeded battles between armies of random races and
+strengths on random squares of the world, resolves them as one batch on
+each of `--nights` nights, and reports the batch times and battles resolved
+per second as JSON.
+
+    python scripts/bench_combat.py [--battles 5000] [--nights 20] [--seed 1] [--output bench_combat.json]
+'''
+from __future__ import division, print_function, unicode_literals
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lom import combat, constants, worldfile
+from lom.stats import summarize
+
+
+def muster(world, count, seed):
+    rng = random.Random(seed)
+    battles = combat.Battles(terrains=world.terrains)
+    cells = [(r, c) for r in range(world.rows) for c in range(world.cols)
+        if world.terrain_at(r, c) != constants.FROZEN_WASTES]
+    for i in range(count):
+        battles.add(rng.randint(100, 1200), rng.randint(100, 1200), rng.choice(constants.RACES),
+            rng.choice(constants.RACES), world.terrain_at(*rng.choice(cells)))
+    return battles
+
+def run(battles, nights, seed):
+    world = worldfile.load_world(constants.DefaultGameData.world_file)
+    batch = muster(world, battles, seed)
+    timings = []
+    outcomes = {'attacker': 0, 'defender': 0, 'undecided': 0}
+    for night in range(nights):
+        start = time.time()
+        results = combat.resolve(batch, seed + night)
+        timings.append(time.time() - start)
+        outcomes['attacker'] += results.wins(combat.ATTACKER)
+        outcomes['defender'] += results.wins(combat.DEFENDER)
+        outcomes['undecided'] += results.wins(combat.UNDECIDED)
+    return {
+        'battles': battles,
+        'nights': nights,
+        'batch_ms': summarize([t * 1000 for t in timings]),
+        'battles_per_second': battles * nights / sum(timings),
+        'outcomes': outcomes,
+        'python': platform.python_version(),
+        'timestamp': time.time(),
+        'seed': seed,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark resolving a night's battles.")
+    parser.add_argument('--battles', type=int, default=5000)
+    parser.add_argument('--nights', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench_combat.json')
+    args = parser.parse_args()
+    results = run(args.battles, args.nights, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print('{battles} battles, {nights} nights: p50 {p50:.2f} ms, p95 {p95:.2f} ms per night ({rate:,.0f} battles/s)'.format(
+        battles=results['battles'], nights=results['nights'], rate=results['battles_per_second'],
+        **results['batch_ms']))
+    print('Outcomes: {attacker} attacker wins, {defender} defender holds, {undecided} undecided'.format(**results['outcomes']))
+    print('Results written to {0}'.format(args.output))
@@ -0,0 +1,52 @@
+#!/usr/bin/python
+'''
+Measures how long a fresh interpreter takes to import lom.constants, and
+how long the first DefaultGameData() instantiation takes after that.
+Importing must not load the world or pygame.
+
+    python scripts/bench_import.py [--runs 20] [--output import.json]
+'''
+from __future__ import division, print_function, unicode_literals
+import argparse
+import json
+import os
+import subprocess
+import sys
+PROJECT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, PROJECT_PATH)
+from lom.stats import summarize
+# Run in a child process so every sample is a cold import.
+CHILD = '''
+import json, sys, time
+sys.path.insert(0, {path!r})
+t = time.time()
+from lom import constants
+imported = time.time()
+constants.DefaultGameData()
+print(json.dumps({{
+    'import': imported - t,
+    'instantiate': time.time() - imported,
+    'pygame_loaded': 'pygame' in sys.modules,
+}}))
+'''
+
+
+def run(runs):
+    code = CHILD.format(path=os.path.abspath(PROJECT_PATH))
+    samples = [json.loads(subprocess.check_output([sys.executable, '-c', code]).decode('utf-8'))
+        for i in range(runs)]
+    results = {'runs': runs, 'pygame_loaded': any(s['pygame_loaded'] for s in samples)}
+    for key in ('import', 'instantiate'):
+        results[key + '_ms'] = summarize([s[key] * 1000 for s in samples])
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark importing lom.constants.')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--output', help='Write the results to this JSON file.')
+    args = parser.parse_args()
+    results = run(args.runs)
+    print(json.dumps(results, indent=2, sort_keys=True))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
@@ -0,0 +1,62 @@
+#!/usr/bin/python
+'''
+Night-phase benchmark for Doomdark's armies.
+
+Scatters `--armies` armies (half riders, half warriors) over seeded passable
+squares of the world, each marching on a seeded citadel or keep, then runs
+`--nights` nights and reports p50/p95/p99 night times against the frame
+budget as JSON.
+
+    python scripts/bench_night.py [--armies 2000] [--nights 20] [--seed 1] [--output bench_night.json]
+'''
+from __future__ import division, print_function, unicode_literals
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lom import constants
+from lom.armies import NightPhase
+
+
+def muster(gamedata, count, seed):
+    rng = random.Random(seed)
+    world = gamedata.world
+    cells = [(r, c) for r in range(world.rows) for c in range(world.cols)]
+    passable = [cell for cell in cells if world.terrain_at(*cell) != constants.FROZEN_WASTES]
+    strongholds = [cell for cell in cells if world.terrain_at(*cell) in (constants.CITADEL, constants.KEEP)]
+    for i in range(count):
+        gamedata.armies.add(rng.choice(passable), rng.randint(100, 1200), constants.FOUL,
+            mounted=i % 2, target=rng.choice(strongholds))
+
+def run(armies, nights, seed):
+    gamedata = constants.DefaultGameData()
+    muster(gamedata, armies, seed)
+    phase = NightPhase(gamedata.armies)
+    for night in range(nights):
+        phase.run(gamedata)
+    results = phase.stats()
+    results.update({
+        'python': platform.python_version(),
+        'timestamp': time.time(),
+        'seed': seed,
+    })
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the night phase with many armies.")
+    parser.add_argument('--armies', type=int, default=2000)
+    parser.add_argument('--nights', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench_night.json')
+    args = parser.parse_args()
+    results = run(args.armies, args.nights, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print('{armies} armies, {nights} nights: p50 {p50:.2f} ms, p95 {p95:.2f} ms, max {max:.2f} ms ({over} over the {budget:.1f} ms budget)'.format(
+        armies=results['armies'], nights=results['nights'], over=results['over_budget'],
+        budget=results['budget_ms'], **results['night_ms']))
+    print('Results written to {0}'.format(args.output))
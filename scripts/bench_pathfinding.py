@@ -0,0 +1,96 @@
+#!/usr/bin/python
+'''
+Route-finding benchmark.
+
+Builds a map `--scale` times the size of the game's world in each direction
+(the world's interior tiled inside a border of Frozen Wastes), then times
+find_route between a seeded sample of passable cells at most `--distance`
+squares apart (0 for anywhere on the map), mounted and on foot. Reports the
+time to build the cost fields and p50/p95/p99 query times as JSON.
+
+    python scripts/bench_pathfinding.py [--scale 10] [--distance 40] [--queries 50] [--seed 1] [--output bench_pathfinding.json]
+'''
+from __future__ import division, print_function, unicode_literals
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lom import constants, pathfinding
+from lom.stats import summarize
+from lom.world import WorldGrid
+
+
+def tiled(world, scale):
+    '''
+    Returns a WorldGrid holding the interior of `world` (everything inside
+    its one-cell border) repeated `scale` x `scale` times, bordered again.
+    '''
+    rows, cols = world.rows - 2, world.cols - 2
+    grid = WorldGrid(rows * scale + 2, cols * scale + 2, world.terrains)
+    wastes = grid.terrain_codes[constants.FROZEN_WASTES]
+    for r in range(grid.rows):
+        for c in range(grid.cols):
+            if r in (0, grid.rows - 1) or c in (0, grid.cols - 1):
+                grid.terrain[r * grid.cols + c] = wastes
+            else:
+                grid.terrain[r * grid.cols + c] = world.terrain[((r - 1) % rows + 1) * world.cols + (c - 1) % cols + 1]
+    return grid
+
+def sample_pairs(world, count, distance, seed):
+    rng = random.Random(seed)
+    passable = [(r, c) for r in range(world.rows) for c in range(world.cols)
+        if world.terrain_at(r, c) != constants.FROZEN_WASTES]
+    pairs = []
+    while len(pairs) < count:
+        origin, goal = rng.choice(passable), rng.choice(passable)
+        if not distance or max(abs(origin[0] - goal[0]), abs(origin[1] - goal[1])) <= distance:
+            pairs.append((origin, goal))
+    return pairs
+
+def run(scale, distance, queries, seed):
+    world = tiled(constants.DefaultGameData().world, scale)
+    results = {
+        'python': platform.python_version(),
+        'timestamp': time.time(),
+        'seed': seed,
+        'rows': world.rows,
+        'cols': world.cols,
+        'distance': distance,
+        'queries': queries,
+    }
+    pairs = sample_pairs(world, queries, distance, seed)
+    for mounted in (True, False):
+        mode = 'mounted' if mounted else 'on_foot'
+        start = time.time()
+        pathfinding.cost_field(world, mounted)
+        results[mode + '_field_ms'] = (time.time() - start) * 1000
+        times, days = [], []
+        for origin, goal in pairs:
+            start = time.time()
+            route = pathfinding.find_route(world, origin, goal, mounted)
+            times.append((time.time() - start) * 1000)
+            if route:
+                days.append(route.days)
+        results[mode + '_query_ms'] = summarize(times)
+        results[mode + '_route_days'] = summarize(days)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark route finding on a scaled-up map.')
+    parser.add_argument('--scale', type=int, default=10, help='Times the world is repeated in each direction.')
+    parser.add_argument('--distance', type=int, default=40, help='Furthest apart (in squares) the ends of a route may be; 0 for anywhere.')
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench_pathfinding.json')
+    args = parser.parse_args()
+    results = run(args.scale, args.distance, args.queries, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    for mode in ('mounted', 'on_foot'):
+        print('{mode} on {rows}x{cols}: p50 {p50:.1f} ms, p95 {p95:.1f} ms, max {max:.1f} ms'.format(
+            mode=mode, rows=results['rows'], cols=results['cols'], **results[mode + '_query_ms']))
+    print('Results written to {0}'.format(args.output))
@@ -0,0 +1,81 @@
+#!/usr/bin/python
+'''
+Scaling benchmark for the multi-process route planner.
+
+Scatters `--units` units (half mounted) over seeded passable squares of the
+world in data/world.json and plans each a route to one of the citadels or
+keeps, once with every worker count from 1 to `--workers` (default: every
+core). Checks that every worker count gives the same plan as one worker,
+and reports the timings and speed-ups as JSON.
+
+    python scripts/bench_planner.py [--units 500] [--workers N] [--seed 1] [--output bench_planner.json]
+'''
+from __future__ import division, print_function, unicode_literals
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lom import constants, worldfile
+from lom.planner import Planner
+
+
+def sample_units(world, count, seed):
+    rng = random.Random(seed)
+    passable = [(r, c) for r in range(world.rows) for c in range(world.cols)
+        if world.terrain_at(r, c) != constants.FROZEN_WASTES]
+    return [(rng.choice(passable), i % 2 == 0) for i in range(count)]
+
+def summary(routes):
+    # Enough of each route to compare plans made with different worker counts.
+    return [route and (route.cells, route.arrival) for route in routes]
+
+def run(units, workers, seed):
+    world = worldfile.load_json(os.path.join(constants.DATA_PATH, 'world.json'))
+    goals = [(r, c) for r in range(world.rows) for c in range(world.cols)
+        if world.terrain_at(r, c) in (constants.CITADEL, constants.KEEP)]
+    sample = sample_units(world, units, seed)
+    results = {
+        'python': platform.python_version(),
+        'cpus': multiprocessing.cpu_count(),
+        'timestamp': time.time(),
+        'seed': seed,
+        'units': units,
+        'runs': [],
+    }
+    expected = None
+    for count in range(1, workers + 1):
+        planner = Planner(world, count)
+        start = time.time()
+        routes = planner.plan(sample, goals, seed)
+        elapsed = time.time() - start
+        planner.close()
+        if expected is None:
+            expected = summary(routes)
+        results['runs'].append({
+            'workers': count,
+            'seconds': elapsed,
+            'units_per_second': units / elapsed,
+            'speedup': results['runs'][0]['seconds'] / elapsed if results['runs'] else 1.0,
+            'matches_one_worker': summary(routes) == expected,
+        })
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the route planner across worker processes.')
+    parser.add_argument('--units', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench_planner.json')
+    args = parser.parse_args()
+    results = run(args.units, args.workers, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    for entry in results['runs']:
+        print('{workers} workers: {seconds:.2f} s, {units_per_second:.0f} units/s, x{speedup:.2f}{0}'.format(
+            '' if entry['matches_one_worker'] else ' (PLAN DIFFERS)', **entry))
+    print('Results written to {0}'.format(args.output))
@@ -0,0 +1,110 @@
+#!/usr/bin/python
+'''
+Headless frame-time benchmark for the panorama renderer.
+
+Renders every heading from a seeded sample of world locations (a sample of
+its own for each of the lords), and reports p50/p95/p99 frame times, images
+loaded from disk per frame and objects allocated per frame. Results are
+written as JSON so runs can be compared across changes to lom/models.py or
+the view_offsets tables.
+
+By default every frame is drawn from scratch with render_perspective. With
+--cached, frames come from a PanoramaCache as in the game: the views of the
+other headings are rendered while idle between frames (not timed), and
+each view's cached surface is blitted on a hit.
+
+    python scripts/bench_render.py [--locations 50] [--seed 1] [--cached] [--output bench_render.json]
+'''
+from __future__ import division, print_function, unicode_literals
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import pygame
+from lom import constants, display, panorama, sprites
+from lom.stats import summarize
+
+
+def sample_locations(world, count, rng):
+    return [(rng.randrange(world.rows), rng.randrange(world.cols)) for i in range(count)]
+
+def render_frame(render):
+    '''
+    Renders one frame with `render()` and returns (seconds, images loaded,
+    objects allocated).
+    '''
+    loads = sprites.cache.loads
+    # With the collector paused, gen 0's count is the net number of objects allocated.
+    gc.disable()
+    objects = gc.get_count()[0]
+    start = time.time()
+    render()
+    elapsed = time.time() - start
+    objects = gc.get_count()[0] - objects
+    gc.enable()
+    return elapsed, sprites.cache.loads - loads, objects
+
+def run(locations, seed, preload=True, cached=False):
+    display.init(headless=True)
+    gamedata = constants.DefaultGameData()
+    world = gamedata.world
+    surface = display.offscreen()
+    if preload:
+        sprites.preload_game(gamedata)
+        panorama.compile_all()
+    panoramas = panorama.PanoramaCache(panorama.screen_rect(), lambda screen: screen.fill(constants.BLUE))
+    rng = random.Random(seed)
+    frames = []
+    by_heading = dict((h.name, []) for h in constants.HEADINGS)
+    for actor in gamedata.actors:
+        for location in sample_locations(world, locations, rng):
+            actor.location = location
+            for heading in constants.HEADINGS:
+                actor.heading = heading
+                if cached:
+                    frame = render_frame(lambda: surface.blit(panoramas.get(world, actor.location, actor.heading),
+                        panoramas.rect))
+                    # The game renders the other headings while waiting for the next key.
+                    while panoramas.render_pending():
+                        pass
+                else:
+                    frame = render_frame(lambda: actor.render_perspective(world, surface))
+                frames.append(frame)
+                by_heading[heading.name].append(frame[0] * 1000)
+    results = {
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'timestamp': time.time(),
+        'seed': seed,
+        'locations': locations,
+        'frames': len(frames),
+        'frame_ms': summarize([f[0] * 1000 for f in frames]),
+        'frame_ms_by_heading': dict((name, summarize(times)) for name, times in by_heading.items()),
+        'images_loaded_per_frame': summarize([f[1] for f in frames]),
+        'objects_allocated_per_frame': summarize([f[2] for f in frames]),
+        'sprite_cache': sprites.cache.stats(),
+        'cached': cached,
+    }
+    if cached:
+        results['view_cache'] = panoramas.surfaces.stats()
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark panorama rendering headlessly.')
+    parser.add_argument('--locations', type=int, default=50, help='Locations sampled per lord.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--cold', action='store_true', help="Don't preload the sprite cache first.")
+    parser.add_argument('--cached', action='store_true', help='Draw frames through a PanoramaCache, as the game does.')
+    parser.add_argument('--output', default='bench_render.json')
+    args = parser.parse_args()
+    results = run(args.locations, args.seed, preload=not args.cold, cached=args.cached)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print('{frames} frames: p50 {p50:.3f} ms, p95 {p95:.3f} ms, p99 {p99:.3f} ms'.format(
+        frames=results['frames'], **results['frame_ms']))
+    print('Results written to {0}'.format(args.output))
@@ -0,0 +1,130 @@
+#!/usr/bin/python
+'''
+Scaling benchmark: how loading, rendering, describing and moving grow with
+the size of the map.
+
+For each of `--sizes`, generates a seeded square world (lom/worldgen.py),
+saves it as .lomw (and as JSON, up to `--json-max`), loads it back, then
+renders every heading from `--locations` seeded squares, describes what
+each lord sees there (Actor.location_desc) and makes `--moves` moves with
+Actor.move. First calls (which build the world's derived indexes) are
+reported apart from the steady state. Writes JSON, including how much each
+measure grew from one size to the next against the growth in squares.
+
+    python scripts/bench_scaling.py [--sizes 64,256,1024,4096] [--locations 20] [--moves 2000] [--output bench_scaling.json]
+'''
+from __future__ import division, print_function, unicode_literals
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lom import constants, display, panorama, sprites, worldfile, worldgen
+from lom.stats import summarize
+
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return result, time.time() - start
+
+def sample_locations(world, count, rng):
+    locations = []
+    while len(locations) < count:
+        location = (rng.randrange(world.rows), rng.randrange(world.cols))
+        if world.terrain_at(*location) != constants.FROZEN_WASTES:
+            locations.append(location)
+    return locations
+
+def run_size(size, args, directory):
+    results = {'size': size, 'cells': size * size}
+    grid, results['generate_s'] = timed(worldgen.generate, size, size, args.seed)
+    path = os.path.join(directory, 'world_{0}.lomw'.format(size))
+    results['save_s'] = timed(worldfile.save, grid, path)[1]
+    results['file_bytes'] = os.path.getsize(path)
+    if size <= args.json_max:
+        json_path = os.path.join(directory, 'world_{0}.json'.format(size))
+        results['save_json_s'] = timed(worldfile.save_json, grid, json_path)[1]
+        results['load_json_s'] = timed(worldfile.load_json, json_path)[1]
+    del grid
+    world, results['load_s'] = timed(worldfile.load, path)
+    gamedata = constants.DefaultGameData(world=world, cheatmode=True)
+    rng = random.Random(args.seed)
+    locations = sample_locations(world, args.locations, rng)
+    surface = display.offscreen()
+    actor = gamedata.actor
+    frames, descriptions = [], []
+    for location in locations:
+        for heading in constants.HEADINGS:
+            actor.location, actor.heading = location, heading
+            frames.append(timed(panorama.render_view, surface, world, location, heading)[1] * 1000)
+            descriptions.append(timed(actor.location_desc, world)[1] * 1000)
+    results['first_render_ms'], results['render_ms'] = frames[0], summarize(frames[1:])
+    results['first_desc_ms'], results['desc_ms'] = descriptions[0], summarize(descriptions[1:])
+    moves = []
+    actor.location = locations[0]
+    for i in range(args.moves):
+        actor.heading = rng.choice(constants.HEADINGS)
+        actor.time = gamedata.dawn
+        moves.append(timed(actor.move, gamedata)[1] * 1000)
+    results['first_move_ms'], results['move_ms'] = moves[0], summarize(moves[1:])
+    return results
+
+def growth(results):
+    '''
+    For each size after the first, how many times over each measure grew
+    since the previous size, next to how many times over the squares grew.
+    '''
+    rows = []
+    for before, after in zip(results, results[1:]):
+        row = {'from': before['size'], 'to': after['size'], 'cells': after['cells'] / before['cells']}
+        for key in ('generate_s', 'save_s', 'load_s', 'first_render_ms', 'first_desc_ms', 'first_move_ms'):
+            if before.get(key):
+                row[key] = after[key] / before[key]
+        for key in ('render_ms', 'desc_ms', 'move_ms'):
+            row[key] = after[key]['p50'] / before[key]['p50']
+        rows.append(row)
+    return rows
+
+def run(args):
+    display.init(headless=True)
+    sprites.preload_game(constants.DefaultGameData())
+    panorama.compile_all()
+    directory = tempfile.mkdtemp()
+    try:
+        results = []
+        for size in args.sizes:
+            results.append(run_size(size, args, directory))
+            print('{size}x{size}: generate {generate_s:.2f}s, save {save_s:.2f}s, load {load_s:.3f}s, '
+                'first render {first_render_ms:.0f} ms then p50 {render:.2f} ms, '
+                'first description {first_desc_ms:.0f} ms then p50 {desc:.3f} ms, move p50 {move:.3f} ms'.format(
+                render=results[-1]['render_ms']['p50'], desc=results[-1]['desc_ms']['p50'],
+                move=results[-1]['move_ms']['p50'], **results[-1]))
+    finally:
+        shutil.rmtree(directory)
+    return {
+        'python': platform.python_version(),
+        'timestamp': time.time(),
+        'seed': args.seed,
+        'sizes': results,
+        'growth': growth(results),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark loading, rendering and moving on generated maps of growing size.')
+    parser.add_argument('--sizes', type=lambda s: [int(n) for n in s.split(',')], default=[64, 256, 1024, 4096])
+    parser.add_argument('--locations', type=int, default=20, help='Squares rendered and described from, per size.')
+    parser.add_argument('--moves', type=int, default=2000)
+    parser.add_argument('--json-max', type=int, default=512, help='The largest size also saved and loaded as JSON.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench_scaling.json')
+    args = parser.parse_args()
+    results = run(args)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print('Results written to {0}'.format(args.output))
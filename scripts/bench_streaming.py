@@ -0,0 +1,136 @@
+#!/usr/bin/python
+'''
+Streaming benchmark: opening and walking across a very large chunked world
+(see lom/chunks.py), against the same world as a memory-mapped .lomw file.
+
+Generates a seeded `--size` world (or uses the chunked world `--world`),
+times opening it and the first view, description and move, then has a lord
+walk `--moves` squares (turning at random, and whenever blocked), rendering
+the view and describing it after every step, as the game does. The walk is
+made twice, with and without prefetching the chunks ahead of the lords,
+counting the chunks that had to be read while the lord waited and the most
+memory the loaded chunks took. Writes JSON.
+
+    python scripts/bench_streaming.py [--size 4096] [--world WORLD.lomc] [--moves 3000] [--budget 8] [--output bench_streaming.json]
+'''
+from __future__ import division, print_function, unicode_literals
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lom import chunks, constants, display, panorama, sprites, worldfile, worldgen
+from lom.stats import summarize
+
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return result, time.time() - start
+
+def first_calls(world, results, prefix):
+    '''
+    Times the first view, description and move on a freshly opened world.
+    '''
+    gamedata = constants.DefaultGameData(world=world, cheatmode=True)
+    actor = gamedata.actor
+    actor.location = start_location(world)
+    surface = display.offscreen()
+    results[prefix + 'first_render_ms'] = timed(panorama.render_view, surface, world, actor.location, actor.heading)[1] * 1000
+    results[prefix + 'first_desc_ms'] = timed(actor.location_desc, world)[1] * 1000
+    results[prefix + 'first_move_ms'] = timed(actor.move, gamedata)[1] * 1000
+
+def start_location(world):
+    # The nearest square to the middle of the map that isn't Frozen Wastes.
+    row, col = world.rows // 2, world.cols // 2
+    while world.terrain_at(row, col) == constants.FROZEN_WASTES:
+        row, col = row + 1, col + 1
+    return (row, col)
+
+def walk(path, args, prefetch):
+    world = chunks.open_world(path, budget=args.budget * 1024 * 1024)
+    gamedata = constants.DefaultGameData(world=world, cheatmode=True)
+    for actor in gamedata.actors:
+        actor.location = start_location(world)
+    actor = gamedata.actor
+    rng = random.Random(args.seed)
+    surface = display.offscreen()
+    store, steps, peak, visited = world.store, [], 0, set()
+    for i in range(args.moves):
+        start = time.time()
+        if rng.random() < 0.02 or not actor.move(gamedata):
+            actor.heading = rng.choice(constants.HEADINGS)
+        if prefetch:
+            world.prefetch(gamedata)
+        panorama.render_view(surface, world, actor.location, actor.heading)
+        actor.location_desc(world)
+        steps.append((time.time() - start) * 1000)
+        peak = max(peak, store.cached.size)
+        visited.add(store.key(*actor.location))
+    stats = store.stats()
+    store.close()
+    return {
+        'step_ms': summarize(steps),
+        'loads': stats['loads'], # Chunks read while the lord waited.
+        'prefetched': stats['prefetched'],
+        'evictions': stats['evictions'],
+        'chunks_visited': len(visited),
+        'peak_chunk_bytes': peak,
+    }
+
+def run(args):
+    display.init(headless=True)
+    sprites.preload_game(constants.DefaultGameData())
+    panorama.compile_all()
+    directory = tempfile.mkdtemp()
+    results = {'budget_bytes': args.budget * 1024 * 1024, 'chunk': chunks.CHUNK}
+    try:
+        path = args.world
+        if path is None:
+            grid, results['generate_s'] = timed(worldgen.generate, args.size, args.size, args.seed)
+            path = os.path.join(directory, 'world.lomc')
+            results['save_chunks_s'] = timed(chunks.save, grid, path)[1]
+            mapped = os.path.join(directory, 'world.lomw')
+            results['save_lomw_s'] = timed(worldfile.save, grid, mapped)[1]
+            del grid
+            world, results['lomw_open_s'] = timed(worldfile.load, mapped)
+            first_calls(world, results, 'lomw_')
+            del world
+        world, results['open_s'] = timed(chunks.open_world, path)
+        results['size'] = [world.rows, world.cols]
+        first_calls(world, results, '')
+        world.store.close()
+        del world
+        results['walk'] = walk(path, args, True)
+        results['walk_no_prefetch'] = walk(path, args, False)
+    finally:
+        shutil.rmtree(directory)
+    results['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark streaming a large chunked world.')
+    parser.add_argument('--size', type=int, default=4096)
+    parser.add_argument('--world', help='A chunked (.lomc) world to use instead of generating one.')
+    parser.add_argument('--moves', type=int, default=3000)
+    parser.add_argument('--budget', type=int, default=8, help='Megabytes of chunks to keep loaded.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench_streaming.json')
+    args = parser.parse_args()
+    results = run(args)
+    results.update({'python': platform.python_version(), 'timestamp': time.time(), 'seed': args.seed})
+    for name in ('walk', 'walk_no_prefetch'):
+        walked = results[name]
+        print('{0}: step p50 {1:.2f} ms p99 {2:.2f} ms, {3} chunks read while waiting, {4} prefetched, '
+            'peak {5:.1f} MB of chunks'.format(name, walked['step_ms']['p50'], walked['step_ms']['p99'],
+            walked['loads'], walked['prefetched'], walked['peak_chunk_bytes'] / (1024 * 1024)))
+    print('Opened in {0:.3f}s; first render {1:.1f} ms'.format(results['open_s'], results['first_render_ms']))
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print('Results written to {0}'.format(args.output))
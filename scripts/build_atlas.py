@@ -0,0 +1,37 @@
+#!/usr/bin/python
+'''
+Builds the sprite atlas: the terrain, monster and heraldry images packed
+into assets/atlas/sprites.png with its index, assets/atlas/sprites.json.
+The game then loads that one image at startup (see lom/atlas.py) and
+scales the terrain for each view from it. With --prescaled, every terrain
+is also packed at each scale the headings' view_offsets draw it at, so
+nothing is scaled at startup, at the cost of a much bigger image.
+Rebuild after changing the images or the view_offsets scales; an atlas
+older than its images is ignored.
+
+    python scripts/build_atlas.py [--prescaled] [--width 512]
+'''
+from __future__ import division, print_function, unicode_literals
+import argparse
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lom import atlas, constants, display, sprites
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pack the game sprites into an atlas.')
+    parser.add_argument('--prescaled', action='store_true', help='Also pack every view scale of the terrain.')
+    parser.add_argument('--width', type=int, default=512, help='Width of the atlas image.')
+    args = parser.parse_args()
+    display.init(headless=True)
+    gamedata = constants.DefaultGameData()
+    # Scaled exactly as the game would scale them (without an atlas).
+    cache = sprites.SpriteCache()
+    keys = sprites.game_sprites(gamedata)
+    if not args.prescaled:
+        keys = set((path, 1) for path, scale in keys)
+    surfaces = dict((key, cache.get(*key)) for key in keys)
+    image = atlas.build(surfaces, width=args.width)
+    print('Packed {0} sprites from {1} images into a {2}x{3} atlas at {4}'.format(len(surfaces),
+        cache.loads, image.get_width(), image.get_height(), atlas.ATLAS_PATH))
@@ -0,0 +1,114 @@
+#!/usr/bin/python
+'''
+Checks a world streamed from chunks on disk (lom/chunks.py) against the same
+world held in memory.
+
+Generates a seeded `--size` world, saves it as a chunked world with small
+chunks (so the map edges land part way through them), and opens it with a
+memory budget of only a few chunks, so they're evicted and read again
+throughout. Then `--reads` random squares must give the same terrain_at,
+name_at and world[r][c], views and lookahead targets on both; `--edits`
+random changes to terrain, names and features, made to both, must leave
+them with the same bytes and content hash (and the same reads again); and
+the changed streamed world, saved and opened again, must still be the
+same. The exit status is 1 if anything disagrees.
+
+    python scripts/check_chunks.py [--size 300] [--reads 3000] [--edits 300] [--seed 1]
+'''
+from __future__ import division, print_function, unicode_literals
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lom import chunks, constants, lookahead, visibility, worldfile, worldgen
+
+CHUNK = 16
+
+
+def compare_reads(grid, streamed, count, rng, failures, when):
+    '''
+    Reads `count` random squares (and a few just off the map) of both worlds.
+    '''
+    grid_index, streamed_index = lookahead.index_for(grid), lookahead.index_for(streamed)
+    for i in range(count):
+        row, col = rng.randrange(-2, grid.rows + 2), rng.randrange(-2, grid.cols + 2)
+        checks = [('terrain_at', grid.terrain_at(row, col), streamed.terrain_at(row, col))]
+        if grid.in_bounds(row, col):
+            heading = rng.choice(constants.HEADINGS)
+            checks.extend([
+                ('name_at', grid.name_at(row, col), streamed.name_at(row, col)),
+                ('world[r][c]', grid[row][col], streamed[row][col]),
+                ('view_codes', visibility.view_codes(grid, (row, col), heading),
+                    visibility.view_codes(streamed, (row, col), heading)),
+                ('target_name', grid_index.target_name((row, col), heading),
+                    streamed_index.target_name((row, col), heading)),
+            ])
+        for what, expected, found in checks:
+            if expected != found:
+                failures.append((when, what, (row, col), expected, found))
+
+def compare_worlds(grid, streamed, failures, when):
+    if worldfile.dumps(grid) != worldfile.dumps(streamed):
+        failures.append((when, 'dumps', None, None, None))
+    if worldfile.content_hash(grid) != worldfile.content_hash(streamed):
+        failures.append((when, 'content_hash', None, worldfile.content_hash(grid), worldfile.content_hash(streamed)))
+
+def edit(grid, streamed, count, rng):
+    '''
+    Makes the same `count` random changes to both worlds.
+    '''
+    for i in range(count):
+        row, col = rng.randrange(grid.rows), rng.randrange(grid.cols)
+        change = rng.choice(('terrain', 'name', 'feature'))
+        for world in (grid, streamed):
+            if change == 'terrain':
+                world.set_terrain(row, col, grid.terrains[i % len(grid.terrains)])
+            elif change == 'name':
+                world.set_name(row, col, 'Check {0}'.format(i % 17))
+            else:
+                world.set_feature(row, col, 'object', 'WOLVES' if i % 3 else None)
+
+def check(args):
+    rng = random.Random(args.seed)
+    grid = worldgen.generate(args.size, args.size * 2 // 3 + 1, args.seed)
+    directory = tempfile.mkdtemp()
+    failures, stores = [], []
+    try:
+        path = os.path.join(directory, 'world' + chunks.EXTENSION)
+        chunks.save(grid, path, CHUNK)
+        # A budget of four chunks, so they're read and evicted throughout.
+        streamed = chunks.open_world(path, budget=4 * CHUNK * CHUNK * 3)
+        stores.append(streamed.store)
+        compare_worlds(grid, streamed, failures, 'opened')
+        compare_reads(grid, streamed, args.reads, rng, failures, 'opened')
+        edit(grid, streamed, args.edits, rng)
+        compare_worlds(grid, streamed, failures, 'edited')
+        compare_reads(grid, streamed, args.reads, rng, failures, 'edited')
+        stats = streamed.store.stats()
+        resaved = os.path.join(directory, 'resaved' + chunks.EXTENSION)
+        chunks.save(streamed, resaved, CHUNK)
+        reopened = chunks.open_world(resaved, budget=4 * CHUNK * CHUNK * 3)
+        stores.append(reopened.store)
+        compare_worlds(grid, reopened, failures, 'resaved')
+    finally:
+        for store in stores:
+            store.close()
+        shutil.rmtree(directory)
+    return stats, failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check a streamed world against the same world in memory.')
+    parser.add_argument('--size', type=int, default=300)
+    parser.add_argument('--reads', type=int, default=3000)
+    parser.add_argument('--edits', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    stats, failures = check(args)
+    for when, what, cell, expected, found in failures[:20]:
+        print('MISMATCH ({0}, {1}) at {2}: expected {3!r}, found {4!r}'.format(when, what, cell, expected, found))
+    print('{0} chunks read, {1} evicted, {2} changed; {3} mismatches'.format(
+        stats['loads'] + stats['prefetched'], stats['evictions'], stats['changed'], len(failures)))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,111 @@
+#!/usr/bin/python
+'''
+Checks the Ice Fear field kept up to date as the game goes on (lom/icefear.py)
+against one built afresh from the world and armies as they stand.
+
+Adds `--armies` seeded armies (half of them the Foul's) to the default game,
+walls one of the Foul's armies in with mountains and has it fight straight
+away, then plays `--rounds` rounds of random terrain, name and feature
+changes, a night's march and a night of battles. The change log is
+compacted every `--compact` changes, so the field also has to keep up
+across compactions. After every step, the field must hold the same fear on
+every square as a fresh FearField. The exit status is 1 if they differ.
+
+    python scripts/check_icefear.py [--armies 40] [--rounds 30] [--compact 64] [--seed 1]
+'''
+from __future__ import division, print_function, unicode_literals
+import argparse
+import os
+import random
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lom import combat, constants, icefear
+from lom.armies import NightPhase
+
+
+def compare(gamedata, failures, when):
+    field = icefear.field_for(gamedata)
+    fresh = icefear.FearField(gamedata.world)
+    fresh.sync(gamedata)
+    differ = sum(1 for kept, built in zip(field.fear, fresh.fear) if kept != built)
+    if differ:
+        failures.append((when, differ))
+
+def wall_in(world, location):
+    # Surrounds `location` with mountains, which fear struggles to cross.
+    row, col = location
+    for dr in (-1, 0, 1):
+        for dc in (-1, 0, 1):
+            if (dr or dc) and world.in_bounds(row + dr, col + dc):
+                world.set_terrain(row + dr, col + dc, constants.MOUNTAINS)
+
+def edit(world, rng, count, strongholds):
+    '''
+    Makes `count` random changes to the terrain, names and features. Stronghold
+    squares keep their names, as the field doesn't follow them being renamed.
+    '''
+    for i in range(count):
+        row, col = rng.randrange(world.rows), rng.randrange(world.cols)
+        change = rng.choice(('terrain', 'terrain', 'name', 'feature'))
+        if change == 'terrain':
+            world.set_terrain(row, col, rng.choice(world.terrains))
+        elif change == 'name' and (row, col) not in strongholds:
+            world.set_name(row, col, 'Check {0}'.format(i % 7))
+        elif change == 'feature':
+            world.set_feature(row, col, 'object', 'WOLVES' if i % 2 else None)
+
+def fight(gamedata, rng, count):
+    '''
+    Has `count` random pairs of armies still standing fight a battle.
+    '''
+    table = gamedata.armies
+    standing = [i for i in range(len(table)) if table.strength[i] > 0]
+    pairs = []
+    while len(standing) >= 2 and len(pairs) < count:
+        attacker = standing.pop(rng.randrange(len(standing)))
+        pairs.append((attacker, standing.pop(rng.randrange(len(standing)))))
+    combat.fight(table, gamedata.world, pairs, rng=rng)
+
+def check(args):
+    rng = random.Random(args.seed)
+    gamedata = constants.DefaultGameData()
+    world, table = gamedata.world, gamedata.armies
+    world.COMPACT_EVERY = world.compact_at = args.compact
+    open_ground = [(r, c) for r in range(world.rows) for c in range(world.cols)
+        if world.terrain_at(r, c) != constants.FROZEN_WASTES]
+    strongholds = set(cell for cell in open_ground if world.name_at(*cell) in constants.ICE_FEAR_SOURCES)
+    for i in range(args.armies):
+        table.add(rng.choice(open_ground), rng.randint(200, 1500), constants.FOUL if i % 2 else constants.FREE,
+            mounted=bool(i % 3), target=rng.choice(open_ground))
+    failures = []
+    icefear.field_for(gamedata)
+    # A terrain change around an army, then a battle before anything else reads the field.
+    foul = table.race_codes[constants.FOUL]
+    walled = [i for i in range(len(table)) if table.race[i] == foul][0]
+    wall_in(world, table.location(walled))
+    combat.fight(table, world, [(walled - 1, walled)], rng=rng)
+    compare(gamedata, failures, 'walled in, then fought')
+    night = NightPhase(table)
+    for round in range(args.rounds):
+        edit(world, rng, 20, strongholds)
+        compare(gamedata, failures, 'round {0}: edited'.format(round))
+        edit(world, rng, 5, strongholds)
+        night.run(gamedata)
+        compare(gamedata, failures, 'round {0}: marched'.format(round))
+        wall_in(world, table.location(rng.randrange(len(table))))
+        fight(gamedata, rng, 4)
+        compare(gamedata, failures, 'round {0}: fought'.format(round))
+    return world.compacted, failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the Ice Fear field against one built afresh.')
+    parser.add_argument('--armies', type=int, default=40)
+    parser.add_argument('--rounds', type=int, default=30)
+    parser.add_argument('--compact', type=int, default=64, help='Compact the change log every this many changes.')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    compacted, failures = check(args)
+    for when, differ in failures[:20]:
+        print('MISMATCH ({0}): {1} squares differ'.format(when, differ))
+    print('{0} changes compacted; {1} mismatches'.format(compacted, len(failures)))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,138 @@
+#!/usr/bin/python
+'''
+Checks find_route (A* over (day, hour) labels, lom/pathfinding.py) against
+a brute-force Dijkstra search written straight from the movement rules.
+
+For `--pairs` seeded (start, goal) pairs, mounted and on foot, by fastest
+and by least energy, and from a seeded start hour, both searches must
+agree on whether the goal can be reached and on the best arrival (day,
+hour) or energy. The route find_route returns must also be a walk of
+adjacent, passable squares, which arrives when it says and spends the
+energy it says. The exit status is 1 if anything disagrees.
+
+    python scripts/check_pathfinding.py [--pairs 200] [--seed 1] [--world data/world.json]
+'''
+from __future__ import division, print_function, unicode_literals
+import argparse
+import heapq
+import os
+import random
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lom import constants, pathfinding, worldfile
+
+DAWN, NIGHTFALL = 8, 16
+EPSILON = 1e-9
+
+
+def step_cost(world, here, there, mounted):
+    '''
+    Returns the (hours, energy) of moving from `here` into `there`, or None
+    if it can't be done.
+    '''
+    terrain = world.terrain_at(*there)
+    if terrain == constants.FROZEN_WASTES:
+        return None
+    cardinal = here[0] == there[0] or here[1] == there[1]
+    return terrain.travel_time(cardinal, mounted), terrain.energy_cost
+
+def arrive(day, hour, cost):
+    # Moves are made today if they finish by nightfall, otherwise from dawn tomorrow.
+    if hour + cost <= NIGHTFALL + EPSILON:
+        return (day, hour + cost)
+    if DAWN + cost <= NIGHTFALL + EPSILON:
+        return (day + 1, DAWN + cost)
+    return None
+
+def brute_force(world, start, goal, mounted, least_energy, start_time):
+    '''
+    Returns the best label at `goal`, as (day, hour, energy), or None.
+    Plain Dijkstra, ordering labels by time then energy (or by energy then
+    time): arriving later never lets a lord arrive anywhere sooner, so the
+    first label settled at each square is its best.
+    '''
+    def order(label):
+        return (label[2], label[0], label[1]) if least_energy else label
+    best = {start: (0, start_time, 0)}
+    queue = [(order(best[start]), start)]
+    settled = set()
+    while queue:
+        key, cell = heapq.heappop(queue)
+        if cell in settled:
+            continue
+        settled.add(cell)
+        if cell == goal:
+            return best[cell]
+        day, hour, energy = best[cell]
+        for heading in constants.HEADINGS:
+            there = (cell[0] + heading.offset[0], cell[1] + heading.offset[1])
+            cost = step_cost(world, cell, there, mounted)
+            if cost is None or there in settled:
+                continue
+            arrival = arrive(day, hour, cost[0])
+            if arrival is None:
+                continue
+            label = (arrival[0], arrival[1], energy + cost[1])
+            if there not in best or order(label) < order(best[there]):
+                best[there] = label
+                heapq.heappush(queue, (order(label), there))
+    return None
+
+def walk(world, start, route, mounted, start_time):
+    '''
+    Walks `route` by the rules, returning its (day, hour, energy) on arrival,
+    or None if any step is impossible.
+    '''
+    day, hour, energy, here = 0, start_time, 0, start
+    for cell in route.cells:
+        if max(abs(cell[0] - here[0]), abs(cell[1] - here[1])) != 1:
+            return None
+        cost = step_cost(world, here, cell, mounted)
+        arrival = cost and arrive(day, hour, cost[0])
+        if arrival is None:
+            return None
+        day, hour, energy, here = arrival[0], arrival[1], energy + cost[1], cell
+    return (day, hour, energy)
+
+def same(a, b):
+    return a[0] == b[0] and abs(a[1] - b[1]) < 1e-6 and a[2] == b[2]
+
+def check(world, pairs, seed):
+    rng = random.Random(seed)
+    passable = [(r, c) for r in range(world.rows) for c in range(world.cols)
+        if world.terrain_at(r, c) != constants.FROZEN_WASTES]
+    failures, checked = [], 0
+    for i in range(pairs):
+        start, goal = rng.choice(passable), rng.choice(passable)
+        start_time = rng.choice([DAWN, 10, 12, 15])
+        for mounted in (True, False):
+            for least_energy in (False, True):
+                case = (start, goal, mounted, least_energy, start_time)
+                expected = brute_force(world, start, goal, mounted, least_energy, start_time)
+                route = pathfinding.find_route(world, start, goal, mounted, least_energy, start_time, DAWN, NIGHTFALL)
+                checked += 1
+                if route is None or expected is None:
+                    if (route is None) != (expected is None):
+                        failures.append((case, 'reachable', expected, route and route.arrival))
+                    continue
+                walked = walk(world, start, route, mounted, start_time)
+                found = (route.arrival[0], route.arrival[1], route.energy)
+                if walked is None or not same(walked, found) or (route.cells and route.cells[-1] != goal):
+                    failures.append((case, 'route', found, walked))
+                elif least_energy and (found[2] != expected[2]):
+                    failures.append((case, 'energy', expected, found))
+                elif not least_energy and (found[0] != expected[0] or abs(found[1] - expected[1]) > 1e-6):
+                    failures.append((case, 'arrival', expected, found))
+    return checked, failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check find_route against a brute-force search.')
+    parser.add_argument('--pairs', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--world', default=constants.DefaultGameData.world_file)
+    args = parser.parse_args()
+    checked, failures = check(worldfile.load_world(args.world), args.pairs, args.seed)
+    for case, what, expected, found in failures[:20]:
+        print('MISMATCH ({0}) {1}: expected {2}, found {3}'.format(what, case, expected, found))
+    print('{0} routes checked, {1} mismatches'.format(checked, len(failures)))
+    sys.exit(1 if failures else 0)
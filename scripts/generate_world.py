@@ -0,0 +1,35 @@
+#!/usr/bin/python
+'''
+Generates a seeded world map (see lom/worldgen.py) and writes it as JSON
+(the editable world.json format), as a binary .lomw file or as a chunked
+.lomc directory to be streamed (see lom/chunks.py), by extension. JSON is
+slow and huge for big maps; use .lomw for anything over ~512x512.
+
+    python scripts/generate_world.py [--size 256] [--cols COLS] [--seed 1] [--no-monsters] data/world_256.lomw
+'''
+from __future__ import division, print_function, unicode_literals
+import argparse
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lom import chunks, worldfile, worldgen
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a seeded world map.')
+    parser.add_argument('output', help='A .json or .lomw file, or a .lomc directory.')
+    parser.add_argument('--size', type=int, default=256, help='Rows (and columns, unless --cols is given).')
+    parser.add_argument('--cols', type=int)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-monsters', dest='monsters', action='store_false')
+    args = parser.parse_args()
+    start = time.time()
+    grid = worldgen.generate(args.size, args.cols, args.seed, args.monsters)
+    if args.output.endswith('.json'):
+        worldfile.save_json(grid, args.output)
+    elif args.output.rstrip(os.sep).endswith(chunks.EXTENSION):
+        chunks.save(grid, args.output)
+    else:
+        worldfile.save(grid, args.output)
+    print('Wrote {0} ({1}x{2}, {3} names) in {4:.1f}s'.format(args.output, grid.rows, grid.cols,
+        len(grid.names) - 1, time.time() - start))
@@ -0,0 +1,51 @@
+#!/usr/bin/python
+'''
+Replays recorded play sessions headlessly, as fast as possible.
+
+Record a session with LOM_RECORD=session.lomrec python game.py. Each
+recording is replayed with the state hash checked at every checkpoint,
+and the exit status is 1 if any recording goes wrong, so recordings from
+bug reports can be kept as regression tests. With --render, every
+command's view is also rendered offscreen and timed, to benchmark real
+sessions against renderer changes.
+
+    python scripts/replay.py session.lomrec [more.lomrec ...] [--render]
+'''
+from __future__ import division, print_function, unicode_literals
+import argparse
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lom import replay
+from lom.stats import summarize
+
+
+def renderer():
+    # Only load pygame when rendering.
+    from lom import display
+    display.init(headless=True)
+    surface = display.offscreen()
+    frames = []
+    def render(gamedata):
+        start = time.time()
+        gamedata.actor.render_perspective(gamedata.world, surface)
+        frames.append((time.time() - start) * 1000)
+    return render, frames
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay recorded sessions and check their state hashes.')
+    parser.add_argument('recordings', nargs='+')
+    parser.add_argument('--render', action='store_true', help='Render the view after every command.')
+    args = parser.parse_args()
+    failed = False
+    for path in args.recordings:
+        render, frames = renderer() if args.render else (None, None)
+        result = replay.replay(path, each=render)
+        status = 'ok' if result.ok else 'MISMATCH at command {0}'.format(result.mismatch)
+        print('{0}: {1} commands, {2} checkpoints in {3:.3f} s ({4:.0f} commands/s): {5}'.format(path,
+            result.commands, result.checkpoints, result.seconds, result.commands / max(result.seconds, 1e-9), status))
+        if frames:
+            print('  render: p50 {p50:.3f} ms, p95 {p95:.3f} ms, max {max:.3f} ms'.format(**summarize(frames)))
+        failed = failed or not result.ok
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,55 @@
+#!/usr/bin/python
+'''
+Headless Monte Carlo simulator for balance runs.
+
+Plays `--games` seeded games of up to `--days` days each, with the lords
+moved by a random or scripted policy, across every core. The route policy
+starts each lord on a random square, so seeds differ for it too. Each game's
+statistics are streamed to a CSV file as it finishes, and a summary is
+printed at the end. Terrain and monster settings can be overridden to
+compare balance changes, e.g. --set MOUNTAINS.move_cost=4 --set WOLVES.strength=40
+
+    python scripts/simulate.py [--games 1000] [--days 30] [--policy random|route] [--seed 0] [--output sim_results.csv]
+'''
+from __future__ import division, print_function, unicode_literals
+import argparse
+import csv
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lom import simulator
+from lom.stats import summarize
+
+
+def setting(text):
+    name, value = text.split('=')
+    return name, float(value)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play many seeded games headlessly and record their statistics.')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=30, help='Most days each game lasts.')
+    parser.add_argument('--policy', choices=sorted(simulator.POLICIES), default='random')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the first game; the rest follow on.')
+    parser.add_argument('--monsters', type=float, default=0.02, help='Share of squares with a monster on.')
+    parser.add_argument('--rest', type=int, default=32, help='Energy the lords regain overnight.')
+    parser.add_argument('--workers', type=int, default=None, help='Processes to use (default: one per core).')
+    parser.add_argument('--set', type=setting, action='append', default=[], metavar='NAME.attr=VALUE')
+    parser.add_argument('--output', default='sim_results.csv')
+    args = parser.parse_args()
+    start = time.time()
+    games = []
+    with open(args.output, 'wb' if sys.version_info[0] < 3 else 'w') as f:
+        writer = csv.DictWriter(f, [str(field) for field in simulator.FIELDS])
+        writer.writeheader()
+        for result in simulator.simulate(args.games, args.policy, args.days, args.seed, args.monsters,
+                args.rest, args.workers, dict(args.set)):
+            writer.writerow(result)
+            games.append(result)
+    elapsed = time.time() - start
+    days = sum(game['days'] for game in games)
+    print('{0} games, {1} days in {2:.1f} s ({3:.0f} days/s)'.format(len(games), days, elapsed, days / elapsed))
+    for field in ('days', 'lords_alive', 'distance', 'energy_spent', 'encounters'):
+        print('{0}: mean {mean:.1f}, p50 {p50}, p95 {p95}'.format(field, **summarize([game[field] for game in games])))
+    print('Results written to {0}'.format(args.output))
@@ -0,0 +1,34 @@
+#!/usr/bin/python
+'''
+Converts a world map between the JSON, binary (.lomw) and chunked (.lomc,
+a directory) formats. The direction is taken from the file extensions, e.g.:
+
+    python scripts/world_convert.py data/world.json data/world.lomw
+    python scripts/world_convert.py data/world.lomw data/world.json
+    python scripts/world_convert.py data/world.lomw data/world.lomc
+'''
+from __future__ import division, print_function, unicode_literals
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from lom import chunks, worldfile
+
+
+def convert(source, dest):
+    if source.endswith('.json'):
+        grid = worldfile.load_json(source)
+    else:
+        grid = worldfile.load_world(source)
+    if dest.endswith('.json'):
+        worldfile.save_json(grid, dest)
+    elif dest.rstrip(os.sep).endswith(chunks.EXTENSION):
+        chunks.save(grid, dest)
+    else:
+        worldfile.save(grid, dest)
+    return grid
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    grid = convert(sys.argv[1], sys.argv[2])
+    print('Wrote {0} ({1}x{2}, {3} names)'.format(sys.argv[2], grid.rows, grid.cols, len(grid.names) - 1))